@@ -0,0 +1,116 @@
+# kalasetu/ai_cache.py
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+from firebase_config import db
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class TwoLevelCache:
+    """Content-keyed cache for expensive AI responses.
+
+    Level 1 is an in-process LRU; level 2 is a Firestore collection shared by
+    every worker. Entries expire after ``ttl_seconds`` (the ``expires_at`` field
+    can also back a Firestore TTL policy). Hit/miss counts are kept per process.
+    """
+
+    COLLECTION = "ai_cache"
+
+    def __init__(self, namespace: str, ttl_seconds: float, max_entries: int = 512):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """Stable SHA-256 key over already-normalized parts."""
+        raw = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["store_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["store_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _doc(self, key: str):
+        return db.collection(self.COLLECTION).document(f"{self.namespace}_{key}")
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Look the key up in memory, then Firestore. Returns None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[1]
+
+        try:
+            doc = self._doc(key).get()
+        except Exception as e:
+            logger.error(f"{self.namespace} cache read failed: {e}")
+            self._count("errors")
+            doc = None
+        if doc is not None and doc.exists:
+            data = doc.to_dict()
+            expires_at = data.get("expires_at")
+            if expires_at and expires_at.timestamp() > now:
+                self._remember(key, data.get("value"), expires_at.timestamp())
+                self._count("store_hits")
+                return data.get("value")
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Any, **metadata) -> None:
+        expires = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        self._remember(key, value, expires.timestamp())
+        try:
+            self._doc(key).set(dict(metadata, value=value, namespace=self.namespace,
+                                    created_at=firestore.SERVER_TIMESTAMP, expires_at=expires))
+        except Exception as e:
+            logger.error(f"{self.namespace} cache write failed: {e}")
+            self._count("errors")
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], refresh: bool = False,
+                       **metadata) -> Tuple[Any, bool]:
+        """Return ``(value, cached)``. ``compute`` runs on a miss or when ``refresh`` is set.
+
+        ``compute`` may return None to signal a result that must not be cached
+        (e.g. a fallback after a provider error).
+        """
+        if refresh:
+            self._count("refreshes")
+        else:
+            value = self.get(key)
+            if value is not None:
+                return value, True
+        value = compute()
+        if value is not None:
+            self.set(key, value, **metadata)
+        return value, False
@@ -3,24 +3,86 @@
 import io
 import os
 import json
-import requests
 import tempfile
-from typing import List
+import threading
+from typing import BinaryIO, List, Optional, Union
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # --- AI Model Imports ---
-import cohere
-from firebase_admin import storage
+from firebase_admin import firestore
+from ai_cache import TwoLevelCache
+from firebase_client import save_idea_for_user, get_bucket
+from http_transport import get_transport
 
 # --- Initialize Clients ---
-# Cohere (for text generation)
-co = cohere.Client(os.environ.get("COHERE_API_KEY"))
+# Cohere (for text generation). Building the client pulls in most of the SDK,
+# so it is created on first use rather than when this module is imported.
+_co = None
+_co_lock = threading.Lock()
+
+
+def get_cohere_client():
+    global _co
+    if _co is None:
+        with _co_lock:
+            if _co is None:
+                import cohere
+                _co = cohere.Client(os.environ.get("COHERE_API_KEY"))
+    return _co
+
 
 # ---------------- Product Ideas ---------------- #
-def generate_product_ideas(skills: List[str], materials: List[str]) -> List[str]:
-    """Generate product ideas from skills and materials using Cohere."""
+IDEAS_MODEL = 'command-nightly'
+FALLBACK_IDEAS = ["Handmade bag", "Decorative lamp", "Woven mat"]
+
+# Ideas only depend on (skills, materials, model), so identical inputs share one LLM call.
+ideas_cache = TwoLevelCache(
+    "product_ideas",
+    ttl_seconds=float(os.environ.get("IDEAS_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+    max_entries=int(os.environ.get("IDEAS_CACHE_MAX_ENTRIES", 512)),
+)
+
+
+def _normalise_terms(terms: List[str]) -> List[str]:
+    return sorted({t.strip().lower() for t in terms or [] if t and t.strip()})
+
+
+def ideas_cache_key(skills: List[str], materials: List[str], model: str = IDEAS_MODEL) -> str:
+    return TwoLevelCache.make_key(
+        skills=_normalise_terms(skills), materials=_normalise_terms(materials), model=model
+    )
+
+
+def generate_product_ideas(skills: List[str], materials: List[str],
+                           refresh: bool = False, user_uid: Optional[str] = None) -> List[str]:
+    """Generate product ideas from skills and materials, served from cache when possible.
+
+    ``refresh=True`` bypasses the cache and stores the fresh result. Freshly
+    generated ideas are also appended to the user's idea history.
+    """
+    key = ideas_cache_key(skills, materials)
+
+    def compute():
+        ideas = _generate_product_ideas_uncached(skills, materials)
+        if ideas is not None and user_uid:
+            save_idea_for_user(user_uid, {
+                "ideas": ideas, "skills": skills, "materials": materials,
+                "model": IDEAS_MODEL, "cache_key": key, "created_at": firestore.SERVER_TIMESTAMP
+            })
+        return ideas
+
+    ideas, _ = ideas_cache.get_or_compute(
+        key, compute, refresh=refresh,
+        model=IDEAS_MODEL, skills=_normalise_terms(skills), materials=_normalise_terms(materials)
+    )
+    # Provider failures are not cached; give a fallback so the app doesn't crash
+    return ideas if ideas is not None else list(FALLBACK_IDEAS)
+
+
+def _generate_product_ideas_uncached(skills: List[str], materials: List[str]) -> Optional[List[str]]:
+    """Call Cohere. Returns None if the provider call fails."""
     prompt = (
         f"Generate 5 simple, practical, culturally appropriate product ideas "
         f"for someone with skills: {', '.join(skills)} "
@@ -28,8 +90,8 @@ def generate_product_ideas(skills: List[str], materials: List[str]) -> List[str]
         f"Return the result as a JSON array of strings."
     )
     try:
-        response = co.chat(
-            model='command-nightly',  # <<< FINAL MODEL NAME UPDATE
+        response = get_cohere_client().chat(
+            model=IDEAS_MODEL,  # <<< FINAL MODEL NAME UPDATE
             message=prompt
         )
         text = response.text.strip()
@@ -42,13 +104,15 @@ def generate_product_ideas(skills: List[str], materials: List[str]) -> List[str]
             return [line.strip("-• ") for line in text.split("\n") if line.strip()]
     except Exception as e:
         print("Error generating ideas:", e)
-        # Provide a fallback response so the app doesn't crash
-        return ["Handmade bag", "Decorative lamp", "Woven mat"]
+        return None
 
 
 # ---------------- Government Schemes ---------------- #
-def get_government_schemes(profile: dict):
-    """Fetch relevant schemes based on artisan profile using Cohere."""
+FALLBACK_SCHEMES = [{"name": "Pradhan Mantri Mudra Yojana (PMMY)", "desc": "Provides loans up to 10 lakh to non-corporate, non-farm small/micro enterprises."}]
+
+
+def get_government_schemes(profile: dict) -> Optional[List[dict]]:
+    """Fetch relevant schemes based on artisan profile using Cohere. Returns None if the provider call fails."""
     prompt = f"""
     You are an assistant that suggests relevant Indian Government Schemes.
     Based on the following user profile, suggest 5 schemes.
@@ -69,7 +133,7 @@ def get_government_schemes(profile: dict):
     ]
     """
     try:
-        response = co.chat(
+        response = get_cohere_client().chat(
             model='command-nightly',  # <<< FINAL MODEL NAME UPDATE
             message=prompt
         )
@@ -78,15 +142,17 @@ def get_government_schemes(profile: dict):
         # Clean up and parse the JSON response
         text = text.replace("```json", "").replace("```", "").strip()
         schemes = json.loads(text)
+        if not isinstance(schemes, list):
+            raise ValueError("expected a JSON array of schemes")
         return schemes
     except Exception as e:
         print(f"Error generating/decoding schemes from AI: {e}")
-        # Fallback for any error
-        return [{"name": "Pradhan Mantri Mudra Yojana (PMMY)", "desc": "Provides loans up to 10 lakh to non-corporate, non-farm small/micro enterprises."}]
+        return None
 
 
 # ---------------- Speech to Text ---------------- #
-def speech_to_text(audio_bytes: bytes) -> str:
+def speech_to_text(audio: Union[bytes, BinaryIO]) -> str:
+    """``audio`` may be an open binary file, so long recordings can be streamed instead of held in memory."""
     return "This function will be implemented in the future."
 
 
@@ -97,13 +163,16 @@ def text_to_speech(text: str, language_code: str = "en-IN") -> str:
 # ---------------- Image Generation ---------------- #
 # This function remains unchanged as it uses Hugging Face
 HF_TOKEN = os.environ.get("HF_TOKEN", "")
+# Pooled keep-alive session; 503 "model loading" and other transient statuses are retried with backoff
+hf_transport = get_transport("huggingface", pool_size=4, max_retries=4, backoff_factor=2.0,
+                             connect_timeout=5.0, read_timeout=60.0)
 
 def generate_mockup_image(description: str) -> dict:
     try:
         url = "https://router.huggingface.co/hf-inference/models/black-forest-labs/FLUX.1-dev"
         headers = {"Authorization": f"Bearer {HF_TOKEN}"}
         payload = {"inputs": description}
-        resp = requests.post(url, headers=headers, json=payload, timeout=60)
+        resp = hf_transport.post(url, headers=headers, json=payload)
         resp.raise_for_status()
         image_bytes = resp.content
         return {
@@ -117,15 +186,31 @@ def generate_mockup_image(description: str) -> dict:
 
 
 # ---------------- Firebase Storage Upload ---------------- #
-def upload_image_to_storage(path: str, data: bytes, content_type: str) -> str:
-    # This function remains unchanged
-    bucket = storage.bucket()
-    blob = bucket.blob(path)
+def _bucket():
+    bucket = get_bucket()
+    if bucket is None:
+        raise RuntimeError("Firebase storage bucket is not configured (FIREBASE_STORAGE_BUCKET).")
+    return bucket
+
+
+def upload_image_to_storage(path: str, data: bytes, content_type: str,
+                            cache_control: Optional[str] = None) -> str:
+    blob = _bucket().blob(path)
+    if cache_control:
+        blob.cache_control = cache_control
     blob.upload_from_string(data, content_type=content_type)
     blob.make_public()
     return blob.public_url
 
 
+def storage_blob_url(path: str, check: bool = True) -> Optional[str]:
+    """Public URL of a stored blob; with ``check``, None if the blob does not exist."""
+    blob = _bucket().blob(path)
+    if check and not blob.exists():
+        return None
+    return blob.public_url
+
+
 # ---------------- Embeddings ---------------- #
 def embed_text(text: str) -> str:
     return "This function will be implemented in the future."
@@ -1,6 +1,6 @@
 # kalasetu/ai_helper.py
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, BinaryIO, Union
 import re
 import time
 
@@ -12,7 +12,9 @@ from ai_clients import (
     upload_image_to_storage,
     embed_text,
     get_government_schemes,
+    FALLBACK_SCHEMES,
 )
+from image_pipeline import process_and_upload
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -21,18 +23,19 @@ logger.setLevel(logging.INFO)
 class AIHelper:
     """OOP wrapper around ai_clients functions with consistent error handling."""
 
-    def generate_ideas(self, skills: List[str], materials: List[str]) -> List[str]:
-        """Generate product ideas using skills + materials."""
+    def generate_ideas(self, skills: List[str], materials: List[str],
+                       refresh: bool = False, user_uid: Optional[str] = None) -> List[str]:
+        """Generate product ideas using skills + materials (cached; ``refresh`` bypasses the cache)."""
         try:
-            return generate_product_ideas(skills, materials)
+            return generate_product_ideas(skills, materials, refresh=refresh, user_uid=user_uid)
         except Exception as e:
             logger.error(f"generate_ideas failed: {e}")
             return []
 
-    def speech_to_text(self, audio_bytes: bytes) -> str:
-        """Convert speech audio into text."""
+    def speech_to_text(self, audio: Union[bytes, BinaryIO]) -> str:
+        """Convert speech audio (bytes or an open binary file) into text."""
         try:
-            return speech_to_text(audio_bytes)
+            return speech_to_text(audio)
         except Exception as e:
             logger.error(f"speech_to_text failed: {e}")
             return "Transcription failed."
@@ -49,7 +52,11 @@ class AIHelper:
             return None
 
     def generate_image(self, description: str, upload: bool = False, path: Optional[str] = None) -> Dict[str, Any]:
-        """Generate an image for a description, optionally upload to Firebase."""
+        """Generate an image for a description, optionally upload to Firebase.
+
+        Uploads go through the derivative pipeline (thumb/medium/full in WebP and
+        JPEG, keyed by content hash) unless an explicit ``path`` is given.
+        """
         if not description:
             return {"error": "Description required."}
 
@@ -60,7 +67,14 @@ class AIHelper:
             if not img_bytes:
                 return {"error": f"Image generation failed: {result.get('notes', '')}"}
 
-            if upload:
+            if upload and not path:
+                # Resized WebP/JPEG variants, stored once per distinct image.
+                try:
+                    result.update(process_and_upload(img_bytes))
+                except Exception as e:
+                    logger.error(f"Image derivative pipeline failed, uploading original: {e}")
+
+            if upload and "url" not in result:
                 try:
                     # ---- FIX STARTS HERE: Sanitize filename ----
                     # Sanitize the description to create a safe filename
@@ -97,11 +111,18 @@ class AIHelper:
             logger.error(f"embed_text failed: {e}")
             return []
 
-    def get_schemes(self, profile: dict) -> List[Dict[str, Any]]:
-        """Fetch relevant government schemes for a profile."""
+    def get_schemes(self, profile: dict, fallback: bool = True) -> Optional[List[Dict[str, Any]]]:
+        """Fetch relevant government schemes for a profile.
+
+        If the provider fails this returns a generic fallback list, or None
+        with ``fallback=False`` (for callers that must not cache the fallback).
+        """
         try:
-            return get_government_schemes(profile)
+            schemes = get_government_schemes(profile)
         except Exception as e:
             logger.error(f"get_schemes failed: {e}")
-            return []
+            schemes = None
+        if schemes is None and fallback:
+            return [dict(s) for s in FALLBACK_SCHEMES]
+        return schemes
 
@@ -1,42 +1,96 @@
 # app.py
-from flask import Flask, request, jsonify, render_template
+import os
+from typing import Dict, Optional
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, render_template
 from flask_cors import CORS
 from firebase_config import db             # <<< FIX: Import the db client
-from firebase_admin import firestore     # <<< FIX: Import the firestore module
 from artisanManager import ArtisanManager
 from mentorManager import MentorManager
 from investorManager import InvestorManager
 from community_manager import CommunityManager
 from collaboration_manager import CollaborationManager
-from chat_manager import ChatManager
+from chat_manager import ChatManager, AudioRejected, AudioTooLarge
 from marketplaceManager import MarketplaceManager
 from businessManager import BusinessManager
-from firebase_client import upload_bytes_to_storage
-from ai_helper import AIHelper
+from schemeManager import SchemeManager
+from job_manager import JobManager, JobLimitExceeded
+from ai_clients import ideas_cache
+import http_transport
 from mentorship_manager import MentorshipManager
 from investmentManager import InvestmentManager # <<< ADD THIS IMPORT
-
-app = Flask(__name__)
-CORS(app)
+from user_directory import UserDirectory
+from batch_lookup import get_by_ids
+from pagination import InvalidCursor
+from delta_sync import StaleWatermark
+from projections import UnknownProjection
+import background
+import firestore_metrics
+import http_cache
+import chat_stream
+import startup
+
+# Routes live on a blueprint; create_app() builds the Flask app around it.
+api = Blueprint("api", __name__)
 
 # --- Mock Business and Connection Data (replace with Firestore logic) ---
 # This can be removed now as we are using Firestore for businesses
 # mock_businesses = {} 
 mock_connections = {}
 
+# --- Pagination helpers ---
+def _page_args(default_limit: int, max_limit: int = 100):
+    """Read ?cursor=&limit= from the query string, clamping limit to a sane range."""
+    try:
+        limit = int(request.args.get("limit", default_limit))
+    except ValueError:
+        limit = default_limit
+    return request.args.get("cursor") or None, max(1, min(limit, max_limit))
+
+def _paged_response(page):
+    """jsonify a Page (with an ETag), exposing its cursors as X-Next-Cursor / X-Prev-Cursor headers.
+
+    A synced listing's first page also carries X-Watermark, for later ``?since=`` requests.
+    """
+    resp = http_cache.json_response(page)
+    next_cursor = getattr(page, "next_cursor", None)
+    prev_cursor = getattr(page, "prev_cursor", None)
+    watermark = getattr(page, "watermark", None)
+    if next_cursor: resp.headers["X-Next-Cursor"] = next_cursor
+    if prev_cursor: resp.headers["X-Prev-Cursor"] = prev_cursor
+    if watermark: resp.headers["X-Watermark"] = watermark
+    return resp
+
+def _delta_args():
+    """?since=<watermark>, with a larger default limit than a page: a delta is usually small."""
+    _, limit = _page_args(default_limit=100, max_limit=500)
+    return request.args.get("since") or None, limit
+
+@api.app_errorhandler(InvalidCursor)
+def handle_invalid_cursor(e):
+    return jsonify({"error": str(e)}), 400
+
+@api.app_errorhandler(StaleWatermark)
+def handle_stale_watermark(e):
+    # 410 tells a syncing client to drop its copy and reload the full listing
+    return jsonify({"error": str(e)}), 410
+
+@api.app_errorhandler(UnknownProjection)
+def handle_unknown_projection(e):
+    return jsonify({"error": str(e)}), 400
+
 # --- Frontend Serving ---
-@app.route("/")
+@api.route("/")
 def index():
     return render_template("index.html")
-@app.route('/health')
+@api.route('/health')
 def health():
     return jsonify({"status": "healthy"}), 200
-@app.route("/dashboard")
+@api.route("/dashboard")
 def dashboard():
     return render_template("dashboard.html")
 
 # --- Auth & Profile ---
-@app.route("/signup/<role>", methods=["POST"])
+@api.route("/signup/<role>", methods=["POST"])
 def signup_user(role):
     data = request.json
     uid = None
@@ -49,7 +103,7 @@ def signup_user(role):
     uid = manager.signup(data)
     return jsonify({"message": f"{role.title()} created", "uid": uid})
 
-@app.route("/profile/<role>/<uid>", methods=["GET", "PUT"])
+@api.route("/profile/<role>/<uid>", methods=["GET", "PUT"])
 def profile(role, uid):
     manager = None
     if role == "artisan": manager = ArtisanManager
@@ -76,51 +130,91 @@ def profile(role, uid):
     
 
 # --- Discovery (for Mentors/Investors) ---
-@app.route("/mentors/search", methods=["GET"])
+@api.route("/mentors/search", methods=["GET"])
 def search_mentors():
     """Endpoint for artisans to discover mentors."""
     expertise = request.args.get("expertise")
+    projection = request.args.get("fields")  # card (default) / detail / full
     if not expertise:
-        return jsonify(MentorManager.list_all(limit=20))
-    return jsonify(MentorManager.search_by_expertise(expertise))
+        return jsonify(MentorManager.list_all(limit=20, projection=projection))
+    return jsonify(MentorManager.search_by_expertise(expertise, projection=projection))
 
 # --- Artisan AI ---
-@app.route("/artisan/<uid>/ideas", methods=["GET"])
+@api.route("/artisan/<uid>/ideas", methods=["GET"])
 def generate_ideas(uid):
+    refresh = request.args.get("refresh", "").lower() in ("1", "true", "yes")
     artisan = ArtisanManager.hydrate_entity(uid)
     if not artisan: return jsonify({"error": "Artisan not found"}), 404
     try:
-        ideas = artisan.generate_business_idea()
+        ideas = artisan.generate_business_idea(refresh=refresh)
         return jsonify(ideas)
     except Exception as e:
         print(f"Error generating ideas: {e}")
         return jsonify({"error": "Failed to generate ideas from AI service."}), 500
 
-@app.route("/artisan/<uid>/schemes", methods=["GET"])
+@api.route("/admin/ai-cache/stats", methods=["GET"])
+def ai_cache_stats():
+    """Per-worker hit/miss counters for the product-idea cache."""
+    return jsonify({"product_ideas": ideas_cache.stats()})
+
+@api.route("/admin/ai-transport/stats", methods=["GET"])
+def ai_transport_stats():
+    """Per-worker latency/retry stats for outbound AI provider calls."""
+    return jsonify(http_transport.all_stats())
+
+@api.route("/admin/firestore/stats", methods=["GET"])
+def firestore_io_stats():
+    """Per-worker Firestore reads/writes/latency, aggregated by route and by uid (?top= uids)."""
+    try:
+        top = int(request.args.get("top", 20))
+    except ValueError:
+        top = 20
+    return jsonify(firestore_metrics.snapshot(top=max(0, top)))
+
+@api.route("/admin/chat-stream/stats", methods=["GET"])
+def chat_stream_stats():
+    """Per-worker count of shared chat listeners and the SSE connections fed by them."""
+    return jsonify(chat_stream.hub.stats())
+
+@api.route("/artisan/<uid>/schemes", methods=["GET"])
 def get_schemes_route(uid):
     artisan = ArtisanManager.hydrate_entity(uid)
     if not artisan: return jsonify({"error": "Artisan not found"}), 404
     try:
-        schemes = artisan.get_schemes()
-        return jsonify(schemes)
+        # Serve the cached list right away; stale entries are refreshed in the background
+        schemes, cache_state = SchemeManager(uid).get_schemes_swr(artisan.scheme_profile())
+        resp = jsonify(schemes)
+        resp.headers["X-Cache"] = cache_state
+        return resp
     except Exception as e:
         print(f"Error generating schemes: {e}")
         return jsonify({"error": "Failed to generate schemes from AI service."}), 500
 
-@app.route("/artisan/<uid>/image", methods=["POST"])
+@api.route("/artisan/<uid>/image", methods=["POST"])
 def generate_image_route(uid):
+    """Queue an image generation job; poll /jobs/<job_id> for the result."""
     prompt = request.json.get("prompt")
-    artisan = ArtisanManager.hydrate_entity(uid)
-    if not artisan: return jsonify({"error": "Artisan not found"}), 404
+    if not ArtisanManager.get_profile(uid): return jsonify({"error": "Artisan not found"}), 404
     try:
-        image_result = artisan.generate_image(prompt, upload=True)
-        return jsonify(image_result)
+        job = JobManager.submit_image_job(uid, prompt)
+        job["status_url"] = f"/jobs/{job['job_id']}"
+        return jsonify(job), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobLimitExceeded as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
-        print(f"Error generating image: {e}")
+        print(f"Error queueing image job: {e}")
         return jsonify({"error": "Failed to generate image from AI service."}), 500
 
+@api.route("/jobs/<job_id>", methods=["GET"])
+def get_job_route(job_id):
+    job = JobManager.get_job(job_id)
+    if not job: return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
 # --- Business Management (for Artisans) ---
-@app.route("/artisan/<uid>/business", methods=["POST", "GET"])
+@api.route("/artisan/<uid>/business", methods=["POST", "GET"])
 def business_management(uid):
     if request.method == "POST":
         data = request.json
@@ -153,16 +247,15 @@ def business_management(uid):
         if not business_ids:
             return jsonify([])
 
-        business_docs = db.collection("businesses").where("__name__", "in", business_ids).stream()
-        businesses = []
-        for doc in business_docs:
-            business_data = doc.to_dict()
-            business_data["id"] = doc.id
-            businesses.append(business_data)
-            
+        # get_all in concurrent chunks: no 30-id cap, and the profile's order is kept
+        businesses = [
+            dict(business_data, id=business_id)
+            for business_id, business_data in get_by_ids("businesses", business_ids).items()
+            if business_data
+        ]
         return jsonify(businesses)
     
-@app.route("/artisan/<uid>/collaborators", methods=["GET"])
+@api.route("/artisan/<uid>/collaborators", methods=["GET"])
 def get_collaborators(uid):
     artisan_profile = ArtisanManager.get_profile(uid)
     if not artisan_profile:
@@ -172,20 +265,18 @@ def get_collaborators(uid):
     if not collaborator_ids:
         return jsonify([])
 
-    # Fetch profile for each collaborator to get their name
-    collaborator_docs = db.collection("artisans").where("__name__", "in", collaborator_ids).stream()
-    collaborators = []
-    for doc in collaborator_docs:
-        collaborator_data = doc.to_dict()
-        collaborators.append({
-            "uid": doc.id,
-            "name": collaborator_data.get("name", "Unknown")
-        })
+    # Fetch every collaborator's name in one batched read
+    collaborator_docs = get_by_ids("artisans", collaborator_ids, field_paths=["name"])
+    collaborators = [
+        {"uid": collaborator_uid, "name": collaborator_data.get("name", "Unknown")}
+        for collaborator_uid, collaborator_data in collaborator_docs.items()
+        if collaborator_data is not None
+    ]
     return jsonify(collaborators)
 
     
 # UPDATE this route to handle deactivating associated pitches
-@app.route("/business/<business_id>/deactivate", methods=["PUT"])
+@api.route("/business/<business_id>/deactivate", methods=["PUT"])
 def deactivate_business(business_id):
     uid = request.json.get("uid")
     if not uid:
@@ -211,14 +302,19 @@ def deactivate_business(business_id):
     return jsonify({"message": "Business and any associated pitches have been deactivated", "business_id": business_id})
 
 # --- Community & Forum V2 ---
-@app.route("/forum/posts", methods=["GET"])
+@api.route("/forum/posts", methods=["GET"])
 def get_forum_posts():
     sort_by = request.args.get("sort_by", 'new') # Default to 'new'
+    cursor, limit = _page_args(default_limit=20, max_limit=50)
+    viewer_uid = request.args.get("uid") # Optional: include the viewer's own vote on each post
     cm = CommunityManager(uid="global_user") 
-    return jsonify(cm.get_forum_posts(sort_by=sort_by))
+    since, delta_limit = _delta_args()
+    if since:
+        return http_cache.json_response(cm.get_forum_post_changes(since, limit=delta_limit, viewer_uid=viewer_uid))
+    return _paged_response(cm.get_forum_posts(limit=limit, sort_by=sort_by, cursor=cursor, viewer_uid=viewer_uid))
 
 # In app.py, add this new route
-@app.route("/forum/post", methods=["POST"])
+@api.route("/forum/post", methods=["POST"])
 def create_forum_post_route():
     data = request.json
     uid = data.get("uid")
@@ -233,7 +329,7 @@ def create_forum_post_route():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/forum/post/<post_id>/vote", methods=["POST"])
+@api.route("/forum/post/<post_id>/vote", methods=["POST"])
 def vote_on_post_route(post_id):
     uid = request.json.get("uid") 
     vote_type = request.json.get("vote_type")
@@ -253,7 +349,7 @@ def vote_on_post_route(post_id):
         return jsonify({"error": "An internal server error occurred."}), 500
     
 # Add the new DELETE route for forum posts
-@app.route("/forum/post/<post_id>", methods=["DELETE"])
+@api.route("/forum/post/<post_id>", methods=["DELETE"])
 def delete_forum_post_route(post_id):
     uid = request.json.get("uid")
     if not uid: return jsonify({"error": "UID is required"}), 400
@@ -267,18 +363,20 @@ def delete_forum_post_route(post_id):
     except Exception as e:
         return jsonify({"error": "An internal server error occurred"}), 500
 
-@app.route("/communities/list", methods=["GET"])
+@api.route("/communities/list", methods=["GET"])
 def list_communities():
+    cursor, limit = _page_args(default_limit=100)
+    skill_tag = request.args.get("skill_tag") or None
     cm = CommunityManager(uid="global_user")
-    return jsonify(cm.list_communities())
+    return _paged_response(cm.list_communities(limit=limit, cursor=cursor, skill_tag=skill_tag))
 
-@app.route("/community/<uid>/post", methods=["POST"])
+@api.route("/community/<uid>/post", methods=["POST"])
 def forum_post(uid):
     data = request.json
     cm = CommunityManager(uid)
     return jsonify(cm.create_forum_post(data["title"], data["content"]))
 
-@app.route("/community/<uid>/join/<community_id>", methods=["POST"])
+@api.route("/community/<uid>/join/<community_id>", methods=["POST"])
 def join_community(uid, community_id):
     cm = CommunityManager(uid)
     try:
@@ -286,16 +384,17 @@ def join_community(uid, community_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-@app.route("/community/<community_id>/members", methods=["GET"])
+@api.route("/community/<community_id>/members", methods=["GET"])
 def get_community_members(community_id):
+    cursor, limit = _page_args(default_limit=50)
     cm = CommunityManager(uid="global_user")
     try:
-        return jsonify(cm.list_members(community_id))
+        return _paged_response(cm.list_members(community_id, limit=limit, cursor=cursor))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 # --- Collaboration ---
-@app.route("/collab/<uid>/send", methods=["POST"])
+@api.route("/collab/<uid>/send", methods=["POST"])
 def send_collab(uid):
     data = request.json
     cm = CollaborationManager(uid)
@@ -303,7 +402,7 @@ def send_collab(uid):
 
 # In app.py, replace the get_collab_requests function with this one
 
-@app.route("/collab/<uid>/requests", methods=["GET"])
+@api.route("/collab/<uid>/requests", methods=["GET"])
 def get_collab_requests(uid):
     cm = CollaborationManager(uid)
     
@@ -311,38 +410,37 @@ def get_collab_requests(uid):
     sent_requests_raw = cm.list_sent_requests()
 
     # --- THIS IS THE CRUCIAL LOGIC THAT LOOKS UP USER NAMES ---
-    all_uids_needed = set()
-    for req in received_requests_raw:
-        all_uids_needed.add(req.get("from_uid"))
-    for req in sent_requests_raw:
-        all_uids_needed.add(req.get("to_uid"))
-    
+    all_uids_needed = [req.get("from_uid") for req in received_requests_raw] + \
+                      [req.get("to_uid") for req in sent_requests_raw]
+
+    # Search every role collection, regardless of role: chunked, concurrent get_all, one
+    # collection at a time for the uids still missing (most are artisans, found first).
     user_profiles = {}
-    uid_list = list(all_uids_needed)
-
-    if uid_list:
-        # Query all three user collections to find the names, regardless of role.
-        collections_to_search = ["artisans", "mentors", "investors"]
-        for collection_name in collections_to_search:
-            # Note: Firestore 'in' query is limited to 30 items.
-            user_docs = db.collection(collection_name).where("__name__", "in", uid_list).stream()
-            for doc in user_docs:
-                if doc.id not in user_profiles:
-                    user_profiles[doc.id] = doc.to_dict().get("name", "Unknown User")
-            
+    pending = list(dict.fromkeys(u for u in all_uids_needed if u))
+    for _, collection_name in UserDirectory.ROLE_COLLECTIONS:
+        if not pending:
+            break
+        found = get_by_ids(collection_name, pending, field_paths=["name"])
+        user_profiles.update((user_uid, data) for user_uid, data in found.items() if data is not None)
+        pending = [user_uid for user_uid in pending if user_uid not in user_profiles]
+
+    def display_name(user_uid):
+        entry = user_profiles.get(user_uid)
+        return (entry.get("name") or "Unknown User") if entry is not None else "Unknown"
+
     # Add the found names to the request objects before sending
     for req in received_requests_raw:
-        req["from_name"] = user_profiles.get(req.get("from_uid"), "Unknown")
-        
+        req["from_name"] = display_name(req.get("from_uid"))
+
     for req in sent_requests_raw:
-        req["to_name"] = user_profiles.get(req.get("to_uid"), "Unknown")
+        req["to_name"] = display_name(req.get("to_uid"))
 
     return jsonify({
         "received": received_requests_raw,
         "sent": sent_requests_raw
     })
 
-@app.route("/collab/<uid>/update/<request_id>", methods=["PUT"])
+@api.route("/collab/<uid>/update/<request_id>", methods=["PUT"])
 def update_collab(uid, request_id):
     status = request.json.get("status")
     cm = CollaborationManager(uid)
@@ -352,20 +450,24 @@ def update_collab(uid, request_id):
         return jsonify({"error": str(e)}), 403
 
 # --- Discovery (for Mentors/Investors) ---
-@app.route("/artisans/search", methods=["GET"])
+@api.route("/artisans/search", methods=["GET"])
 def search_artisans():
     skill = request.args.get("skill")
+    projection = request.args.get("fields")  # card (default) / detail / full
     if not skill:
-        return jsonify(ArtisanManager.list_all(limit=20))
-    return jsonify(ArtisanManager.search_by_skill(skill))
+        return jsonify(ArtisanManager.list_all(limit=20, projection=projection))
+    return jsonify(ArtisanManager.search_by_skill(skill, projection=projection))
 
 # --- Chat ---
-@app.route("/chat/<uid>/conversations", methods=["GET"])
+@api.route("/chat/<uid>/conversations", methods=["GET"])
 def list_conversations_route(uid):
     cm = ChatManager(uid)
-    return jsonify(cm.list_conversations())
+    since, limit = _delta_args()
+    if since:
+        return http_cache.json_response(cm.get_conversation_changes(since, limit=limit))
+    return _paged_response(cm.list_conversations())
 
-@app.route("/chat/<uid>/send", methods=["POST"])
+@api.route("/chat/<uid>/send", methods=["POST"])
 def send_message_route(uid):
     """Handles sending ALL messages (text and audio initiation)."""
     data = request.json
@@ -383,62 +485,107 @@ def send_message_route(uid):
         print(f"Error in send_message_route: {e}")
         return jsonify({"error": "An internal server error occurred."}), 500
 
-@app.route("/chat/<uid>/send_audio", methods=["POST"])
+@api.route("/chat/<uid>/send_audio", methods=["POST"])
 def send_audio_message_route(uid):
-    """Handles sending subsequent audio file messages."""
-    if 'audio_data' not in request.files:
-        return jsonify({"error": "No audio file part"}), 400
-    file = request.files['audio_data']
-    recipient_uid = request.form.get('to_id')
-    if not file or not recipient_uid:
+    """Handles sending audio messages.
+
+    Accepts either a raw ``audio/*`` body (``?to_id=&duration=``), which is piped
+    straight to storage, or the multipart form (``audio_data``, ``to_id``, ``duration``).
+    The message is stored right away; its transcription follows in the background.
+    """
+    # Reject oversized bodies before reading a byte (multipart framing gets a little slack).
+    if request.content_length and request.content_length > ChatManager.MAX_AUDIO_BYTES + 64 * 1024:
+        return jsonify({"error": "Audio file is too large"}), 413
+    if request.mimetype.startswith("audio/"):
+        stream, content_type, size = request.stream, request.mimetype, request.content_length
+        recipient_uid, duration = request.args.get('to_id'), request.args.get('duration')
+    else:
+        file = request.files.get('audio_data')
+        if not file:
+            return jsonify({"error": "No audio file part"}), 400
+        stream, content_type, size = file.stream, file.mimetype, None
+        recipient_uid, duration = request.form.get('to_id'), request.form.get('duration')
+    if not recipient_uid:
         return jsonify({"error": "Missing audio file or recipient ID"}), 400
     try:
-        audio_bytes = file.read()
-        ai = AIHelper()
-        transcribed_text = ai.speech_to_text(audio_bytes) or "(Audio message)"
-        filename = f"chats/{uid}/{recipient_uid}/{firestore.SERVER_TIMESTAMP}.mp3"
-        audio_url = upload_bytes_to_storage(filename, audio_bytes, file.content_type)
         cm = ChatManager(uid)
-        result = cm.send_message(
-            recipient_uid=recipient_uid, content=transcribed_text,
-            message_type="audio", audio_url=audio_url
-        )
+        result = cm.send_audio_message(recipient_uid, stream, content_type, duration, content_length=size)
         return jsonify(result)
+    except AudioTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except AudioRejected as e:
+        return jsonify({"error": str(e)}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
+        print(f"Error in send_audio_message_route: {e}")
         return jsonify({"error": "Server failed to process audio message"}), 500
 
-@app.route("/chat/<uid>/get/<chat_id>", methods=["GET"])
+@api.route("/chat/<uid>/get/<chat_id>", methods=["GET"])
 def get_chat_messages_route(uid, chat_id):
+    cursor, limit = _page_args(default_limit=50)
     cm = ChatManager(uid)
-    return jsonify(cm.get_messages(chat_id))
+    since, delta_limit = _delta_args()
+    if since:
+        return http_cache.json_response(cm.get_message_changes(chat_id, since, limit=delta_limit))
+    return _paged_response(cm.get_messages(chat_id, limit=limit, cursor=cursor))
+
+@api.route("/chat/<uid>/read/<chat_id>", methods=["POST"])
+def mark_chat_read_route(uid, chat_id):
+    """Clears uid's unread badge for chat_id; the other participant sees it as a read receipt."""
+    if ChatManager.chat_participants(chat_id) is None:
+        return jsonify({"error": f"Conversation '{chat_id}' does not exist."}), 404
+    if not chat_stream.may_stream(uid, chat_id):
+        return jsonify({"error": "Not a participant of this chat"}), 403
+    try:
+        return jsonify(ChatManager(uid).mark_read(chat_id))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+
+@api.route("/chat/<uid>/stream", methods=["GET"])
+def chat_stream_route(uid):
+    """Server-Sent Events: changes to uid's conversations and, with ?chat_id=, that chat's messages."""
+    chat_id = request.args.get("chat_id") or None
+    if chat_id and not chat_stream.may_stream(uid, chat_id):
+        return jsonify({"error": "Not a participant of this chat"}), 403
+    # EventSource resends the last id it saw when it reconnects
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    stream = chat_stream.open_stream(uid, chat_id, last_event_id, dumps=current_app.json.dumps)
+    return Response(stream, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # (Marketplace and Investor routes remain the same)
-@app.route("/marketplace/<uid>/catalog", methods=["GET"])
+@api.route("/marketplace/<uid>/catalog", methods=["GET"])
 def catalog(uid):
     mp = MarketplaceManager(uid)
     return jsonify(mp.export_catalog())
 
-@app.route("/investor/<uid>/fund", methods=["POST"])
+@api.route("/investor/<uid>/fund", methods=["POST"])
 def fund_artisan(uid):
     data = request.json
     return jsonify({"message": f"Investor {uid} funded artisan {data['artisan_id']}"})
 
 # NEW ROUTES for the rich profile page
-@app.route("/user/<uid>/posts", methods=["GET"])
+@api.route("/user/<uid>/posts", methods=["GET"])
 def get_user_posts(uid):
     cm = CommunityManager(uid)
     posts = cm.get_posts_by_user(uid)
     return jsonify(posts)
 
-@app.route("/user/<uid>/communities", methods=["GET"])
+@api.route("/user/<uid>/communities", methods=["GET"])
 def get_user_communities(uid):
+    _, limit = _page_args(default_limit=10)
     cm = CommunityManager(uid)
-    communities = cm.get_communities_for_user(uid)
+    communities = cm.get_communities_for_user(uid, limit=limit)
     return jsonify(communities)
 
 # In app.py, add this new route
 
-@app.route("/community/<uid>/create", methods=["POST"])
+@api.route("/community/<uid>/create", methods=["POST"])
 def create_community_route(uid):
     # Ensure the user is a mentor before allowing creation
     mentor_profile = MentorManager.get_profile(uid)
@@ -459,7 +606,7 @@ def create_community_route(uid):
 
 
 # --- Mentor Features ---
-@app.route("/mentor/review", methods=["GET"])
+@api.route("/mentor/review", methods=["GET"])
 def get_businesses_for_review():
     """Endpoint for mentors to get a list of businesses to review."""
     try:
@@ -468,7 +615,7 @@ def get_businesses_for_review():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/mentor/<uid>/verify/<business_id>", methods=["POST"])
+@api.route("/mentor/<uid>/verify/<business_id>", methods=["POST"])
 def verify_business_route(uid, business_id):
     """Endpoint for a mentor to verify a business."""
     # The uid from the URL confirms which mentor is taking the action
@@ -482,7 +629,7 @@ def verify_business_route(uid, business_id):
     
 # ... (existing routes) ...
 # NEW Community V2 routes
-@app.route("/community/<community_id>", methods=["GET"])
+@api.route("/community/<community_id>", methods=["GET"])
 def get_community_details_route(community_id):
     cm = CommunityManager("global_user")
     try:
@@ -491,12 +638,17 @@ def get_community_details_route(community_id):
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
 
-@app.route("/community/<community_id>/<channel_id>/posts", methods=["GET", "POST"])
+@api.route("/community/<community_id>/<channel_id>/posts", methods=["GET", "POST"])
 def channel_posts_route(community_id, channel_id):
     if request.method == "GET":
+        cursor, limit = _page_args(default_limit=50)
         cm = CommunityManager("global_user")
-        posts = cm.get_channel_posts(community_id, channel_id)
-        return jsonify(posts)
+        since, delta_limit = _delta_args()
+        if since:
+            return http_cache.json_response(
+                cm.get_channel_post_changes(community_id, channel_id, since, limit=delta_limit))
+        posts = cm.get_channel_posts(community_id, channel_id, limit=limit, cursor=cursor)
+        return _paged_response(posts)
 
     if request.method == "POST":
         uid = request.json.get("uid")
@@ -508,7 +660,7 @@ def channel_posts_route(community_id, channel_id):
         result = cm.post_in_channel(community_id, channel_id, message)
         return jsonify(result)
     
-@app.route("/community/<uid>/leave/<community_id>", methods=["POST"])
+@api.route("/community/<uid>/leave/<community_id>", methods=["POST"])
 def leave_community_route(uid, community_id):
     cm = CommunityManager(uid)
     try:
@@ -521,7 +673,7 @@ def leave_community_route(uid, community_id):
 
 # --- Mentorship Features ---
 
-@app.route("/mentor/request", methods=["POST"])
+@api.route("/mentor/request", methods=["POST"])
 def send_mentorship_request():
     """Endpoint for an artisan to send a mentorship request."""
     data = request.json
@@ -535,7 +687,7 @@ def send_mentorship_request():
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-@app.route("/mentor/<uid>/requests", methods=["GET"])
+@api.route("/mentor/<uid>/requests", methods=["GET"])
 def get_mentorship_requests(uid):
     """Endpoint for a mentor to get their pending requests."""
     try:
@@ -544,7 +696,7 @@ def get_mentorship_requests(uid):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/mentor/request/<request_id>", methods=["PUT"])
+@api.route("/mentor/request/<request_id>", methods=["PUT"])
 def update_mentorship_request(request_id):
     """Endpoint for a mentor to accept or reject a request."""
     data = request.json
@@ -558,36 +710,30 @@ def update_mentorship_request(request_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-@app.route("/mentor/<uid>/artisans", methods=["GET"])
+@api.route("/mentor/<uid>/artisans", methods=["GET"])
 def get_connected_artisans(uid):
     """Endpoint for a mentor to get their list of connected artisans."""
     mentor_profile = MentorManager.get_profile(uid)
+    if not mentor_profile: return jsonify({"error": "Mentor not found"}), 404
     artisan_ids = mentor_profile.get("connected_artisans", [])
     if not artisan_ids: return jsonify([])
-    
-    artisans = [ArtisanManager.get_profile(artisan_id) for artisan_id in artisan_ids]
-    # Add UID to each profile for the frontend
-    for i, artisan in enumerate(artisans):
-        if artisan: artisan['uid'] = artisan_ids[i]
-        
-    return jsonify([a for a in artisans if a is not None])
 
-@app.route("/artisan/<uid>/mentors", methods=["GET"])
+    # One batched read for every card (each carries its uid for the frontend)
+    return jsonify(ArtisanManager.get_many(artisan_ids))
+
+@api.route("/artisan/<uid>/mentors", methods=["GET"])
 def get_connected_mentors(uid):
     """Endpoint for an artisan to get their list of connected mentors."""
     artisan_profile = ArtisanManager.get_profile(uid)
+    if not artisan_profile: return jsonify({"error": "Artisan not found"}), 404
     mentor_ids = artisan_profile.get("connected_mentors", [])
     if not mentor_ids: return jsonify([])
 
-    mentors = [MentorManager.get_profile(mentor_id) for mentor_id in mentor_ids]
-    for i, mentor in enumerate(mentors):
-        if mentor: mentor['uid'] = mentor_ids[i]
-
-    return jsonify([m for m in mentors if m is not None])
+    return jsonify(MentorManager.get_many(mentor_ids))
 
 # --- Marketplace Routes ---
 # ADD this new route to get a single pitch's details
-@app.route("/marketplace/pitch/<pitch_id>", methods=["GET"])
+@api.route("/marketplace/pitch/<pitch_id>", methods=["GET"])
 def get_pitch_details_route(pitch_id):
     try:
         pitch = InvestmentManager.get_pitch_details(pitch_id)
@@ -597,15 +743,18 @@ def get_pitch_details_route(pitch_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
-@app.route("/marketplace/pitches", methods=["GET"])
+@api.route("/marketplace/pitches", methods=["GET"])
 def list_pitches_route():
+    cursor, limit = _page_args(default_limit=50)
     try:
-        pitches = InvestmentManager.list_open_pitches()
-        return jsonify(pitches)
+        pitches = InvestmentManager.list_open_pitches(limit=limit, cursor=cursor)
+        return _paged_response(pitches)
+    except InvalidCursor:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/marketplace/pitch", methods=["POST"])
+@api.route("/marketplace/pitch", methods=["POST"])
 def create_pitch_route():
     data = request.json
     uid = data.get("uid") # Artisan's UID
@@ -618,7 +767,7 @@ def create_pitch_route():
     except Exception as e:
         return jsonify({"error": "An internal server error occurred"}), 500
 
-@app.route("/marketplace/pitch/<pitch_id>/interest", methods=["POST"])
+@api.route("/marketplace/pitch/<pitch_id>/interest", methods=["POST"])
 def show_interest_route(pitch_id):
     investor_uid = request.json.get("uid")
     if not investor_uid: return jsonify({"error": "Investor UID is required"}), 400
@@ -628,7 +777,7 @@ def show_interest_route(pitch_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/marketplace/pitch/<pitch_id>/fund", methods=["POST"])
+@api.route("/marketplace/pitch/<pitch_id>/fund", methods=["POST"])
 def fund_pitch_route(pitch_id):
     investor_uid = request.json.get("uid")
     amount = request.json.get("amount")
@@ -642,7 +791,7 @@ def fund_pitch_route(pitch_id):
     
     
 # --- User Search ---
-@app.route("/users/search", methods=["GET"])
+@api.route("/users/search", methods=["GET"])
 def search_users_by_name():
     """Endpoint for searching users by name prefix."""
     name_prefix = request.args.get("name")
@@ -650,9 +799,50 @@ def search_users_by_name():
         return jsonify({"error": "A 'name' query parameter is required."}), 400
     
     # For now, this only searches artisans. Can be expanded to search mentors/investors.
-    artisans = ArtisanManager.search_by_name_prefix(name_prefix)
+    artisans = ArtisanManager.search_by_name_prefix(name_prefix, projection=request.args.get("fields"))
     return jsonify(artisans)
 
-if __name__ == "__main__":
+# --- Application factory ---
+def create_app(config: Optional[Dict] = None) -> Flask:
+    """Build the Flask app.
+
+    Building it starts nothing, so importing this module has no side effects:
+    Firestore and the AI SDK clients are created on first use, and a serving
+    process starts its background work with start_background_work().
+    """
+    app = Flask(__name__)
+    if config:
+        app.config.update(config)
+    CORS(app, expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "X-Watermark", "Server-Timing", "ETag"])
+    app.register_blueprint(api)
+    # Per-request Firestore reads/writes -> Server-Timing header, log line, /admin/firestore/stats
+    firestore_metrics.init_app(app)
+    # ETag'd JSON is compressed per the client's Accept-Encoding (br when installed, else gzip)
+    http_cache.init_app(app)
+    return app
+
+
+def start_background_work(warm_up: Optional[bool] = None) -> None:
+    """Start a serving process's background work.
+
+    Runs the forum feed maintenance and, with ``warm_up=True`` (or
+    WARM_UP_ON_START=1), builds the SDK clients on a background thread instead
+    of on the first request. Called under ``__main__`` and from gunicorn's
+    ``post_worker_init`` hook (gunicorn.conf.py), never on import.
+    """
+    # Periodic score aggregation + hot/rising re-ranking for the forum feed
+    CommunityManager.start_feed_maintenance()
+    if warm_up is None:
+        warm_up = os.environ.get("WARM_UP_ON_START", "").lower() in ("1", "true", "yes")
+    if warm_up:
+        background.submit_once("warm_up", startup.warm_up)
+
+# Render workers (image_pipeline's spawn pool) re-import the main script as __mp_main__: they only render.
+if __name__ != "__mp_main__":
+    app = create_app()
 
+if __name__ == "__main__":
+    # With debug=True the reloader re-runs this file in a child that serves; the watcher itself only restarts it
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_work()
     app.run(debug=True, port=5000)
@@ -39,9 +39,9 @@ class Artisan(User):
         return f"{self.name} is collaborating with {artisan.name}"
 
     # ----------------- AI Features -----------------
-    def generate_business_idea(self) -> List[str]:
+    def generate_business_idea(self, refresh: bool = False) -> List[str]:
         """Generate business ideas from artisan’s skills + materials."""
-        ideas = self.ai.generate_ideas(self.skills, self.materials)
+        ideas = self.ai.generate_ideas(self.skills, self.materials, refresh=refresh, user_uid=self.uid)
         self.business_ideas.extend(ideas)
         return ideas
 
@@ -57,12 +57,15 @@ class Artisan(User):
         """Generate an image (e.g., product mockup)."""
         return self.ai.generate_image(description, upload, path)
 
-    def get_schemes(self) -> List[Dict]:
-        """Fetch relevant schemes based on artisan profile."""
-        profile = {
+    def scheme_profile(self) -> Dict:
+        """The profile fields that government-scheme recommendations depend on."""
+        return {
             "location": self.location,
             "skills": self.skills,
             "bio": self.bio
         }
-        return self.ai.get_schemes(profile)
+
+    def get_schemes(self) -> List[Dict]:
+        """Fetch relevant schemes based on artisan profile."""
+        return self.ai.get_schemes(self.scheme_profile())
 
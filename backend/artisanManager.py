@@ -2,13 +2,21 @@
 from typing import Dict, List, Optional
 from firebase_config import db
 from firebase_admin import firestore
+from user_directory import UserDirectory
+from batch_lookup import get_by_ids
+import projections
 from artisan import Artisan
+from schemeManager import SchemeManager
 
 
 class ArtisanManager:
     """Manager for handling Artisan collection operations in Firestore."""
 
     COLLECTION = "artisans"
+    # What a profile card shows; get_many reads only these by default.
+    CARD_FIELDS = ["name", "bio", "skills", "location", "avatar_url"]
+    DETAIL_FIELDS = CARD_FIELDS + ["materials", "businesses", "connected_mentors", "collaborators", "created_at"]
+    PROJECTIONS = {"card": CARD_FIELDS, "detail": DETAIL_FIELDS, "full": None}
     
     @classmethod
     def add_collaborator(cls, user_uid: str, collaborator_uid: str):
@@ -47,6 +55,7 @@ class ArtisanManager:
             "updated_at": firestore.SERVER_TIMESTAMP
         }
         doc_ref.set(artisan_data)
+        UserDirectory.invalidate(uid)
         return uid
 
     @classmethod
@@ -55,31 +64,46 @@ class ArtisanManager:
         doc = db.collection(cls.COLLECTION).document(uid).get()
         return doc.to_dict() if doc.exists else None
 
+    @classmethod
+    def get_many(cls, uids: List[str], fields: Optional[List[str]] = None) -> List[Dict]:
+        """Fetch several artisan profiles with one batched read, in the order given (unknown uids skipped).
+
+        Only ``fields`` (default: CARD_FIELDS) are read; each profile also carries its ``uid``.
+        """
+        profiles = get_by_ids(cls.COLLECTION, uids, field_paths=fields or cls.CARD_FIELDS)
+        return [dict(data, uid=uid) for uid, data in profiles.items() if data is not None]
+
     @classmethod
     def update_profile(cls, uid: str, updates: Dict) -> Dict:
         """Update an artisan’s profile fields."""
         updates["updated_at"] = firestore.SERVER_TIMESTAMP
         db.collection(cls.COLLECTION).document(uid).update(updates)
+        UserDirectory.invalidate(uid)
+        # Re-warm scheme recommendations off-request when the fields they depend on change
+        if any(field in updates for field in SchemeManager.PROFILE_FIELDS):
+            SchemeManager(uid).refresh_in_background()
         return {"message": "Profile updated", "uid": uid}
 
     @classmethod
     def delete(cls, uid: str) -> Dict:
         """Delete artisan profile."""
         db.collection(cls.COLLECTION).document(uid).delete()
+        UserDirectory.invalidate(uid)
         return {"message": "Artisan deleted", "uid": uid}
 
     @classmethod
-    def list_all(cls, limit: int = 50) -> List[Dict]:
-        """List all artisans (basic info)."""
-        q = db.collection(cls.COLLECTION).limit(limit)
-        return [dict(d.to_dict(), uid=d.id) for d in q.stream()]
+    def list_all(cls, limit: int = 50, projection: Optional[str] = None) -> List[Dict]:
+        """List artisans, reading only the fields of ``projection`` (see PROJECTIONS)."""
+        q = projections.select(db.collection(cls.COLLECTION), projections.field_mask(cls.PROJECTIONS, projection))
+        return [projections.public_profile(d) for d in q.limit(limit).stream()]
 
     @classmethod
-    def search_by_skill(cls, skill: str, limit: int = 20) -> List[Dict]:
+    def search_by_skill(cls, skill: str, limit: int = 20, projection: Optional[str] = None) -> List[Dict]:
         """Search artisans by skill (case-insensitive)."""
         skill_lower = skill.lower()
-        q = db.collection(cls.COLLECTION).where("skills", "array_contains", skill_lower).limit(limit)
-        return [dict(d.to_dict(), uid=d.id) for d in q.stream()]
+        q = db.collection(cls.COLLECTION).where("skills", "array_contains", skill_lower)
+        q = projections.select(q, projections.field_mask(cls.PROJECTIONS, projection))
+        return [projections.public_profile(d) for d in q.limit(limit).stream()]
 
     @classmethod
     def hydrate_entity(cls, uid: str) -> Optional[Artisan]:
@@ -123,12 +147,12 @@ class ArtisanManager:
         return {"message": "Mentor connected to artisan"}
     
     @classmethod
-    def search_by_name_prefix(cls, name_prefix: str, limit: int = 10) -> List[Dict]:
+    def search_by_name_prefix(cls, name_prefix: str, limit: int = 10, projection: Optional[str] = None) -> List[Dict]:
         """Search for artisans where the name starts with the given prefix (case-insensitive)."""
         # Firestore's method for "starts with" queries
         start_at = name_prefix.lower()
         end_at = start_at + '\uf8ff'
         
-        q = db.collection(cls.COLLECTION).where("name_lower", ">=", start_at).where("name_lower", "<=", end_at).limit(limit)
-        
-        return [dict(d.to_dict(), uid=d.id) for d in q.stream()]
+        q = db.collection(cls.COLLECTION).where("name_lower", ">=", start_at).where("name_lower", "<=", end_at)
+        q = projections.select(q, projections.field_mask(cls.PROJECTIONS, projection))
+        return [projections.public_profile(d) for d in q.limit(limit).stream()]
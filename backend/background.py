@@ -0,0 +1,86 @@
+# kalasetu/background.py
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_MAX_WORKERS = int(os.environ.get("BACKGROUND_WORKERS", 4))
+
+_executor = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="kalasetu-bg")
+_pending: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Runs in a forked child: the parent's pool threads, timers and periodic loops did not come along."""
+    global _executor, _pending, _lock
+    _lock = threading.Lock()
+    _pending = {}
+    _executor = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="kalasetu-bg")
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _run(key: str, fn: Callable, args, kwargs):
+    with _lock:
+        _pending.pop(key, None)
+    try:
+        fn(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Background task {key} failed: {e}")
+
+
+def submit_once(key: str, fn: Callable, *args, **kwargs) -> bool:
+    """Run ``fn`` on the shared pool unless a task with the same key is already queued.
+
+    Returns True if the task was scheduled, False if it was coalesced into a pending one.
+    """
+    with _lock:
+        if key in _pending:
+            return False
+        _pending[key] = True
+    _executor.submit(_run, key, fn, args, kwargs)
+    return True
+
+
+def schedule_once(key: str, delay: float, fn: Callable, *args, **kwargs) -> bool:
+    """Like :func:`submit_once`, but wait ``delay`` seconds first.
+
+    Every call made for the same key during the delay collapses into one run,
+    which makes this a cheap per-worker debounce.
+    """
+    with _lock:
+        if key in _pending:
+            return False
+        timer = threading.Timer(delay, lambda: _executor.submit(_run, key, fn, args, kwargs))
+        timer.daemon = True
+        _pending[key] = timer
+    timer.start()
+    return True
+
+
+def run_periodically(key: str, interval: float, fn: Callable, *args, **kwargs) -> bool:
+    """Start a daemon thread that calls ``fn`` every ``interval`` seconds (first run after one interval).
+
+    Only one loop per key is started per process. Returns False if it was already running.
+    """
+    with _lock:
+        if f"periodic:{key}" in _pending:
+            return False
+        stop = threading.Event()
+        _pending[f"periodic:{key}"] = stop
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Periodic task {key} failed: {e}")
+
+    threading.Thread(target=loop, name=f"kalasetu-{key}", daemon=True).start()
+    return True
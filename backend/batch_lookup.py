@@ -0,0 +1,63 @@
+# kalasetu/batch_lookup.py
+"""Fetch many documents by id in one round-trip time.
+
+``where("__name__", "in", ids)`` stops working past Firestore's 30-value limit,
+so id lists are read with ``get_all`` on document references instead. Large
+lists are split into chunks that run concurrently on a small shared thread
+pool; results always come back in the order the ids were given.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+from firebase_config import db
+
+T = TypeVar("T")
+
+GET_ALL_CHUNK = int(os.environ.get("BATCH_LOOKUP_CHUNK", 100))
+WORKERS = int(os.environ.get("BATCH_LOOKUP_WORKERS", 8))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="batch-lookup")
+    return _executor
+
+
+def chunked(items: Sequence[T], size: int) -> List[Sequence[T]]:
+    return [items[i:i + size] for i in range(0, len(items), max(1, size))]
+
+
+def map_chunks(fn: Callable[[Sequence[T]], List], chunks: List[Sequence[T]]) -> List:
+    """Run ``fn`` over every chunk (concurrently when there is more than one) and concatenate in order."""
+    if len(chunks) <= 1:
+        return [item for chunk in chunks for item in fn(chunk)]
+    # Each task runs in a copy of the caller's context, so per-request I/O accounting still sees it.
+    futures = [_pool().submit(contextvars.copy_context().run, fn, chunk) for chunk in chunks]
+    return [item for future in futures for item in future.result()]
+
+
+def get_by_ids(collection: str, ids: Iterable[str],
+               field_paths: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+    """Read ``collection/{id}`` for every id. Returns ``{id: data or None}`` in input order (duplicates dropped).
+
+    ``field_paths`` projects the documents down to the fields the caller needs.
+    """
+    wanted = [i for i in dict.fromkeys(ids) if i]
+    if not wanted:
+        return {}
+    collection_ref = db.collection(collection)
+
+    def fetch(chunk):
+        refs = [collection_ref.document(doc_id) for doc_id in chunk]
+        return list(db.get_all(refs, field_paths=field_paths))
+
+    found = {snap.id: snap.to_dict() for snap in map_chunks(fetch, chunked(wanted, GET_ALL_CHUNK)) if snap.exists}
+    return {doc_id: found.get(doc_id) for doc_id in wanted}
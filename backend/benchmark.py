@@ -0,0 +1,404 @@
+# kalasetu/benchmark.py
+"""End-to-end route benchmark against the in-memory Firestore backend.
+
+Seeds synthetic users, forum posts, communities, chats, businesses and pitches
+through the Flask test client (so every write takes the same code path as in
+production), then replays a fixed set of routes and reports, per route:
+p50/p95 latency, Firestore RPCs, document reads/writes and response bytes.
+Each route declares an RPC budget; a run fails if any request exceeds it, so
+an N+1 lookup creeping into a handler shows up as a failed benchmark.
+
+    python benchmark.py                          # "small" scale
+    python benchmark.py --scale full             # 10k artisans, 100k posts, 1M chat messages
+    python benchmark.py --messages 200000 --iterations 100 --route forum_posts_new
+    FIRESTORE_MEMORY_LATENCY_MS=2,query=6 python benchmark.py   # emulate network round trips
+
+The UserDirectory and community directory caches are cleared before every
+request, so the numbers are those of a cold worker (the worst case, and
+deterministic). RPC and document counts are exact; latencies are in-process
+(the memory store scans whole collections, so large ones cost more than in
+Firestore) plus whatever RPC latency is configured.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+SCALES = {
+    "smoke": dict(artisans=40, mentors=8, investors=6, communities=4, posts=200,
+                  channel_posts=200, messages=500, businesses=10),
+    "small": dict(artisans=1_000, mentors=100, investors=50, communities=20, posts=10_000,
+                  channel_posts=5_000, messages=50_000, businesses=200),
+    "full": dict(artisans=10_000, mentors=500, investors=200, communities=50, posts=100_000,
+                 channel_posts=50_000, messages=1_000_000, businesses=2_000),
+}
+
+# Fan-out per seeded user; routes that hydrate these lists scale with them.
+MENTORS_PER_ARTISAN = 3
+CHATS_PER_ARTISAN = 4
+COLLAB_REQUESTS_PER_ARTISAN = 2
+INTERESTED_INVESTORS_PER_PITCH = 3
+
+SKILLS = ["weaving", "pottery", "embroidery", "woodwork", "metalwork", "painting", "jewellery", "leather"]
+
+
+class BenchmarkError(RuntimeError):
+    """Raised when seeding hits a route that does not answer 2xx."""
+
+
+@dataclass
+class Route:
+    """One benchmarked request. ``path`` and ``body`` are built from the seeded fixtures."""
+    name: str
+    method: str
+    path: Callable[["Fixtures", int], str]
+    rpc_budget: int
+    body: Optional[Callable[["Fixtures", int], Dict]] = None
+
+
+@dataclass
+class Fixtures:
+    """Ids created while seeding, used to address the benchmarked routes."""
+    artisans: List[str] = field(default_factory=list)
+    mentors: List[str] = field(default_factory=list)
+    investors: List[str] = field(default_factory=list)
+    communities: List[str] = field(default_factory=list)
+    posts: List[str] = field(default_factory=list)
+    chats: List[tuple] = field(default_factory=list)  # (uid, chat_id)
+    businesses: Dict[str, str] = field(default_factory=dict)  # business_id -> owner uid
+    pitches: List[str] = field(default_factory=list)
+
+    @staticmethod
+    def pick(items: List, i: int):
+        return items[i % len(items)]
+
+
+def _watermark_now() -> str:
+    """A watermark at the current time (no clock-skew overlap, so the freshly seeded data is not a change)."""
+    from datetime import datetime, timezone
+    from delta_sync import encode_watermark  # app modules load after the memory backend is selected
+    now = (datetime.now(timezone.utc), "")
+    return encode_watermark(now, now)
+
+
+ROUTES = [
+    Route("profile_artisan", "GET", lambda f, i: f"/profile/artisan/{f.pick(f.artisans, i)}", 1),
+    Route("artisans_search", "GET", lambda f, i: f"/artisans/search?skill={SKILLS[i % len(SKILLS)]}", 1),
+    Route("mentors_search", "GET", lambda f, i: "/mentors/search", 1),
+    Route("users_search", "GET", lambda f, i: f"/users/search?name=Artisan {i % 10}", 1),
+    Route("forum_posts_new", "GET", lambda f, i: "/forum/posts?sort_by=new&limit=20", 2),
+    Route("forum_posts_hot_viewer", "GET",
+          lambda f, i: f"/forum/posts?sort_by=hot&limit=20&uid={f.pick(f.artisans, i)}", 3),
+    # A steady-state poll with nothing new: changed posts query + tombstones query.
+    Route("forum_changes", "GET", lambda f, i: f"/forum/posts?since={_watermark_now()}", 2),
+    Route("communities_list", "GET", lambda f, i: "/communities/list", 1),
+    Route("community_members", "GET", lambda f, i: f"/community/{f.pick(f.communities, i)}/members", 1),
+    Route("channel_posts", "GET", lambda f, i: f"/community/{f.pick(f.communities, i)}/general/posts", 2),
+    # Membership collection-group query, then one batched read of the communities it names.
+    Route("user_communities", "GET", lambda f, i: f"/user/{f.pick(f.artisans, i)}/communities", 2),
+    Route("chat_conversations", "GET", lambda f, i: f"/chat/{f.pick(f.artisans, i)}/conversations", 1),
+    Route("chat_messages", "GET", lambda f, i: "/chat/{}/get/{}".format(*f.pick(f.chats, i)), 1),
+    Route("collab_requests", "GET", lambda f, i: f"/collab/{f.pick(f.artisans, i)}/requests", 3),
+    Route("artisan_business", "GET", lambda f, i: f"/artisan/{f.pick(list(f.businesses.values()), i)}/business", 2),
+    # Own profile + one batched read for every connected profile, however many there are.
+    Route("connected_mentors", "GET", lambda f, i: f"/artisan/{f.pick(f.artisans, i)}/mentors", 2),
+    Route("connected_artisans", "GET", lambda f, i: f"/mentor/{f.pick(f.mentors, i)}/artisans", 2),
+    Route("mentorship_requests", "GET", lambda f, i: f"/mentor/{f.pick(f.mentors, i)}/requests", 2),
+    Route("pitches_list", "GET", lambda f, i: "/marketplace/pitches", 1),
+    Route("pitch_details", "GET", lambda f, i: f"/marketplace/pitch/{f.pick(f.pitches, i)}", 2),
+    # Cold process: one chat_index check, a new chat's name lookup (artisans, then mentors), one batch commit.
+    Route("chat_send", "POST", lambda f, i: f"/chat/{f.pick(f.artisans, i)}/send", 4,
+          body=lambda f, i: {"to_id": f.pick(f.mentors, i), "content": f"benchmark message {i}"}),
+    # Last: a vote schedules a background score refresh, which would show up in later routes' counts.
+    Route("forum_vote", "POST", lambda f, i: f"/forum/post/{f.pick(f.posts, i)}/vote", 4,
+          body=lambda f, i: {"uid": f.pick(f.investors, i), "vote_type": "up" if i % 2 else "down"}),
+]
+
+
+# ---------------- Seeding ---------------- #
+class Seeder:
+    """Creates synthetic data through the public routes."""
+
+    def __init__(self, client, scale: Dict[str, int], seed: int = 7, progress: Optional[Callable[[str], None]] = None):
+        self.client = client
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.progress = progress or (lambda message: None)
+        self.fixtures = Fixtures()
+
+    def _call(self, method: str, path: str, body: Optional[Dict] = None) -> Dict:
+        resp = self.client.open(path, method=method, json=body)
+        if resp.status_code >= 300:
+            raise BenchmarkError(f"{method} {path} -> {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        return resp.get_json()
+
+    def _repeat(self, label: str, count: int, step: Callable[[int], None]) -> None:
+        report_every = max(1, count // 10)
+        for i in range(count):
+            step(i)
+            if (i + 1) % report_every == 0 or i + 1 == count:
+                self.progress(f"  {label}: {i + 1}/{count}")
+
+    def run(self) -> Fixtures:
+        f, s = self.fixtures, self.scale
+        self._repeat("artisans", s["artisans"], self._signup_artisan)
+        self._repeat("mentors", s["mentors"], self._signup_mentor)
+        self._repeat("investors", s["investors"], self._signup_investor)
+        self._repeat("mentorships", len(f.artisans), self._connect_mentors)
+        self._repeat("collab requests", len(f.artisans), self._send_collab_requests)
+        self._repeat("communities", s["communities"], self._create_community)
+        self._repeat("community joins", len(f.artisans), self._join_community)
+        self._repeat("channel posts", s["channel_posts"], self._post_in_channel)
+        self._repeat("forum posts", s["posts"], self._create_forum_post)
+        self._repeat("chat messages", s["messages"], self._send_chat_message)
+        self._repeat("businesses", s["businesses"], self._create_business)
+        return f
+
+    def _signup(self, role: str, uid: str, **extra) -> None:
+        self._call("POST", f"/signup/{role}", dict(
+            uid=uid, name=f"{role.title()} {uid.rsplit('_', 1)[-1]}", email=f"{uid}@bench.test",
+            password="bench", bio=f"Synthetic {role} for benchmarking", location="Jaipur", **extra
+        ))
+
+    def _signup_artisan(self, i: int) -> None:
+        uid = f"artisan_{i}"
+        self._signup("artisan", uid, skills=self.rng.sample(SKILLS, 2), materials=["cotton", "clay"])
+        self.fixtures.artisans.append(uid)
+
+    def _signup_mentor(self, i: int) -> None:
+        uid = f"mentor_{i}"
+        self._signup("mentor", uid, expertise=self.rng.sample(SKILLS, 2))
+        self.fixtures.mentors.append(uid)
+
+    def _signup_investor(self, i: int) -> None:
+        uid = f"investor_{i}"
+        self._signup("investor", uid, interests=self.rng.sample(SKILLS, 2))
+        self.fixtures.investors.append(uid)
+
+    def _connect_mentors(self, i: int) -> None:
+        artisan = self.fixtures.artisans[i]
+        for mentor in self.rng.sample(self.fixtures.mentors, min(MENTORS_PER_ARTISAN, len(self.fixtures.mentors))):
+            request_id = self._call("POST", "/mentor/request", {
+                "artisan_uid": artisan, "mentor_uid": mentor, "message": "Please mentor me"
+            })["request_id"]
+            self._call("PUT", f"/mentor/request/{request_id}", {"mentor_uid": mentor, "status": "accepted"})
+        # Leave one pending request so the mentor inbox is not empty.
+        self._call("POST", "/mentor/request", {
+            "artisan_uid": artisan, "mentor_uid": self.fixtures.pick(self.fixtures.mentors, i), "message": "Follow-up"
+        })
+
+    def _send_collab_requests(self, i: int) -> None:
+        artisan = self.fixtures.artisans[i]
+        for _ in range(COLLAB_REQUESTS_PER_ARTISAN):
+            self._call("POST", f"/collab/{artisan}/send", {
+                "to_id": self.rng.choice(self.fixtures.artisans), "message": "Let's build something"
+            })
+
+    def _create_community(self, i: int) -> None:
+        mentor = self.fixtures.pick(self.fixtures.mentors, i)
+        community_id = self._call("POST", f"/community/{mentor}/create", {
+            "name": f"Community {i}", "skill_tags": [SKILLS[i % len(SKILLS)]], "description": "Benchmark community"
+        })["community_id"]
+        self.fixtures.communities.append(community_id)
+
+    def _join_community(self, i: int) -> None:
+        artisan = self.fixtures.artisans[i]
+        self._call("POST", f"/community/{artisan}/join/{self.rng.choice(self.fixtures.communities)}")
+
+    def _post_in_channel(self, i: int) -> None:
+        self._call("POST", f"/community/{self.fixtures.pick(self.fixtures.communities, i)}/general/posts", {
+            "uid": self.rng.choice(self.fixtures.artisans), "message": f"Channel message {i}"
+        })
+
+    def _create_forum_post(self, i: int) -> None:
+        post_id = self._call("POST", "/forum/post", {
+            "uid": self.rng.choice(self.fixtures.artisans), "title": f"Post {i}", "content": "Benchmark post body " * 8
+        })["post_id"]
+        self.fixtures.posts.append(post_id)
+
+    def _send_chat_message(self, i: int) -> None:
+        # Each artisan talks to a fixed handful of partners; messages alternate direction.
+        artisans = self.fixtures.artisans
+        a = (i // CHATS_PER_ARTISAN) % len(artisans)
+        artisan, partner = artisans[a], artisans[(a + 1 + i % CHATS_PER_ARTISAN) % len(artisans)]
+        sender, recipient = (artisan, partner) if i % 2 else (partner, artisan)
+        chat_id = self._call("POST", f"/chat/{sender}/send", {"to_id": recipient, "content": f"Message {i}"})["chat_id"]
+        if i < len(artisans) * CHATS_PER_ARTISAN:
+            self.fixtures.chats.append((sender, chat_id))
+
+    def _create_business(self, i: int) -> None:
+        f = self.fixtures
+        owner = f.pick(f.artisans, i)
+        business_id = self._call("POST", f"/artisan/{owner}/business", {
+            "business_name": f"Business {i}", "description": "Benchmark business", "category": "crafts"
+        })["business_id"]
+        f.businesses[business_id] = owner
+        if i % 2:
+            return  # half of the businesses stay unverified
+        self._call("POST", f"/mentor/{f.pick(f.mentors, i)}/verify/{business_id}")
+        pitch_id = self._call("POST", "/marketplace/pitch", {
+            "uid": owner, "business_id": business_id, "pitch_title": f"Pitch {i}",
+            "pitch_details": "Benchmark pitch", "funding_goal": 100000, "equity_offered": 10
+        })["pitch_id"]
+        for investor in self.rng.sample(f.investors, min(INTERESTED_INVESTORS_PER_PITCH, len(f.investors))):
+            self._call("POST", f"/marketplace/pitch/{pitch_id}/interest", {"uid": investor})
+        f.pitches.append(pitch_id)
+
+
+# ---------------- Measuring ---------------- #
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+@contextmanager
+def no_latency(db):
+    """Seed at full speed; the configured RPC latency only applies while measuring."""
+    saved = (db.latency_ms, db.latency_by_op, db.jitter_ms)
+    db.latency_ms, db.latency_by_op, db.jitter_ms = 0.0, {}, 0.0
+    try:
+        yield db
+    finally:
+        db.latency_ms, db.latency_by_op, db.jitter_ms = saved
+
+
+def measure_route(client, db, route: Route, fixtures: Fixtures, iterations: int) -> Dict:
+    from user_directory import UserDirectory
+    from community_manager import CommunityManager
+    from chat_manager import ChatManager
+
+    latencies, rpcs, reads, writes, sizes, statuses = [], [], [], [], [], set()
+    for i in range(iterations):
+        UserDirectory.clear()
+        CommunityManager.clear_directory_cache()
+        ChatManager.clear_known_chats()
+        body = route.body(fixtures, i) if route.body else None
+        path = route.path(fixtures, i)
+        db.reset_stats()
+        start = time.perf_counter()
+        resp = client.open(path, method=route.method, json=body)
+        payload = resp.get_data()
+        latencies.append((time.perf_counter() - start) * 1000)
+        stats = db.stats()
+        rpcs.append(stats["rpc_total"])
+        reads.append(stats["reads"])
+        writes.append(stats["writes"])
+        sizes.append(len(payload))
+        statuses.add(resp.status_code)
+
+    max_rpcs = max(rpcs) if rpcs else 0
+    return {
+        "route": route.name,
+        "method": route.method,
+        "requests": iterations,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "rpcs_max": max_rpcs,
+        "reads_avg": round(sum(reads) / max(1, len(reads)), 1),
+        "writes_avg": round(sum(writes) / max(1, len(writes)), 1),
+        "bytes_avg": round(sum(sizes) / max(1, len(sizes))),
+        "statuses": sorted(statuses),
+        "rpc_budget": route.rpc_budget,
+        "over_budget": max_rpcs > route.rpc_budget,
+    }
+
+
+def run(scale: Dict[str, int], iterations: int = 20, routes: Optional[List[Route]] = None,
+        flask_app=None, progress: Optional[Callable[[str], None]] = None, seed: int = 7) -> Dict:
+    """Seed ``scale`` worth of data and measure ``routes``. Returns the report dict.
+
+    Expects the process-wide Firestore client to be a MemoryFirestore
+    (FIRESTORE_BACKEND=memory, or one installed with ``firebase_client.set_db``).
+    """
+    import firebase_client
+    from memory_firestore import MemoryFirestore
+    from user_directory import UserDirectory
+
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app({"TESTING": True})
+    db = firebase_client.get_db()
+    if not isinstance(db, MemoryFirestore):
+        raise BenchmarkError("The benchmark seeds synthetic data; run it with FIRESTORE_BACKEND=memory.")
+    progress = progress or (lambda message: None)
+
+    with flask_app.test_client() as client:
+        started = time.perf_counter()
+        progress("Seeding...")
+        with no_latency(db):
+            fixtures = Seeder(client, scale, seed=seed, progress=progress).run()
+        seed_seconds = time.perf_counter() - started
+        UserDirectory.clear()
+
+        results = []
+        for route in routes or ROUTES:
+            progress(f"Measuring {route.name}...")
+            results.append(measure_route(client, db, route, fixtures, iterations))
+
+    return {
+        "scale": dict(scale),
+        "iterations": iterations,
+        "documents": db.document_count(),
+        "seed_seconds": round(seed_seconds, 1),
+        "routes": results,
+        "over_budget": [r["route"] for r in results if r["over_budget"]],
+    }
+
+
+def format_report(report: Dict) -> str:
+    header = (f"{'route':<24} {'p50 ms':>8} {'p95 ms':>8} {'rpcs':>5} {'budget':>6} "
+              f"{'reads':>7} {'writes':>7} {'bytes':>9}  status")
+    lines = [
+        f"{report['documents']} documents seeded in {report['seed_seconds']} s; "
+        f"{report['iterations']} requests per route",
+        "", header, "-" * len(header),
+    ]
+    for r in report["routes"]:
+        flag = "OVER BUDGET" if r["over_budget"] else "ok"
+        lines.append(
+            f"{r['route']:<24} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['rpcs_max']:>5} {r['rpc_budget']:>6} "
+            f"{r['reads_avg']:>7} {r['writes_avg']:>7} {r['bytes_avg']:>9}  {flag} {r['statuses']}"
+        )
+    if report["over_budget"]:
+        lines += ["", "Over RPC budget: " + ", ".join(report["over_budget"])]
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+    parser = argparse.ArgumentParser(description="Benchmark the API routes against seeded synthetic data.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for key in SCALES["small"]:
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, dest=key, help=f"override the scale's {key}")
+    parser.add_argument("--iterations", type=int, default=20, help="requests per route")
+    parser.add_argument("--route", action="append", help="only measure these routes (repeatable)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    scale = dict(SCALES[args.scale])
+    scale.update({key: getattr(args, key) for key in scale if getattr(args, key) is not None})
+    routes = ROUTES
+    if args.route:
+        unknown = set(args.route) - {r.name for r in ROUTES}
+        if unknown:
+            parser.error(f"unknown route(s): {', '.join(sorted(unknown))}")
+        routes = [r for r in ROUTES if r.name in args.route]
+
+    report = run(scale, iterations=args.iterations, routes=routes, seed=args.seed,
+                 progress=lambda message: print(message, file=sys.stderr))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 1 if report["over_budget"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
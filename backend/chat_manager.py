@@ -1,21 +1,83 @@
 # kalasetu/chat_manager.py
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
 from firebase_config import db
 from firebase_admin import firestore
-from typing import List, Dict
+from google.api_core.exceptions import NotFound
+from typing import List, Dict, Optional, Tuple
+from user_directory import UserDirectory
+from pagination import Page, paginate, snapshot_version
+import delta_sync
+from firebase_client import upload_stream_to_storage, download_blob_to_file
+from ai_helper import AIHelper
+import background
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRejected(ValueError):
+    """Raised when an audio message fails the up-front checks (type, duration)."""
+
+
+class AudioTooLarge(AudioRejected):
+    """Raised when an audio upload exceeds MAX_AUDIO_BYTES."""
+
+
+class _LimitedReader:
+    """File-like wrapper that stops a stream once it grows past ``limit`` bytes."""
+
+    def __init__(self, stream, limit: int):
+        self._stream = stream
+        self._limit = limit
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._limit + 1 - self.bytes_read
+        chunk = self._stream.read(min(size, self._limit + 1 - self.bytes_read))
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self._limit:
+            raise AudioTooLarge(f"Audio exceeds the {self._limit // (1024 * 1024)} MB limit.")
+        return chunk
+
+    def tell(self) -> int:
+        # Resumable uploads track chunk offsets through tell().
+        return self.bytes_read
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # Only reached when a resumable upload recovers; works if the wrapped stream is seekable.
+        if whence == 0 and offset == self.bytes_read:
+            return offset
+        self.bytes_read = self._stream.seek(offset, whence)
+        return self.bytes_read
+
 
 class ChatManager:
     """OOP wrapper for chat features, now with user verification."""
 
+    MAX_AUDIO_BYTES = int(os.environ.get("CHAT_AUDIO_MAX_BYTES", 10 * 1024 * 1024))
+    MAX_AUDIO_SECONDS = float(os.environ.get("CHAT_AUDIO_MAX_SECONDS", 300))
+    AUDIO_EXTENSIONS = {
+        "audio/mpeg": "mp3", "audio/mp3": "mp3", "audio/mp4": "m4a", "audio/x-m4a": "m4a",
+        "audio/aac": "aac", "audio/ogg": "ogg", "audio/webm": "webm", "audio/wav": "wav",
+        "audio/x-wav": "wav", "application/octet-stream": "mp3",
+    }
+
+    # chat id -> participants, for conversations whose chat_index entry is known to exist (sends skip every read)
+    KNOWN_CHATS_MAX = int(os.environ.get("CHAT_KNOWN_CHATS_MAX", 10000))
+    _known_chats: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+    _known_chats_lock = threading.Lock()
+
     def __init__(self, uid: str):
         self.uid = uid
 
     def _get_user_profile(self, user_id: str) -> dict | None:
-        """Helper to fetch a user profile from ANY role collection."""
-        for collection in ["artisans", "mentors", "investors"]:
-            doc = db.collection(collection).document(user_id).get()
-            if doc.exists:
-                return doc.to_dict()
-        return None
+        """Helper to fetch a user's directory entry (role, name) from ANY role collection."""
+        return UserDirectory.get(user_id)
 
     def _verify_recipient_exists(self, recipient_uid: str) -> bool:
         """Checks if a user with the given UID exists in any user collection."""
@@ -26,62 +88,204 @@ class ChatManager:
         u1, u2 = sorted([a, b])
         return f"dm_{u1}_{u2}"
 
+    @classmethod
+    def _remember_chat(cls, chat_id: str, participants) -> None:
+        with cls._known_chats_lock:
+            cls._known_chats[chat_id] = tuple(participants)
+            cls._known_chats.move_to_end(chat_id)
+            while len(cls._known_chats) > cls.KNOWN_CHATS_MAX:
+                cls._known_chats.popitem(last=False)
+
+    @classmethod
+    def clear_known_chats(cls) -> None:
+        with cls._known_chats_lock:
+            cls._known_chats.clear()
+
+    @classmethod
+    def chat_participants(cls, chat_id: str) -> Optional[Tuple[str, ...]]:
+        """Uids in the conversation per its chat_index entry (one small read, then cached per process).
+
+        None if the conversation does not exist.
+        """
+        with cls._known_chats_lock:
+            if chat_id in cls._known_chats:
+                cls._known_chats.move_to_end(chat_id)
+                return cls._known_chats[chat_id]
+        snap = db.collection("chat_index").document(chat_id).get(field_paths=["participants"])
+        if not snap.exists:
+            return None
+        participants = tuple((snap.to_dict() or {}).get("participants") or ())
+        cls._remember_chat(chat_id, participants)
+        return participants
+
+    @classmethod
+    def _chat_exists(cls, chat_id: str) -> bool:
+        return cls.chat_participants(chat_id) is not None
+
     def send_message(
         self, recipient_uid: str, content: str,
-        message_type: str = "text", audio_url: str = None
+        message_type: str = "text", audio_url: str = None, extra: Optional[Dict] = None
     ) -> dict:
-        """Sends a message, but first verifies the recipient exists."""
-        if not self._verify_recipient_exists(recipient_uid):
-            raise ValueError(f"Recipient with UID '{recipient_uid}' does not exist.")
+        """Sends a message; the first one to a recipient verifies they exist and opens the conversation.
 
+        The message and its chat_index update are committed in one batch. Once a
+        conversation exists (and is known to this process) a send does no reads.
+        The recipient's unread counter is incremented in the same batch; sending
+        also marks the conversation read for the sender.
+        """
         chat_id = self.pair_chat_id(self.uid, recipient_uid)
+        index = {
+            "last_message_at": firestore.SERVER_TIMESTAMP,
+            "last_sender": self.uid,
+            "last_message_content": "🎤 Audio Message" if message_type == "audio" else content[:50],
+            "updated_at": firestore.SERVER_TIMESTAMP,
+            # nested maps, so merge=True updates one participant's entry and leaves the other's alone
+            "unread_count": {recipient_uid: firestore.Increment(1), self.uid: 0},
+            "last_read_at": {self.uid: firestore.SERVER_TIMESTAMP},
+        }
+        if not self._chat_exists(chat_id):
+            # New conversation: verify the recipient and denormalize both names once, in one lookup.
+            people = UserDirectory.resolve([self.uid, recipient_uid])
+            if people.get(recipient_uid) is None:
+                raise ValueError(f"Recipient with UID '{recipient_uid}' does not exist.")
+            index["participants"] = [self.uid, recipient_uid]
+            index["participant_details"] = {
+                uid: {"name": (people.get(uid) or {}).get("name") or "Unknown"} for uid in (self.uid, recipient_uid)
+            }
+
         msg_ref = db.collection("chats").document(chat_id).collection("messages").document()
-        
         message = {
             "sender_uid": self.uid, "recipient_uid": recipient_uid,
             "content": content, "message_type": message_type,
-            "audio_url": audio_url, "created_at": firestore.SERVER_TIMESTAMP
+            "audio_url": audio_url, "created_at": firestore.SERVER_TIMESTAMP,
+            "updated_at": firestore.SERVER_TIMESTAMP,
+            **(extra or {})
         }
-        msg_ref.set(message)
+        batch = db.batch()
+        batch.set(msg_ref, message)
+        batch.set(db.collection("chat_index").document(chat_id), index, merge=True)
+        batch.commit()
+        self._remember_chat(chat_id, (self.uid, recipient_uid))
 
-        my_profile = self._get_user_profile(self.uid)
-        other_user_profile = self._get_user_profile(recipient_uid)
+        return {"message_id": msg_ref.id, "chat_id": chat_id}
 
-        db.collection("chat_index").document(chat_id).set({
-            "participants": [self.uid, recipient_uid],
-            "participant_details": {
-                self.uid: {"name": my_profile.get("name", "Unknown") if my_profile else "Unknown"},
-                recipient_uid: {"name": other_user_profile.get("name", "Unknown") if other_user_profile else "Unknown"}
-            },
-            "last_message_at": firestore.SERVER_TIMESTAMP,
-            "last_sender": self.uid,
-            "last_message_content": "🎤 Audio Message" if message_type == "audio" else content[:50]
-        }, merge=True)
+    def send_audio_message(
+        self, recipient_uid: str, stream, content_type: str,
+        duration_seconds, content_length: Optional[int] = None
+    ) -> dict:
+        """Streams an audio message to storage and posts it with a pending transcription.
 
-        return {"message_id": msg_ref.id, "chat_id": chat_id}
+        Size and declared duration are checked before any byte is stored; the body
+        is piped to a resumable upload in chunks and transcribed in the background.
+        """
+        try:
+            duration = float(duration_seconds)
+        except (TypeError, ValueError):
+            raise AudioRejected("Audio duration (seconds) is required.")
+        if not 0 < duration <= self.MAX_AUDIO_SECONDS:
+            raise AudioRejected(f"Audio messages must be at most {int(self.MAX_AUDIO_SECONDS)} seconds long.")
+        if content_length and content_length > self.MAX_AUDIO_BYTES:
+            raise AudioTooLarge(f"Audio exceeds the {self.MAX_AUDIO_BYTES // (1024 * 1024)} MB limit.")
+        ext = self.AUDIO_EXTENSIONS.get((content_type or "application/octet-stream").split(";")[0].strip())
+        if not ext:
+            raise AudioRejected(f"Unsupported audio type '{content_type}'.")
+        if not self._verify_recipient_exists(recipient_uid):
+            raise ValueError(f"Recipient with UID '{recipient_uid}' does not exist.")
 
-    def get_messages(self, chat_id: str, limit: int = 50) -> list[dict]:
-        q = db.collection("chats").document(chat_id).collection("messages") \
-            .order_by("created_at", direction=firestore.Query.DESCENDING).limit(limit)
-        msgs = [dict(doc.to_dict(), id=doc.id) for doc in q.stream()]
-        msgs.reverse()
-        return msgs
+        chat_id = self.pair_chat_id(self.uid, recipient_uid)
+        blob_path = f"chats/{chat_id}/{uuid.uuid4().hex}.{ext}"
+        audio_url = upload_stream_to_storage(
+            blob_path, _LimitedReader(stream, self.MAX_AUDIO_BYTES), content_type, size=content_length
+        )
+
+        result = self.send_message(
+            recipient_uid=recipient_uid, content="(Audio message)", message_type="audio", audio_url=audio_url,
+            extra={"audio_path": blob_path, "duration_seconds": duration, "transcription_status": "pending"}
+        )
+        background.submit_once(f"transcribe:{result['message_id']}", self.transcribe_audio_message,
+                               result["chat_id"], result["message_id"], blob_path)
+        return dict(result, audio_url=audio_url, transcription_status="pending")
+
+    @staticmethod
+    def transcribe_audio_message(chat_id: str, message_id: str, blob_path: str) -> None:
+        """Background worker: fetch the stored audio, transcribe it and fill in the message."""
+        msg_ref = db.collection("chats").document(chat_id).collection("messages").document(message_id)
+        with tempfile.TemporaryFile() as tmp:
+            if not download_blob_to_file(blob_path, tmp):
+                msg_ref.update({"transcription_status": "unavailable", "updated_at": firestore.SERVER_TIMESTAMP})
+                return
+            tmp.seek(0)
+            # Hand over the spooled file rather than its bytes: recordings can run to MAX_AUDIO_BYTES
+            text = AIHelper().speech_to_text(tmp)
+        msg_ref.update({
+            "content": text or "(Audio message)",
+            "transcription_status": "done",
+            "transcribed_at": firestore.SERVER_TIMESTAMP,
+            "updated_at": firestore.SERVER_TIMESTAMP
+        })
+        logger.info(f"Transcribed audio message {message_id} in {chat_id}")
+
+    def get_messages(self, chat_id: str, limit: int = 50, cursor: str = None) -> Page:
+        """Return one page of messages oldest-first; ``next_cursor`` pages back to older ones."""
+        watermark = delta_sync.issue_watermark() if cursor is None else None
+        q = db.collection("chats").document(chat_id).collection("messages")
+        snaps, next_cursor, prev_cursor = paginate(q, "created_at", descending=True, limit=limit, cursor=cursor)
+        msgs = [dict(doc.to_dict(), id=doc.id) for doc in reversed(snaps)]
+        return Page(msgs, next_cursor, prev_cursor, watermark=watermark)
 
-    def list_conversations(self, limit: int = 100) -> list[dict]:
+    def get_message_changes(self, chat_id: str, since: str, limit: int = 100) -> Dict:
+        """Messages sent or changed (e.g. transcribed) after the watermark ``since``; messages are never deleted."""
+        q = db.collection("chats").document(chat_id).collection("messages")
+        snaps, removed, watermark, has_more = delta_sync.changes_since(q, since, limit=limit)
+        return delta_sync.delta([dict(doc.to_dict(), id=doc.id) for doc in snaps], removed, watermark, has_more)
+
+    def mark_read(self, chat_id: str) -> Dict:
+        """Reset this user's unread counter for ``chat_id`` and stamp their read receipt (one write, no reads)."""
+        try:
+            db.collection("chat_index").document(chat_id).update({
+                f"unread_count.{self.uid}": 0,
+                f"last_read_at.{self.uid}": firestore.SERVER_TIMESTAMP,
+                "updated_at": firestore.SERVER_TIMESTAMP,
+            })
+        except NotFound:
+            raise ValueError(f"Conversation '{chat_id}' does not exist.")
+        return {"chat_id": chat_id, "unread_count": 0}
+
+    def conversation_from_index(self, doc) -> Dict:
+        """A chat_index document as this user's conversation entry (with ``other_user``).
+
+        ``unread_count`` and ``last_read_at`` are this user's; the other
+        participant's read receipt is ``other_user.last_read_at``.
+        """
+        data = doc.to_dict()
+        data["chat_id"] = doc.id
+        participant_uids = data.get("participants", [])
+        details = data.get("participant_details", {})
+        unread = data.get("unread_count") or {}
+        last_read = data.get("last_read_at") or {}
+        data["unread_count"] = unread.get(self.uid, 0)
+        data["last_read_at"] = last_read.get(self.uid)
+        other_user_uid = next((uid for uid in participant_uids if uid != self.uid), None)
+        if other_user_uid and other_user_uid in details:
+            data["other_user"] = {
+                "uid": other_user_uid,
+                "name": details[other_user_uid].get("name", "Unknown User"),
+                "last_read_at": last_read.get(other_user_uid)
+            }
+        return data
+
+    def list_conversations(self, limit: int = 100) -> Page:
+        watermark = delta_sync.issue_watermark()
         idx_q = db.collection("chat_index") \
             .where("participants", "array_contains", self.uid) \
             .order_by("last_message_at", direction=firestore.Query.DESCENDING).limit(limit)
-        conversations = []
-        for doc in idx_q.stream():
-            data = doc.to_dict()
-            data["chat_id"] = doc.id
-            participant_uids = data.get("participants", [])
-            details = data.get("participant_details", {})
-            other_user_uid = next((uid for uid in participant_uids if uid != self.uid), None)
-            if other_user_uid and other_user_uid in details:
-                data["other_user"] = {
-                    "uid": other_user_uid,
-                    "name": details[other_user_uid].get("name", "Unknown User")
-                }
-            conversations.append(data)
-        return conversations
+        docs = list(idx_q.stream())
+        conversations = [self.conversation_from_index(doc) for doc in docs]
+        # Everything shown comes from the chat_index documents, so their update times version the list
+        return Page(conversations, version=snapshot_version(docs), watermark=watermark)
+
+    def get_conversation_changes(self, since: str, limit: int = 100) -> Dict:
+        """Conversations with a new message or read receipt after the watermark ``since``."""
+        q = db.collection("chat_index").where("participants", "array_contains", self.uid)
+        snaps, removed, watermark, has_more = delta_sync.changes_since(q, since, limit=limit)
+        return delta_sync.delta([self.conversation_from_index(doc) for doc in snaps], removed, watermark, has_more)
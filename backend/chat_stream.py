@@ -0,0 +1,295 @@
+# kalasetu/chat_stream.py
+"""Server-Sent Events for chat, fed by shared Firestore snapshot listeners.
+
+A worker keeps at most one listener per open chat (on its ``messages``) and
+one per connected user (on their ``chat_index`` entries), however many
+browser tabs are streaming them; every change a listener sees is fanned out
+to the queues of the connections subscribed to it. Listeners only watch
+documents written since shortly before they started, so history is never
+re-read: each new or changed message costs one read per worker instead of a
+50-message re-read per client poll.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+from firebase_config import db
+from chat_manager import ChatManager
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = float(os.environ.get("CHAT_STREAM_HEARTBEAT", 15))
+# Listeners start this far back, so a server clock running behind ours cannot hide a message.
+LOOKBACK_SECONDS = float(os.environ.get("CHAT_STREAM_LOOKBACK", 30))
+REPLAY_EVENTS = int(os.environ.get("CHAT_STREAM_REPLAY", 200))
+QUEUE_SIZE = int(os.environ.get("CHAT_STREAM_QUEUE", 500))
+RETRY_MS = 3000
+
+
+def _event_id(snapshot, read_time) -> int:
+    """Microseconds since the epoch of the change: increasing, and comparable across listeners."""
+    moment = getattr(snapshot, "update_time", None) or read_time
+    return int(moment.timestamp() * 1_000_000)
+
+
+class Subscriber:
+    """One SSE connection: a bounded queue of events waiting to be written."""
+
+    def __init__(self, max_events: int = QUEUE_SIZE):
+        self.events: "queue.Queue[Dict]" = queue.Queue(maxsize=max_events)
+        self.overflowed = False
+
+    def push(self, events: List[Dict]) -> None:
+        for event in events:
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                # Too slow to keep up: the stream ends and the browser reconnects with Last-Event-ID.
+                self.overflowed = True
+                return
+
+
+class SharedListener:
+    """A single ``on_snapshot`` listener whose changes go to every subscriber."""
+
+    def __init__(self, key: str, to_events: Callable):
+        self.key = key
+        self._to_events = to_events
+        self._subscribers: List[Subscriber] = []
+        self._recent: deque = deque(maxlen=REPLAY_EVENTS)
+        self.since = _since()  # the query only sees documents written after this
+        self._watch = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def replays_from(self) -> int:
+        """Oldest event id this listener can still replay to a reconnecting client."""
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                return self._recent[0]["id"]
+        return int(self.since.timestamp() * 1_000_000)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def add(self, subscriber: Subscriber, last_event_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._subscribers.append(subscriber)
+            missed = [e for e in self._recent if last_event_id is not None and e["id"] > last_event_id]
+        subscriber.push(missed)
+
+    def remove(self, subscriber: Subscriber) -> int:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+            return len(self._subscribers)
+
+    def start(self, query) -> None:
+        watch = query.on_snapshot(self._on_snapshot)
+        with self._lock:
+            if not self._stopped:
+                self._watch = watch
+                return
+        watch.unsubscribe()  # everyone left while the listener was starting
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopped = True
+            watch, self._watch = self._watch, None
+        if watch is not None:
+            watch.unsubscribe()
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        try:
+            events = [self._to_events(change, read_time) for change in changes]
+        except Exception as e:
+            logger.error(f"Chat stream {self.key}: could not convert changes: {e}")
+            return
+        with self._lock:
+            self._recent.extend(events)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(events)
+
+
+class ListenerHub:
+    """Per-process registry of shared listeners, keyed by what they watch."""
+
+    def __init__(self):
+        self._listeners: Dict[str, SharedListener] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key: str, make_query: Callable, to_events: Callable, subscriber: Subscriber,
+                  last_event_id: Optional[int] = None) -> SharedListener:
+        """Add ``subscriber`` to the listener for ``key`` (``make_query(since)`` starts one if needed)."""
+        with self._lock:
+            listener = self._listeners.get(key)
+            created = listener is None
+            if created:
+                listener = self._listeners[key] = SharedListener(key, to_events)
+            listener.add(subscriber, last_event_id)
+        if created:
+            # Outside the hub lock: the first snapshot may be delivered before on_snapshot returns.
+            try:
+                listener.start(make_query(listener.since))
+            except Exception:
+                self.unsubscribe(key, subscriber)
+                raise
+        return listener
+
+    def unsubscribe(self, key: str, subscriber: Subscriber) -> None:
+        with self._lock:
+            listener = self._listeners.get(key)
+            if listener is None or listener.remove(subscriber):
+                return
+            del self._listeners[key]
+        listener.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            listeners = list(self._listeners.values())
+        return {"listeners": len(listeners), "subscribers": sum(l.subscriber_count for l in listeners)}
+
+
+hub = ListenerHub()
+
+
+def _since() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=LOOKBACK_SECONDS)
+
+
+def _change_type(change) -> str:
+    return change.type.name.lower()  # added / modified / removed
+
+
+def _message_change_type(doc, change_type: str = "added") -> str:
+    """A message written only once is new to the client; a later write (edit, transcript) modifies it.
+
+    The listener reports a message sent before it started as "added" when a
+    later write first brings it into view, so its own change type is not enough.
+    """
+    if change_type == "removed":
+        return change_type
+    created, updated = getattr(doc, "create_time", None), getattr(doc, "update_time", None)
+    return "modified" if created is not None and updated is not None and updated > created else "added"
+
+
+def _message_event(chat_id: str, doc, read_time, change_type: str) -> Dict:
+    return {"id": _event_id(doc, read_time), "event": "message", "data": {
+        "type": _message_change_type(doc, change_type), "chat_id": chat_id,
+        "message": dict(doc.to_dict() or {}, id=doc.id)
+    }}
+
+
+def _catch_up(chat_id: str, subscriber: Subscriber, last_event_id: int) -> None:
+    """Messages sent or changed since ``last_event_id`` that the shared listener can no longer replay."""
+    after = datetime.fromtimestamp(last_event_id / 1_000_000, tz=timezone.utc)
+    q = db.collection("chats").document(chat_id).collection("messages") \
+        .where("updated_at", ">", after).order_by("updated_at").limit(REPLAY_EVENTS)
+    now = datetime.now(timezone.utc)
+    events = [_message_event(chat_id, doc, now, "added") for doc in q.stream()]
+    # Event ids come from the commit time, which may sit a hair past ``updated_at``: drop what the client has
+    subscriber.push([e for e in events if e["id"] > last_event_id])
+
+
+def _subscribe_chat(chat_id: str, subscriber: Subscriber, last_event_id: Optional[int]) -> str:
+    key = f"chat:{chat_id}"
+
+    def make_query(since):
+        # Every message write stamps updated_at, so later writes to older messages (transcripts) are pushed too
+        return db.collection("chats").document(chat_id).collection("messages").where("updated_at", ">=", since)
+
+    def to_events(change, read_time):
+        return _message_event(chat_id, change.document, read_time, _change_type(change))
+
+    listener = hub.subscribe(key, make_query, to_events, subscriber, last_event_id)
+    if last_event_id is not None and last_event_id < listener.replays_from():
+        # Disconnected for longer than the listener remembers (or it was restarted): read the gap once.
+        _catch_up(chat_id, subscriber, last_event_id)
+    return key
+
+
+def _subscribe_index(uid: str, subscriber: Subscriber, last_event_id: Optional[int]) -> str:
+    key = f"chat_index:{uid}"
+    cm = ChatManager(uid)
+
+    def make_query(since):
+        return db.collection("chat_index").where("participants", "array_contains", uid) \
+            .where("last_message_at", ">=", since)
+
+    def to_events(change, read_time):
+        return {"id": _event_id(change.document, read_time), "event": "conversation", "data": {
+            "type": _change_type(change), "conversation": cm.conversation_from_index(change.document)
+        }}
+
+    hub.subscribe(key, make_query, to_events, subscriber, last_event_id)
+    return key
+
+
+def may_stream(uid: str, chat_id: str) -> bool:
+    """Whether ``uid`` is a participant of ``chat_id`` (per its chat_index entry; uids may contain ``_``)."""
+    return uid in (ChatManager.chat_participants(chat_id) or ())
+
+
+def format_event(event: Dict, dumps: Callable) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {dumps(event['data'])}\n\n"
+
+
+class EventStream:
+    """The SSE response body. ``close()`` (called by the WSGI server when the client goes away) unsubscribes."""
+
+    def __init__(self, subscriber: Subscriber, keys: List[str], dumps: Callable, heartbeat: float):
+        self._subscriber = subscriber
+        self._keys = keys
+        self._dumps = dumps
+        self._heartbeat = heartbeat
+        self._started = False
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self._closed or self._subscriber.overflowed:
+            self.close()
+            raise StopIteration
+        if not self._started:
+            self._started = True
+            return f"retry: {RETRY_MS}\n\n"
+        try:
+            event = self._subscriber.events.get(timeout=self._heartbeat)
+        except queue.Empty:
+            return ": keep-alive\n\n"  # also how a dropped connection gets noticed
+        return format_event(event, self._dumps)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for key in self._keys:
+            hub.unsubscribe(key, self._subscriber)
+
+
+def open_stream(uid: str, chat_id: Optional[str] = None, last_event_id: Optional[int] = None,
+                dumps: Callable = json.dumps, heartbeat: float = HEARTBEAT_SECONDS) -> EventStream:
+    """Subscribe to ``uid``'s conversation list (and ``chat_id``'s messages) and return the SSE body.
+
+    The listeners are subscribed before this returns, so a client that opens
+    the stream and then loads history with a normal GET cannot miss a message
+    in between (an overlap arrives twice with the same message id).
+    """
+    subscriber = Subscriber()
+    keys = [_subscribe_index(uid, subscriber, last_event_id)]
+    try:
+        if chat_id:
+            keys.append(_subscribe_chat(chat_id, subscriber, last_event_id))
+    except Exception:
+        hub.unsubscribe(keys[0], subscriber)
+        raise
+    return EventStream(subscriber, keys, dumps, heartbeat)
@@ -1,41 +1,87 @@
 # kalasetu/community_manager.py
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional
 from firebase_config import db
 from firebase_admin import firestore
+from user_directory import UserDirectory
+from pagination import Page, paginate, snapshot_version
+from batch_lookup import get_by_ids
+import delta_sync
+from forum_votes import ForumVoteEngine
+from forum_ranking import ForumRanking
+import background
 
 
 class CommunityManager:
     """OOP manager for artisan communities + forums."""
 
+    # communities/{id}/members/{uid}: one document per member, so membership never grows the community doc.
+    MEMBERS = "members"
+
+    # The community directory is the same for every user, so pages are cached briefly per process.
+    DIRECTORY_FIELDS = ["name", "description", "skill_tags", "member_count"]
+    DIRECTORY_TTL_SECONDS = float(os.environ.get("COMMUNITY_DIRECTORY_TTL", 30))
+    DIRECTORY_MAX_ENTRIES = 256
+    _directory_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # (skill_tag, limit, cursor) -> (expires_at, Page)
+    _directory_lock = threading.Lock()
+
     def __init__(self, uid: str):
         self.uid = uid
 
     # ---------- Forum V2 (Reddit Style) ----------
-    def get_forum_posts(self, limit: int = 20, sort_by: str = 'new') -> List[Dict]:
-        """Fetch forum posts, with sorting options and author names."""
-        sort_field = "score" if sort_by == 'top' else "timestamp"
-        q = db.collection("forum_posts").order_by(
-            sort_field, direction=firestore.Query.DESCENDING
-        ).limit(limit)
-        
+    def get_forum_posts(self, limit: int = 20, sort_by: str = 'new', cursor: Optional[str] = None,
+                        viewer_uid: Optional[str] = None) -> Page:
+        """Fetch one page of forum posts, sorted by 'new', 'top', 'hot' or 'rising', with author names.
+
+        If ``viewer_uid`` is given, each post also carries that user's ``my_vote`` (1, -1 or 0).
+        """
+        # hot/rising read the precomputed rank_key, so every mode is one indexed query
+        sort_field = ForumRanking.sort_field(sort_by)
+        watermark = delta_sync.issue_watermark() if cursor is None else None
+        snaps, next_cursor, prev_cursor = paginate(
+            db.collection("forum_posts"), sort_field, descending=True, limit=limit, cursor=cursor
+        )
+        posts = self._forum_posts_for(snaps, viewer_uid)
+        version = snapshot_version(snaps, ((p["id"], p.get("author_name"), p.get("my_vote")) for p in posts))
+        return Page(posts, next_cursor, prev_cursor, version=version, watermark=watermark)
+
+    def get_forum_post_changes(self, since: str, limit: int = 100, viewer_uid: Optional[str] = None) -> Dict:
+        """Forum posts created or changed after the watermark ``since``, plus the ids of deleted ones.
+
+        Score changes count; the periodic hot/rising re-rank does not, so
+        clients re-sort those modes from a full reload.
+        """
+        snaps, removed, watermark, has_more = delta_sync.changes_since(
+            db.collection("forum_posts"), since, limit=limit, scope="forum_posts"
+        )
+        return delta_sync.delta(self._forum_posts_for(snaps, viewer_uid), removed, watermark, has_more)
+
+    @staticmethod
+    def _forum_posts_for(snaps, viewer_uid: Optional[str] = None) -> List[Dict]:
         posts = []
-        for post_doc in q.stream():
+        for post_doc in snaps:
             post_data = post_doc.to_dict()
             post_data["id"] = post_doc.id
-            
-            # BONUS FIX: Fetch the author's name for display
+            posts.append(post_data)
+
+        # Resolve every author in one batched lookup instead of per-post probing
+        authors = UserDirectory.resolve(p.get("author_uid") for p in posts)
+        for post_data in posts:
             author_uid = post_data.get("author_uid")
             if author_uid:
-                # This logic to find user across collections should be centralized later
-                author_doc = db.collection("artisans").document(author_uid).get()
-                if not author_doc.exists: author_doc = db.collection("mentors").document(author_uid).get()
-                if not author_doc.exists: author_doc = db.collection("investors").document(author_uid).get()
-                if author_doc.exists:
-                    post_data["author_name"] = author_doc.to_dict().get("name", "Unknown")
-                else:
-                    post_data["author_name"] = "Unknown User"
-            
-            posts.append(post_data)
+                author = authors.get(author_uid)
+                post_data["author_name"] = author.get("name", "Unknown") if author else "Unknown User"
+
+        if viewer_uid:
+            my_votes = ForumVoteEngine.votes_for_user((p["id"] for p in posts), viewer_uid)
+            for post_data in posts:
+                legacy_vote = (post_data.get("votes") or {}).get(viewer_uid, 0)
+                post_data["my_vote"] = my_votes.get(post_data["id"], legacy_vote)
         return posts
 
     def create_forum_post(self, title: str, body: str, tags: Optional[List[str]] = None) -> Dict:
@@ -49,55 +95,20 @@ class CommunityManager:
             "body": body,
             "tags": tags or [],
             "timestamp": firestore.SERVER_TIMESTAMP,
+            "updated_at": firestore.SERVER_TIMESTAMP,
             "comments": [],
-            # NEW VOTING MODEL: Posts start at 0 with an empty votes map.
-            "votes": {},  # e.g., {"user_id_1": 1, "user_id_2": -1}
-            "score": 0 
+            # Votes live in the votes subcollection; score is folded in from sharded counters.
+            "score": 0,
+            "score_base": 0,
+            "rank_key": ForumRanking.rank_key(0, 0, datetime.now(timezone.utc))
         }
         doc_ref = db.collection("forum_posts").document()
         doc_ref.set(post)
         return {"message": "Post created", "post_id": doc_ref.id}
 
     def vote_on_post(self, post_id: str, vote_type: str) -> Dict:
-        """Atomically cast, change, or remove a vote on a post using the map model."""
-        if vote_type not in ['up', 'down']:
-            raise ValueError("Vote type must be 'up' or 'down'")
-        
-        post_ref = db.collection("forum_posts").document(post_id)
-
-        @firestore.transactional
-        def update_in_transaction(transaction, post_ref_internal):
-            snapshot = post_ref_internal.get(transaction=transaction)
-            if not snapshot.exists:
-                raise ValueError("Post not found")
-            
-            post_data = snapshot.to_dict()
-            votes = post_data.get("votes", {})
-            
-            current_vote = votes.get(self.uid, 0)  # 0=none, 1=up, -1=down
-            new_vote_value = 1 if vote_type == 'up' else -1
-            
-            score_change = 0
-            
-            if current_vote == new_vote_value:
-                # User is clicking the same arrow again to remove their vote
-                del votes[self.uid]
-                score_change = -new_vote_value # If removing upvote (+1), score changes by -1.
-            else:
-                # This handles both a new vote and changing an existing vote
-                votes[self.uid] = new_vote_value
-                score_change = new_vote_value - current_vote # e.g., switching from down(-1) to up(+1) is a +2 change.
-            
-            updates = {
-                "votes": votes,
-                "score": firestore.Increment(score_change)
-            }
-            
-            transaction.update(post_ref_internal, updates)
-            return {"message": "Vote cast successfully"}
-
-        transaction = db.transaction()
-        return update_in_transaction(transaction, post_ref)
+        """Cast, change, or remove a vote on a post (see ForumVoteEngine)."""
+        return ForumVoteEngine.cast_vote(post_id, self.uid, vote_type)
 
     def delete_forum_post(self, post_id: str) -> Dict:
         """Deletes a forum post if the current user is the author."""
@@ -110,27 +121,120 @@ class CommunityManager:
         if post_data.get("author_uid") != self.uid:
             raise PermissionError("You are not authorized to delete this post.")
         
-        post_ref.delete()
+        # The tombstone goes in the same commit, so delta clients see every delete.
+        batch = db.batch()
+        batch.delete(post_ref)
+        delta_sync.tombstone(batch, "forum_posts", post_id)
+        batch.commit()
+        # Votes and score shards are not removed with the parent document; clean them up off-request.
+        background.submit_once(f"forum-cleanup:{post_id}", self._delete_post_subcollections, post_ref)
         return {"message": "Post deleted successfully"}
 
+    @staticmethod
+    def run_feed_maintenance(since: Optional[datetime] = None) -> Dict:
+        """Periodic job: backfill missing rank keys (once), fold recent votes into scores, re-rank decayed keys."""
+        backfilled = ForumRanking.backfill_once()
+        refreshed = ForumVoteEngine.aggregate_dirty_scores(since) if since else []
+        reranked = ForumRanking.rerank_recent()
+        return {"backfilled": backfilled or 0, "scores_refreshed": len(refreshed), "reranked": reranked}
+
+    @staticmethod
+    def acquire_lease(name: str, holder: str, ttl_seconds: float) -> bool:
+        """Take or renew the ``maintenance/{name}`` lease for ``holder``; False while another holder's is live."""
+        lease_ref = db.collection("maintenance").document(name)
+
+        @firestore.transactional
+        def acquire_in_transaction(transaction):
+            now = datetime.now(timezone.utc)
+            lease = lease_ref.get(transaction=transaction)
+            current = lease.to_dict() if lease.exists else {}
+            if current.get("holder") not in (None, holder) and current.get("expires_at") and current["expires_at"] > now:
+                return False
+            transaction.set(lease_ref, {"holder": holder, "expires_at": now + timedelta(seconds=ttl_seconds)})
+            return True
+
+        return acquire_in_transaction(db.transaction())
+
+    @staticmethod
+    def start_feed_maintenance(interval: Optional[float] = None) -> bool:
+        """Run :meth:`run_feed_maintenance` every FORUM_MAINTENANCE_INTERVAL seconds (0 disables).
+
+        Every worker starts the loop, but a Firestore lease lets only one of them
+        run each tick; if that worker dies, another takes over after two intervals.
+        The first tick runs right away, so the rank-key backfill happens on deploy.
+        """
+        if interval is None:
+            interval = float(os.environ.get("FORUM_MAINTENANCE_INTERVAL", 900))
+        if interval <= 0:
+            return False
+        holder = f"{socket.gethostname()}:{os.getpid()}"
+        last_run = {"at": datetime.now(timezone.utc) - timedelta(seconds=interval)}
+
+        def tick():
+            if not CommunityManager.acquire_lease("forum-maintenance-lease", holder, 2 * interval):
+                return
+            started = datetime.now(timezone.utc)
+            # Overlap slightly so shard writes that straddle the previous run are not missed.
+            CommunityManager.run_feed_maintenance(since=last_run["at"] - timedelta(seconds=60))
+            last_run["at"] = started
+
+        if not background.run_periodically("forum-maintenance", interval, tick):
+            return False
+        background.submit_once("forum-maintenance:first", tick)
+        return True
+
+    @staticmethod
+    def _delete_post_subcollections(post_ref, batch_size: int = 400) -> None:
+        for name in (ForumVoteEngine.VOTES, ForumVoteEngine.SHARDS):
+            while True:
+                docs = list(post_ref.collection(name).limit(batch_size).stream())
+                if not docs:
+                    break
+                batch = db.batch()
+                for doc in docs:
+                    batch.delete(doc.reference)
+                batch.commit()
+
     # ---------- Communities V2 (Discord Style) ----------
     
-    # FIX: Restored the missing list_communities method
-    def list_communities(self, limit: int = 100) -> List[Dict]:
-        """List communities and dynamically calculate member count for accuracy."""
-        q = db.collection("communities").limit(limit)
+    def list_communities(self, limit: int = 100, cursor: Optional[str] = None,
+                         skill_tag: Optional[str] = None) -> Page:
+        """Get one page of the community directory, largest communities first.
 
-        comms = []
-        for doc in q.stream():
-            d = doc.to_dict()
-            d["id"] = doc.id
-            # FIX: Calculate member count from the length of the members array for 100% accuracy
-            d["member_count"] = len(d.get("members", []))
-            comms.append(d)
-        
-        # Sort manually in Python after fetching
-        comms.sort(key=lambda x: x['member_count'], reverse=True)
-        return comms
+        Only the display fields are read; ``skill_tag`` narrows the list to
+        communities tagged with it.
+        """
+        key = (skill_tag, limit, cursor)
+        now = time.monotonic()
+        with self._directory_lock:
+            cached = self._directory_cache.get(key)
+            if cached and cached[0] > now:
+                self._directory_cache.move_to_end(key)
+                return self._copy_page(cached[1])
+
+        q = db.collection("communities").select(self.DIRECTORY_FIELDS)
+        if skill_tag:
+            q = q.where("skill_tags", "array_contains", skill_tag)
+        snaps, next_cursor, prev_cursor = paginate(q, "member_count", descending=True, limit=limit, cursor=cursor)
+        page = Page([dict(doc.to_dict(), id=doc.id) for doc in snaps], next_cursor, prev_cursor,
+                    version=snapshot_version(snaps))
+
+        with self._directory_lock:
+            self._directory_cache[key] = (time.monotonic() + self.DIRECTORY_TTL_SECONDS, page)
+            self._directory_cache.move_to_end(key)
+            while len(self._directory_cache) > self.DIRECTORY_MAX_ENTRIES:
+                self._directory_cache.popitem(last=False)
+        return self._copy_page(page)
+
+    @staticmethod
+    def _copy_page(page: Page) -> Page:
+        return Page([dict(d) for d in page], page.next_cursor, page.prev_cursor, page.version)
+
+    @classmethod
+    def clear_directory_cache(cls) -> None:
+        """Forget cached directory pages (called on this process's own membership changes)."""
+        with cls._directory_lock:
+            cls._directory_cache.clear()
 
     def get_community_details(self, community_id: str) -> Dict:
         """Get details for a single community, including its channels."""
@@ -144,7 +248,7 @@ class CommunityManager:
         if not name: raise ValueError("name required")
         comm = {
             "name": name, "skill_tags": skill_tags, "description": description,
-            "member_count": 1, "members": [self.uid],
+            "member_count": 1,
             "created_at": firestore.SERVER_TIMESTAMP,
             "channels": [
                 {"id": "general", "name": "general"},
@@ -152,7 +256,11 @@ class CommunityManager:
             ]
         }
         doc_ref = db.collection("communities").document()
-        doc_ref.set(comm)
+        batch = db.batch()
+        batch.set(doc_ref, comm)
+        batch.set(doc_ref.collection(self.MEMBERS).document(self.uid), self._membership(self.uid))
+        batch.commit()
+        self.clear_directory_cache()
         return {"message": "Community created", "community_id": doc_ref.id}
     
     def post_in_channel(self, community_id: str, channel_id: str, message: str) -> Dict:
@@ -162,76 +270,120 @@ class CommunityManager:
             "author_uid": self.uid,
             "message": message,
             "timestamp": firestore.SERVER_TIMESTAMP,
+            "updated_at": firestore.SERVER_TIMESTAMP,
             "channel_id": channel_id
         }
         post_ref = db.collection("communities").document(community_id).collection("channel_posts").document()
         post_ref.set(post_data)
         return {"message": "Posted in channel", "post_id": post_ref.id}
 
-    def get_channel_posts(self, community_id: str, channel_id: str, limit: int = 50) -> List[Dict]:
-        """Get all posts from a specific channel, ordered by timestamp."""
-        q = db.collection("communities").document(community_id).collection("channel_posts") \
-            .where("channel_id", "==", channel_id) \
-            .order_by("timestamp", direction=firestore.Query.ASCENDING).limit(limit)
-        
-        posts = []
-        for doc in q.stream():
-            d = doc.to_dict()
-            d["id"] = doc.id
-            
-            # Fetch author profile to get the name
-            author_profile_ref = db.collection("artisans").document(d["author_uid"])
-            author_profile = author_profile_ref.get()
-            if not author_profile.exists:
-                 author_profile_ref = db.collection("mentors").document(d["author_uid"])
-                 author_profile = author_profile_ref.get()
-            if not author_profile.exists:
-                 author_profile_ref = db.collection("investors").document(d["author_uid"])
-                 author_profile = author_profile_ref.get()
-
-            if author_profile.exists:
-                d["author_name"] = author_profile.to_dict().get("name", "Unknown")
-            else:
-                d["author_name"] = "Unknown"
+    def get_channel_posts(self, community_id: str, channel_id: str, limit: int = 50,
+                          cursor: Optional[str] = None) -> Page:
+        """Get one page of channel posts in chronological order.
 
-            posts.append(d)
+        The first page holds the newest posts; ``next_cursor`` pages back to older ones.
+        """
+        watermark = delta_sync.issue_watermark() if cursor is None else None
+        snaps, next_cursor, prev_cursor = paginate(
+            self._channel_query(community_id, channel_id), "timestamp", descending=True, limit=limit, cursor=cursor
+        )
+        return Page(self._channel_posts_for(reversed(snaps)), next_cursor, prev_cursor, watermark=watermark)
+
+    def get_channel_post_changes(self, community_id: str, channel_id: str, since: str, limit: int = 100) -> Dict:
+        """Channel posts created or changed after the watermark ``since`` (channel posts are never deleted)."""
+        snaps, removed, watermark, has_more = delta_sync.changes_since(
+            self._channel_query(community_id, channel_id), since, limit=limit
+        )
+        return delta_sync.delta(self._channel_posts_for(snaps), removed, watermark, has_more)
+
+    @staticmethod
+    def _channel_query(community_id: str, channel_id: str):
+        return db.collection("communities").document(community_id).collection("channel_posts") \
+            .where("channel_id", "==", channel_id)
+
+    @staticmethod
+    def _channel_posts_for(snaps) -> List[Dict]:
+        posts = [dict(doc.to_dict(), id=doc.id) for doc in snaps]
+        authors = UserDirectory.resolve(d.get("author_uid") for d in posts)
+        for d in posts:
+            author = authors.get(d.get("author_uid"))
+            d["author_name"] = author.get("name", "Unknown") if author else "Unknown"
         return posts
         
+    @staticmethod
+    def _membership(uid: str, joined_at=firestore.SERVER_TIMESTAMP) -> Dict:
+        """Membership document with the member's display name denormalized for the member list."""
+        user = UserDirectory.get(uid) or {}
+        return {"uid": uid, "name": user.get("name") or "Unknown", "role": user.get("role"), "joined_at": joined_at}
+
     def join_specific_community(self, community_id: str) -> Dict:
-        """Join a specific community by ID."""
-        doc_ref = db.collection("communities").document(community_id)
-        doc = doc_ref.get()
-        if not doc.exists:
-            raise ValueError("Community not found")
-        
-        doc_ref.update({
-            "members": firestore.ArrayUnion([self.uid]),
-            "member_count": firestore.Increment(1),
-            "updated_at": firestore.SERVER_TIMESTAMP
-        })
-        return {"message": "Joined community", "community_id": community_id}
-    
-    def list_members(self, community_id: str) -> List[Dict]:
-        """List members of a community (basic user profiles)."""
-        doc = db.collection("communities").document(community_id).get()
-        if not doc.exists:
+        """Join a specific community by ID. Joining twice is a no-op."""
+        comm_ref = db.collection("communities").document(community_id)
+        member_ref = comm_ref.collection(self.MEMBERS).document(self.uid)
+        membership = self._membership(self.uid)
+
+        @firestore.transactional
+        def join_in_transaction(transaction):
+            comm_doc = comm_ref.get(transaction=transaction)
+            if not comm_doc.exists:
+                raise ValueError("Community not found")
+            if member_ref.get(transaction=transaction).exists:
+                return False
+
+            transaction.set(member_ref, membership)
+            updates = {"updated_at": firestore.SERVER_TIMESTAMP}
+            if self.uid in (comm_doc.to_dict().get("members") or []):
+                # Already counted through the legacy array; just move the entry over.
+                updates["members"] = firestore.ArrayRemove([self.uid])
+            else:
+                updates["member_count"] = firestore.Increment(1)
+            transaction.update(comm_ref, updates)
+            return True
+
+        joined = join_in_transaction(db.transaction())
+        if joined:
+            self.clear_directory_cache()
+        message = "Joined community" if joined else "Already a member"
+        return {"message": message, "community_id": community_id, "joined": joined}
+
+    def list_members(self, community_id: str, limit: int = 50, cursor: Optional[str] = None) -> Page:
+        """Get one page of a community's members (uid, name, role) in join order."""
+        comm_ref = db.collection("communities").document(community_id)
+        snaps, next_cursor, prev_cursor = paginate(
+            comm_ref.collection(self.MEMBERS), "joined_at", descending=False, limit=limit, cursor=cursor
+        )
+        # An empty first page is the only case where the community itself needs checking.
+        if not snaps and not cursor and not comm_ref.get().exists:
             raise ValueError("Community not found")
 
-        data = doc.to_dict()
-        member_uids = data.get("members", [])
-        profiles = []
-
-        # This part can be slow with many members, but is fine for this project.
-        for uid in member_uids:
-            # Check all possible user collections
-            pdoc = db.collection("artisans").document(uid).get()
-            if not pdoc.exists: pdoc = db.collection("mentors").document(uid).get()
-            if not pdoc.exists: pdoc = db.collection("investors").document(uid).get()
-            
-            if pdoc.exists:
-                d = pdoc.to_dict()
-                profiles.append({"uid": uid, "name": d.get("name")})
-        return profiles
+        members = []
+        for doc in snaps:
+            d = doc.to_dict()
+            members.append({"uid": d.get("uid", doc.id), "name": d.get("name"), "role": d.get("role")})
+        return Page(members, next_cursor, prev_cursor)
+
+    @classmethod
+    def migrate_legacy_members(cls, batch_size: int = 400) -> Dict:
+        """One-off job: move ``members`` arrays into the members subcollection and fix ``member_count``."""
+        migrated = 0
+        for comm_doc in db.collection("communities").stream():
+            uids = list(dict.fromkeys((comm_doc.to_dict() or {}).get("members") or []))
+            if not uids:
+                continue
+            members_ref = comm_doc.reference.collection(cls.MEMBERS)
+            existing = {snap.id for snap in members_ref.select([]).stream()}
+            # Anyone who already has a membership doc keeps it, along with their original joined_at
+            new_uids = [uid for uid in uids if uid not in existing]
+            for start in range(0, len(new_uids), batch_size):
+                batch = db.batch()
+                for uid in new_uids[start:start + batch_size]:
+                    batch.set(members_ref.document(uid), cls._membership(uid))
+                batch.commit()
+            count = len(existing) + len(new_uids)
+            comm_doc.reference.update({"members": firestore.DELETE_FIELD, "member_count": count})
+            migrated += 1
+        cls.clear_directory_cache()
+        return {"communities_migrated": migrated}
 
     # --- Methods for Rich Profile ---
     def get_posts_by_user(self, user_uid: str, limit: int = 10) -> List[Dict]:
@@ -247,22 +399,41 @@ class CommunityManager:
         return posts
 
     def get_communities_for_user(self, user_uid: str, limit: int = 10) -> List[Dict]:
-        """Fetch all communities a specific user is a member of."""
-        q = db.collection("communities").where("members", "array_contains", user_uid).limit(limit)
+        """Fetch the communities a specific user is a member of."""
+        q = db.collection_group(self.MEMBERS).where("uid", "==", user_uid).limit(limit)
+        community_ids = [doc.reference.parent.parent.id for doc in q.stream()]
         comms = []
-        for doc in q.stream():
-            d = doc.to_dict()
-            d["id"] = doc.id
-            comms.append(d)
+        for community_id, d in get_by_ids("communities", community_ids).items():
+            if d is not None:
+                d.pop("members", None)
+                d["id"] = community_id
+                comms.append(d)
         return comms
     
     def leave_community(self, community_id: str) -> Dict:
-        """Removes a user from a community's member list."""
-        doc_ref = db.collection("communities").document(community_id)
-        
-        # Atomically remove the user and decrement the member count
-        doc_ref.update({
-            "members": firestore.ArrayRemove([self.uid]),
-            "member_count": firestore.Increment(-1)
-        })
-        return {"message": "Successfully left community", "community_id": community_id}
+        """Removes a user from a community. Leaving a community you are not in is a no-op."""
+        comm_ref = db.collection("communities").document(community_id)
+        member_ref = comm_ref.collection(self.MEMBERS).document(self.uid)
+
+        @firestore.transactional
+        def leave_in_transaction(transaction):
+            comm_doc = comm_ref.get(transaction=transaction)
+            if not comm_doc.exists:
+                raise ValueError("Community not found")
+            is_member = member_ref.get(transaction=transaction).exists
+            in_legacy_array = self.uid in (comm_doc.to_dict().get("members") or [])
+            if not (is_member or in_legacy_array):
+                return False
+
+            transaction.delete(member_ref)
+            updates = {"member_count": firestore.Increment(-1), "updated_at": firestore.SERVER_TIMESTAMP}
+            if in_legacy_array:
+                updates["members"] = firestore.ArrayRemove([self.uid])
+            transaction.update(comm_ref, updates)
+            return True
+
+        left = leave_in_transaction(db.transaction())
+        if left:
+            self.clear_directory_cache()
+        message = "Successfully left community" if left else "Not a member"
+        return {"message": message, "community_id": community_id, "left": left}
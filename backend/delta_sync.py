@@ -0,0 +1,131 @@
+# kalasetu/delta_sync.py
+"""Changes since a watermark, for clients that keep a local copy of a listing.
+
+Every write to a synced collection stamps ``updated_at`` with the server time,
+and deletions leave a small document in ``tombstones``. A full listing hands
+out a watermark; passing it back returns only the documents written after it
+(in ``(updated_at, id)`` order, so a long backlog can be drained in pages)
+plus the ids removed since, along with the watermark to use next.
+"""
+import base64
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from firebase_config import db
+from firebase_admin import firestore
+from pagination import InvalidCursor
+
+UPDATED_AT = "updated_at"
+TOMBSTONES = "tombstones"
+# Tombstones carry an ``expire_at`` for a Firestore TTL policy; older watermarks must reload in full.
+TOMBSTONE_TTL_DAYS = float(os.environ.get("TOMBSTONE_TTL_DAYS", 30))
+# Issued watermarks start this far back, so a server clock running behind ours cannot hide a write.
+CLOCK_SKEW_SECONDS = float(os.environ.get("DELTA_CLOCK_SKEW", 5))
+
+
+class StaleWatermark(ValueError):
+    """Raised for a watermark older than the tombstone retention: the client must reload the full listing."""
+
+
+Position = Tuple[datetime, str]  # (updated_at, document id) of the last change a client has
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _caught_up() -> Position:
+    """Position of a client that has seen everything (less the clock-skew margin)."""
+    return _now() - timedelta(seconds=CLOCK_SKEW_SECONDS), ""
+
+
+def _encode(position: Position) -> List:
+    return [position[0].isoformat(), position[1]]
+
+
+def _decode(value) -> Position:
+    moment = datetime.fromisoformat(value[0])
+    if moment.tzinfo is None:
+        raise ValueError
+    return moment, str(value[1])
+
+
+def encode_watermark(docs: Position, removed: Position) -> str:
+    payload = {"d": _encode(docs), "r": _encode(removed)}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_watermark(token: str, scoped: bool = True) -> Tuple[Position, Position]:
+    """Both positions of ``token``; only the ones a listing reads (``scoped``: tombstones too) can expire."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        docs, removed = _decode(payload["d"]), _decode(payload["r"])
+    except Exception:
+        raise InvalidCursor("Invalid sync watermark")
+    oldest = min(docs[0], removed[0]) if scoped else docs[0]
+    if oldest < _now() - timedelta(days=TOMBSTONE_TTL_DAYS):
+        raise StaleWatermark("Watermark has expired; reload the full listing")
+    return docs, removed
+
+
+def issue_watermark() -> str:
+    """Watermark for a full listing about to be read: every later write is past it."""
+    start = _caught_up()
+    return encode_watermark(start, start)
+
+
+def tombstone(batch, scope: str, doc_id: str) -> None:
+    """Record in ``batch`` that ``doc_id`` left the listing ``scope`` (commit it with the delete)."""
+    batch.set(db.collection(TOMBSTONES).document(), {
+        "scope": scope,
+        "doc_id": doc_id,
+        UPDATED_AT: firestore.SERVER_TIMESTAMP,
+        "expire_at": _now() + timedelta(days=TOMBSTONE_TTL_DAYS),
+    })
+
+
+def _after(query, position: Position, limit: int) -> Tuple[List, Position, bool]:
+    moment, doc_id = position
+    q = query.order_by(UPDATED_AT).order_by("__name__")
+    if doc_id:
+        q = q.start_after({UPDATED_AT: moment, "__name__": doc_id})
+    else:
+        q = q.where(UPDATED_AT, ">=", moment)
+    snaps = list(q.limit(limit + 1).stream())
+    has_more = len(snaps) > limit
+    snaps = snaps[:limit]
+    if snaps:
+        position = (snaps[-1].get(UPDATED_AT), snaps[-1].id)
+    else:
+        # Nothing new: the client is caught up, so a quiet listing's watermark keeps moving and never expires.
+        position = max(position, _caught_up())
+    return snaps, position, has_more
+
+
+def changes_since(query, watermark: str, limit: int = 100,
+                  scope: Optional[str] = None) -> Tuple[List, List[str], str, bool]:
+    """Documents of ``query`` written after ``watermark``, and ids tombstoned in ``scope`` since.
+
+    Returns ``(snapshots, removed_ids, next_watermark, has_more)``; while
+    ``has_more`` is true the client should ask again with the new watermark.
+    Listings whose documents are never deleted pass no ``scope`` and skip the
+    tombstone query. Documents written before ``updated_at`` existed only
+    show up once they are next written.
+    """
+    docs_at, removed_at = decode_watermark(watermark, scoped=bool(scope))
+    snaps, docs_at, more_docs = _after(query, docs_at, limit)
+    removed, more_removed = [], False
+    if scope:
+        buried, removed_at, more_removed = _after(
+            db.collection(TOMBSTONES).where("scope", "==", scope), removed_at, limit
+        )
+        removed = [snap.get("doc_id") for snap in buried]
+    return snaps, removed, encode_watermark(docs_at, removed_at), more_docs or more_removed
+
+
+def delta(items: List[Dict], removed: List[str], watermark: str, has_more: bool) -> Dict:
+    """Response body of a ``?since=`` request."""
+    return {"items": items, "removed": removed, "watermark": watermark, "has_more": has_more}
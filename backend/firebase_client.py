@@ -1,54 +1,224 @@
 # firebase_client.py
+"""Single registry for the Firebase SDK.
+
+Owns the firebase_admin app (used for auth), the Firestore client and the
+storage bucket handle. Everything is created on first use, once per process:
+after a fork (gunicorn pre-fork workers) the child drops the inherited handles
+and builds its own, since gRPC channels and HTTP sockets must not be shared
+across processes. Every manager reaches Firestore through ``db`` below
+(re-exported by firebase_config).
+"""
+import logging
 import os
+import threading
+from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore, storage, auth
+from requests.adapters import HTTPAdapter
+import firestore_metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
 
 _app = None
 _db = None
+_metered = None  # (client, instrumented wrapper) handed out through ``db``
 _bucket = None
+_bucket_loaded = False
+_pid = None
+_lock = threading.RLock()
 
+# Resumable uploads send the body in chunks of this size (must be a multiple of 256 KiB).
+UPLOAD_CHUNK_SIZE = int(os.environ.get("STORAGE_UPLOAD_CHUNK_SIZE", 1024 * 1024))
+STORAGE_POOL_SIZE = int(os.environ.get("STORAGE_HTTP_POOL_SIZE", 16))
+
+# gRPC channel settings for Firestore. Keepalive pings stop idle connections from
+# being silently dropped by load balancers/NAT; short reconnect backoff keeps
+# recovery fast. Message size limits match the SDK's own (unlimited).
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", int(os.environ.get("FIRESTORE_KEEPALIVE_MS", 30000))),
+    ("grpc.keepalive_timeout_ms", int(os.environ.get("FIRESTORE_KEEPALIVE_TIMEOUT_MS", 10000))),
+    ("grpc.keepalive_permit_without_calls", int(os.environ.get("FIRESTORE_KEEPALIVE_IDLE", 0))),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.initial_reconnect_backoff_ms", 500),
+    ("grpc.max_reconnect_backoff_ms", 10000),
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+]
+
+
+# The SDK has no public way to pass channel options, so the tuned client builds the
+# channel through these private members (google-cloud-firestore is pinned in
+# requirements.txt). If an upgrade moves them, it falls back to the SDK's own channel.
+_SDK_PRIVATE_ATTRS = ("_firestore_api_internal", "_emulator_host", "_target",
+                      "_credentials", "_client_options", "_client_info")
+
+
+def _sdk_tunable(client=None) -> bool:
+    """Whether the installed SDK (and ``client``, once built) still has what _TunedFirestoreClient uses."""
+    if not isinstance(getattr(firestore.Client, "_firestore_api", None), property):
+        return False
+    return client is None or all(hasattr(client, name) for name in _SDK_PRIVATE_ATTRS)
+
+
+class _TunedFirestoreClient(firestore.Client):
+    """Firestore client whose gRPC channel is built with CHANNEL_OPTIONS (stock channel if the SDK moved on)."""
+
+    @property
+    def _firestore_api(self):
+        if _sdk_tunable(self) and self._firestore_api_internal is None and self._emulator_host is None:
+            try:
+                self._build_tuned_api()
+            except (AttributeError, ImportError, TypeError) as e:
+                logger.warning(f"Firestore channel options not applied, using the SDK default channel: {e}")
+        return super()._firestore_api
+
+    def _build_tuned_api(self):
+        from google.cloud.firestore_v1.services.firestore import client as firestore_client
+        from google.cloud.firestore_v1.services.firestore.transports import grpc as firestore_grpc
+
+        transport_cls = firestore_grpc.FirestoreGrpcTransport
+        channel = transport_cls.create_channel(
+            self._target, credentials=self._credentials, options=CHANNEL_OPTIONS
+        )
+        transport = transport_cls(host=self._target, channel=channel)
+        self._firestore_api_internal = firestore_client.FirestoreClient(
+            transport=transport, client_options=self._client_options
+        )
+        self._transport = transport
+        firestore_client._client_info = self._client_info
 
-def init_firebase():
-    """Initialize Firebase with service account and optional storage bucket"""
-    global _app, _db, _bucket
-    sa = os.environ.get("FIREBASE_SERVICE_ACCOUNT") 
-    if not sa:
-        print("FIREBASE_SERVICE_ACCOUNT not set; Firebase functions will not be available.")
-        return
-    if not os.path.exists(sa):
-        print(f"Firebase service account file not found: {sa}")
-        return
-
-    cred = credentials.Certificate(sa)
-    try:
-        _app = firebase_admin.initialize_app(cred, {
-            "storageBucket": os.environ.get("FIREBASE_STORAGE_BUCKET")
-        })
-        _db = firestore.client()
 
-        try:
-            _bucket = storage.bucket()
-        except Exception as e:
-            _bucket = None
-            print("Warning: Firebase storage init failed:", e)
+def _reset_after_fork():
+    """Runs in a forked child: forget the parent's clients (and a lock another thread may hold)."""
+    global _app, _db, _metered, _bucket, _bucket_loaded, _pid, _lock
+    _lock = threading.RLock()
+    _app = _db = _metered = _bucket = None
+    _bucket_loaded = False
+    _pid = None
 
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _check_process():
+    # Covers forks that bypass os.fork() hooks (e.g. multiprocessing on some platforms).
+    if _pid is not None and _pid != os.getpid():
+        _reset_after_fork()
+
+
+def get_app():
+    """The firebase_admin app for this process, initialized from FIREBASE_SERVICE_ACCOUNT."""
+    global _app, _pid
+    _check_process()
+    if _app is None:
+        with _lock:
+            if _app is None:
+                # Try both env vars, prefer FIREBASE_SERVICE_ACCOUNT
+                sa = os.environ.get("FIREBASE_SERVICE_ACCOUNT")
+                if not sa:
+                    raise ValueError("No Firebase service account path set. Check .env")
+                if not os.path.isfile(sa):
+                    raise FileNotFoundError(f"Service account file not found at {sa}")
+                # One named app per process, so auth/storage HTTP sessions are never fork-shared.
+                _pid = os.getpid()
+                _app = firebase_admin.initialize_app(credentials.Certificate(sa), {
+                    "storageBucket": os.environ.get("FIREBASE_STORAGE_BUCKET")
+                }, name=f"kalasetu-{_pid}")
+    return _app
+
+
+def init_firebase():
+    """Eagerly initialize Firebase (optional; every getter initializes on first use)."""
+    try:
+        get_db()
+        get_bucket()
         print("✅ Firebase initialized.")
     except Exception as e:
         print("❌ Firebase init error:", e)
 
 
+def _memory_backend() -> bool:
+    return os.environ.get("FIRESTORE_BACKEND", "").lower() == "memory"
+
+
 def get_db():
-    """Return Firestore client"""
+    """Return the process-wide Firestore client.
+
+    With FIRESTORE_BACKEND=memory this is the in-process stand-in from
+    memory_firestore (no credentials or network needed).
+    """
+    global _db
+    _check_process()
     if _db is None:
-        raise RuntimeError("Firestore not initialized. Call init_firebase() first.")
+        with _lock:
+            if _db is None and _memory_backend():
+                from memory_firestore import MemoryFirestore
+                _db = MemoryFirestore.from_env()
+            if _db is None:
+                app = get_app()
+                if not app.project_id:
+                    raise ValueError("Project ID is required to access Firestore.")
+                client_cls = _TunedFirestoreClient if _sdk_tunable() else firestore.Client
+                _db = client_cls(credentials=app.credential.get_credential(), project=app.project_id)
     return _db
 
 
+def set_db(client) -> None:
+    """Install a Firestore(-compatible) client for this process, e.g. a fresh MemoryFirestore in tests."""
+    global _db, _pid
+    with _lock:
+        _db = client
+        _pid = os.getpid()
+
+
+def metered_db():
+    """The process-wide client wrapped so its I/O is attributed to the current request."""
+    global _metered
+    client = get_db()
+    metered = _metered
+    if metered is None or metered[0] is not client:
+        metered = _metered = (client, firestore_metrics.instrument(client))
+    return metered[1]
+
+
+def connect_db(timeout: float = 10.0):
+    """Build the Firestore client and open its gRPC channel now (used by warm-up)."""
+    import grpc
+    client = get_db()
+    if not isinstance(client, _TunedFirestoreClient):
+        return client
+    client._firestore_api  # builds the channel
+    grpc.channel_ready_future(client._transport.grpc_channel).result(timeout=timeout)
+    return client
+
+
+class _LazyClient:
+    """Stand-in for the Firestore client that builds the real one on first attribute access.
+
+    Lets every module keep ``from firebase_config import db`` without paying for
+    credential loading and channel setup at import time. Calls go through the
+    firestore_metrics wrapper, so per-request I/O accounting sees them.
+    """
+
+    def __getattr__(self, name):
+        # Introspection (mock, copy, inspect) probes private names; don't connect for those.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(metered_db(), name)
+
+    def __repr__(self):
+        return f"<lazy Firestore client ({'ready' if _db is not None else 'not initialized'})>"
+
+
+# Firestore database client
+db = _LazyClient()
+
+
 def get_user_profile(uid: str):
     """Fetch user profile from Firestore"""
-    if _db is None:
-        raise RuntimeError("Firestore not initialized. Call init_firebase() first.")
-    doc_ref = _db.collection("users").document(uid)
+    doc_ref = db.collection("users").document(uid)
     doc = doc_ref.get()
     if doc.exists:
         return doc.to_dict()
@@ -56,22 +226,40 @@ def get_user_profile(uid: str):
 
 
 def get_bucket():
+    """Storage bucket handle, reused for every upload. None if storage is not configured."""
+    global _bucket, _bucket_loaded
+    _check_process()
+    if not _bucket_loaded:
+        with _lock:
+            if not _bucket_loaded and _memory_backend():
+                # No storage emulator: uploads fall back to mocked URLs.
+                _bucket, _bucket_loaded = None, True
+            if not _bucket_loaded:
+                try:
+                    bucket = storage.bucket(app=get_app())
+                    # Let concurrent uploads (e.g. image variants) keep their connections warm.
+                    adapter = HTTPAdapter(pool_connections=STORAGE_POOL_SIZE, pool_maxsize=STORAGE_POOL_SIZE)
+                    bucket.client._http.mount("https://", adapter)
+                    _bucket = bucket
+                except Exception as e:
+                    _bucket = None
+                    print("Warning: Firebase storage init failed:", e)
+                _bucket_loaded = True
     return _bucket
 
 
 def verify_id_token(id_token):
-    if not _app:
-        raise RuntimeError("Firebase not initialized")
-    return auth.verify_id_token(id_token)
+    return auth.verify_id_token(id_token, app=get_app())
 
 
 def save_idea_for_user(user_uid: str, idea_obj: dict):
     """Save generated idea under user's Firestore subcollection"""
-    if _db is None:
-        print("Firestore not initialized, skipping persist.")
+    try:
+        doc_ref = db.collection("users").document(user_uid).collection("ideas").document()
+        doc_ref.set(idea_obj)
+    except Exception as e:
+        print("Could not persist idea, skipping:", e)
         return None
-    doc_ref = _db.collection("users").document(user_uid).collection("ideas").document()
-    doc_ref.set(idea_obj)
     return doc_ref.id
 
 
@@ -80,10 +268,38 @@ def upload_bytes_to_storage(blob_path: str, data: bytes, content_type="applicati
     Uploads bytes to Firebase Storage.
     Note: Renamed from upload_bytes to match the call in app.py.
     """
-    if _bucket is None:
+    bucket = get_bucket()
+    if bucket is None:
         print("Bucket not initialized; returning mocked URL.")
         return f"https://storage.googleapis.com/mock-bucket/{blob_path}"
-    blob = _bucket.blob(blob_path)
+    blob = bucket.blob(blob_path)
     blob.upload_from_string(data, content_type=content_type)
     blob.make_public()
     return blob.public_url
+
+
+def upload_stream_to_storage(blob_path: str, stream, content_type="application/octet-stream", size=None):
+    """
+    Streams a file-like object to Firebase Storage with a chunked, resumable upload,
+    so the payload is never held in memory as a whole.
+    """
+    bucket = get_bucket()
+    if bucket is None:
+        print("Bucket not initialized; discarding stream and returning mocked URL.")
+        while stream.read(UPLOAD_CHUNK_SIZE):
+            pass
+        return f"https://storage.googleapis.com/mock-bucket/{blob_path}"
+    blob = bucket.blob(blob_path, chunk_size=UPLOAD_CHUNK_SIZE)
+    blob.upload_from_file(stream, size=size, content_type=content_type)
+    blob.make_public()
+    return blob.public_url
+
+
+def download_blob_to_file(blob_path: str, file_obj) -> bool:
+    """Streams a stored blob into a file object. Returns False when storage is unavailable."""
+    bucket = get_bucket()
+    if bucket is None:
+        print("Bucket not initialized; cannot download blob.")
+        return False
+    bucket.blob(blob_path).download_to_file(file_obj)
+    return True
@@ -0,0 +1,449 @@
+# kalasetu/firestore_metrics.py
+"""Per-request Firestore I/O accounting.
+
+:func:`instrument` wraps the shared Firestore client so that every RPC made
+through it (document gets, ``get_all``, queries, single writes, batch and
+transaction commits) is counted and timed against the request that issued it.
+:func:`init_app` opens a :class:`RequestIO` for each Flask request and, once the
+response is ready, adds a ``Server-Timing`` header, logs one structured (JSON)
+line and folds the counts into per-route and per-uid aggregates, which
+:func:`snapshot` returns for the admin endpoint.
+
+Work done outside a request (background jobs, scripts) still goes through the
+wrappers but is not attributed to anything. Set FIRESTORE_METRICS=0 to hand out
+the raw client instead.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("FIRESTORE_METRICS", "1").lower() not in ("0", "false", "no")
+MAX_TRACKED_UIDS = int(os.environ.get("FIRESTORE_METRICS_MAX_UIDS", 1000))
+
+CATEGORIES = ("read", "query", "write", "transaction")
+COUNTERS = ("reads", "writes", "queries", "rpcs", "transaction_retries")
+
+_current: contextvars.ContextVar = contextvars.ContextVar("firestore_request_io", default=None)
+
+
+class RequestIO:
+    """Firestore work done while serving one request."""
+
+    def __init__(self):
+        self.reads = self.writes = self.queries = self.rpcs = self.transaction_retries = 0
+        self.ms = dict.fromkeys(CATEGORIES, 0.0)
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()  # batched lookups record from pool threads
+
+    def record(self, category: str, elapsed_ms: float, reads: int = 0, writes: int = 0) -> None:
+        with self._lock:
+            self.rpcs += 1
+            self.ms[category] += elapsed_ms
+            self.reads += reads
+            self.writes += writes
+            if category == "query":
+                self.queries += 1
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.transaction_retries += 1
+
+    @property
+    def firestore_ms(self) -> float:
+        return sum(self.ms.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        result = {name: getattr(self, name) for name in COUNTERS}
+        result["firestore_ms"] = round(self.firestore_ms, 2)
+        return result
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = [f'fs;dur={self.firestore_ms:.1f};desc="{self.rpcs} rpcs, {self.reads} reads, {self.writes} writes"']
+        parts += [f"fs-{category};dur={ms:.1f}" for category, ms in self.ms.items() if ms]
+        parts.append(f"app;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+def current() -> Optional[RequestIO]:
+    """The RequestIO of the request being served on this thread, if any."""
+    return _current.get()
+
+
+def _record(category: str, started: float, reads: int = 0, writes: int = 0) -> None:
+    io = _current.get()
+    if io is not None:
+        io.record(category, (time.perf_counter() - started) * 1000, reads, writes)
+
+
+def _record_retry() -> None:
+    io = _current.get()
+    if io is not None:
+        io.record_retry()
+
+
+# ---------------- Client wrappers ---------------- #
+def _unwrap(value):
+    return value._target if isinstance(value, _Proxy) else value
+
+
+class _Proxy:
+    """Forwards everything to the wrapped SDK object; subclasses intercept the RPCs."""
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name):
+        if name == "_target":
+            raise AttributeError(name)
+        return getattr(self._target, name)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return repr(self._target)
+
+
+class _SnapshotProxy(_Proxy):
+    __slots__ = ()
+
+    @property
+    def reference(self):
+        return _DocumentProxy(self._target.reference)
+
+
+_QUERY_BUILDERS = frozenset({"where", "order_by", "limit", "limit_to_last", "offset", "select",
+                             "start_at", "start_after", "end_at", "end_before"})
+
+
+class _QueryProxy(_Proxy):
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        attr = _Proxy.__getattr__(self, name)
+        if name in _QUERY_BUILDERS:
+            return lambda *args, **kwargs: _QueryProxy(attr(*map(_unwrap, args), **kwargs))
+        return attr
+
+    def stream(self, transaction=None, **kwargs):
+        # Attributed to the request that opened the stream, whichever thread drains it.
+        return _counted_stream(_current.get(), self._target.stream(transaction=_unwrap(transaction), **kwargs))
+
+    def get(self, transaction=None, **kwargs):
+        return list(self.stream(transaction=transaction, **kwargs))
+
+
+def _counted_stream(io: Optional[RequestIO], snaps):
+    """Yield ``snaps`` one by one (a scan stays constant-memory); the query is recorded once it is drained or closed."""
+    snaps, count, elapsed = iter(snaps), 0, 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                snap = next(snaps)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - started
+            count += 1
+            yield _SnapshotProxy(snap)
+    finally:
+        if io is not None:
+            # A query is billed at least one read even when it matches nothing.
+            io.record("query", elapsed * 1000, reads=max(1, count))
+
+
+class _CollectionProxy(_QueryProxy):
+    __slots__ = ()
+
+    def document(self, document_id=None):
+        return _DocumentProxy(self._target.document(document_id))
+
+    def add(self, document_data, document_id=None, **kwargs):
+        started = time.perf_counter()
+        update_time, ref = self._target.add(document_data, document_id=document_id, **kwargs)
+        _record("write", started, writes=1)
+        return update_time, _DocumentProxy(ref)
+
+    def list_documents(self, page_size=None, **kwargs):
+        started = time.perf_counter()
+        refs = list(self._target.list_documents(page_size=page_size, **kwargs))
+        _record("query", started, reads=max(1, len(refs)))
+        return [_DocumentProxy(ref) for ref in refs]
+
+    @property
+    def parent(self):
+        parent = self._target.parent
+        return _DocumentProxy(parent) if parent is not None else None
+
+
+class _DocumentProxy(_Proxy):
+    __slots__ = ()
+
+    def collection(self, collection_id):
+        return _CollectionProxy(self._target.collection(collection_id))
+
+    def collections(self, *args, **kwargs):
+        return [_CollectionProxy(c) for c in self._target.collections(*args, **kwargs)]
+
+    @property
+    def parent(self):
+        return _CollectionProxy(self._target.parent)
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        started = time.perf_counter()
+        snap = self._target.get(field_paths=field_paths, transaction=_unwrap(transaction), **kwargs)
+        _record("read", started, reads=1)
+        return _SnapshotProxy(snap)
+
+    def _write(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        result = getattr(self._target, method)(*args, **kwargs)
+        _record("write", started, writes=1)
+        return result
+
+    def set(self, document_data, merge=False, **kwargs):
+        return self._write("set", document_data, merge=merge, **kwargs)
+
+    def update(self, field_updates, option=None, **kwargs):
+        return self._write("update", field_updates, option=option, **kwargs)
+
+    def create(self, document_data, **kwargs):
+        return self._write("create", document_data, **kwargs)
+
+    def delete(self, option=None, **kwargs):
+        return self._write("delete", option=option, **kwargs)
+
+
+class _BatchProxy(_Proxy):
+    __slots__ = ()
+
+    def set(self, reference, document_data, merge=False):
+        return self._target.set(_unwrap(reference), document_data, merge=merge)
+
+    def update(self, reference, field_updates, option=None):
+        return self._target.update(_unwrap(reference), field_updates, option=option)
+
+    def create(self, reference, document_data):
+        return self._target.create(_unwrap(reference), document_data)
+
+    def delete(self, reference, option=None):
+        return self._target.delete(_unwrap(reference), option=option)
+
+    def commit(self, **kwargs):
+        writes, started = len(self._target), time.perf_counter()
+        result = self._target.commit(**kwargs)
+        _record("write", started, writes=writes)
+        return result
+
+    def __len__(self):
+        return len(self._target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class _TransactionProxy(_BatchProxy):
+    """Also works with ``firestore.transactional``, which drives ``_begin``/``_commit``/``_rollback``."""
+    __slots__ = ()
+
+    def _begin(self, retry_id=None):
+        started = time.perf_counter()
+        self._target._begin(retry_id=retry_id)
+        _record("transaction", started)
+        if retry_id is not None:
+            _record_retry()
+
+    def _commit(self):
+        writes, started = len(self._target), time.perf_counter()
+        try:
+            result = self._target._commit()
+        except Exception:
+            _record("transaction", started)  # aborted: a round trip, but nothing written
+            raise
+        _record("write", started, writes=writes)
+        return result
+
+    def _rollback(self):
+        in_progress, started = self._target.in_progress, time.perf_counter()
+        self._target._rollback()
+        if in_progress:
+            _record("transaction", started)
+
+    def get(self, ref_or_query, **kwargs):
+        target, started = _unwrap(ref_or_query), time.perf_counter()
+        result = self._target.get(target, **kwargs)
+        if hasattr(result, "exists"):
+            _record("read", started, reads=1)
+            return _SnapshotProxy(result)
+        snaps = list(result)
+        _record("query" if hasattr(target, "stream") else "read", started, reads=max(1, len(snaps)))
+        return iter([_SnapshotProxy(s) for s in snaps])
+
+    def get_all(self, references, **kwargs):
+        refs, started = [_unwrap(r) for r in references], time.perf_counter()
+        snaps = list(self._target.get_all(refs, **kwargs))
+        _record("read", started, reads=len(snaps))
+        return iter([_SnapshotProxy(s) for s in snaps])
+
+
+class _ClientProxy(_Proxy):
+    __slots__ = ()
+
+    def collection(self, *collection_path):
+        return _CollectionProxy(self._target.collection(*collection_path))
+
+    def document(self, *document_path):
+        return _DocumentProxy(self._target.document(*document_path))
+
+    def collection_group(self, collection_id):
+        return _QueryProxy(self._target.collection_group(collection_id))
+
+    def collections(self, *args, **kwargs):
+        return [_CollectionProxy(c) for c in self._target.collections(*args, **kwargs)]
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        refs, started = [_unwrap(r) for r in references], time.perf_counter()
+        snaps = list(self._target.get_all(refs, field_paths=field_paths, transaction=_unwrap(transaction), **kwargs))
+        _record("read", started, reads=len(snaps))
+        return iter([_SnapshotProxy(s) for s in snaps])
+
+    def batch(self):
+        return _BatchProxy(self._target.batch())
+
+    def transaction(self, **kwargs):
+        return _TransactionProxy(self._target.transaction(**kwargs))
+
+
+def instrument(client):
+    """Wrap a Firestore(-compatible) client so its RPCs are attributed to the current request."""
+    if not ENABLED or client is None or isinstance(client, _Proxy):
+        return client
+    return _ClientProxy(client)
+
+
+# ---------------- Aggregates ---------------- #
+class IOAggregates:
+    """Running per-route and per-uid totals for this worker (uids are kept LRU-bounded)."""
+
+    def __init__(self, max_uids: int = MAX_TRACKED_UIDS):
+        self.max_uids = max_uids
+        self._routes: Dict[str, Dict] = {}
+        self._uids: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fold(totals: Optional[Dict], io: RequestIO, total_ms: float) -> Dict:
+        totals = totals or dict(dict.fromkeys(COUNTERS, 0), requests=0, firestore_ms=0.0, total_ms=0.0, max_reads=0)
+        totals["requests"] += 1
+        for name in COUNTERS:
+            totals[name] += getattr(io, name)
+        totals["firestore_ms"] += io.firestore_ms
+        totals["total_ms"] += total_ms
+        totals["max_reads"] = max(totals["max_reads"], io.reads)
+        return totals
+
+    def add(self, route: str, uid: Optional[str], io: RequestIO, total_ms: float) -> None:
+        with self._lock:
+            self._routes[route] = self._fold(self._routes.get(route), io, total_ms)
+            if uid:
+                self._uids[uid] = self._fold(self._uids.pop(uid, None), io, total_ms)
+                while len(self._uids) > self.max_uids:
+                    self._uids.popitem(last=False)
+
+    @staticmethod
+    def _summary(totals: Dict) -> Dict:
+        n = totals["requests"]
+        summary = dict(totals, firestore_ms=round(totals["firestore_ms"], 1), total_ms=round(totals["total_ms"], 1))
+        summary.update(
+            reads_per_request=round(totals["reads"] / n, 2),
+            writes_per_request=round(totals["writes"] / n, 2),
+            rpcs_per_request=round(totals["rpcs"] / n, 2),
+            avg_firestore_ms=round(totals["firestore_ms"] / n, 2),
+            avg_total_ms=round(totals["total_ms"] / n, 2),
+        )
+        return summary
+
+    def snapshot(self, top: int = 20) -> Dict:
+        """Every route, plus the ``top`` uids by document reads."""
+        with self._lock:
+            routes = {route: self._summary(t) for route, t in self._routes.items()}
+            uids = sorted(self._uids.items(), key=lambda item: item[1]["reads"], reverse=True)[:top]
+            users = {uid: self._summary(t) for uid, t in uids}
+        return {"routes": dict(sorted(routes.items(), key=lambda item: item[1]["reads"], reverse=True)),
+                "users": users}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._uids.clear()
+
+
+aggregates = IOAggregates()
+
+
+def snapshot(top: int = 20) -> Dict:
+    return aggregates.snapshot(top=top)
+
+
+# ---------------- Flask integration ---------------- #
+def _request_uid() -> Optional[str]:
+    """The acting user, from the ``<uid>`` URL segment, ``?uid=`` or a JSON body's ``uid``."""
+    uid = (request.view_args or {}).get("uid") or request.args.get("uid")
+    if not uid and request.is_json:
+        body = request.get_json(silent=True)
+        uid = body.get("uid") if isinstance(body, dict) else None
+    return uid if isinstance(uid, str) else None
+
+
+def _start_request():
+    g.firestore_io_token = _current.set(RequestIO())
+
+
+def _finish_request(response):
+    io = _current.get()
+    if io is None:
+        return response
+    total_ms = (time.perf_counter() - io.started) * 1000
+    response.headers.add("Server-Timing", io.server_timing(total_ms))
+
+    route = f"{request.method} {request.url_rule.rule if request.url_rule else '<unmatched>'}"
+    uid = _request_uid()
+    aggregates.add(route, uid, io, total_ms)
+    logger.info(json.dumps(dict(
+        event="firestore_io", route=route, status=response.status_code, uid=uid,
+        **io.as_dict(), total_ms=round(total_ms, 2)
+    )))
+    return response
+
+
+def _end_request(exc=None):
+    token = g.pop("firestore_io_token", None)
+    if token is not None:
+        _current.reset(token)
+
+
+def init_app(app) -> None:
+    """Account Firestore I/O for every request served by ``app``."""
+    if not ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
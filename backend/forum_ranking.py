@@ -0,0 +1,119 @@
+# kalasetu/forum_ranking.py
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from firebase_config import db
+from firebase_admin import firestore
+
+
+class ForumRanking:
+    """Precomputed, time-decayed ranking keys for the forum feed.
+
+    Each post stores ``rank_key = {"hot": float, "rising": float}`` so the ``hot``
+    and ``rising`` sorts are plain indexed ``order_by("rank_key.<mode>")`` queries.
+
+    * ``hot`` follows the classic log-score-plus-age formula: a post's key only
+      changes when its score or comment count does, and newer posts start higher,
+      so old posts sink without any rewrite.
+    * ``rising`` divides engagement by a power of the post's age, so it decays
+      continuously; :meth:`rerank_recent` refreshes it for posts still inside
+      the rising window and drops older ones to 0.
+    """
+
+    POSTS = "forum_posts"
+    SORT_FIELDS = {
+        "new": "timestamp",
+        "top": "score",
+        "hot": "rank_key.hot",
+        "rising": "rank_key.rising",
+    }
+
+    # Marker written once every post has a rank_key (hot/rising queries skip posts without one).
+    BACKFILL_MARKER = ("maintenance", "forum-rank-backfill")
+
+    EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    HOT_HALF_LIFE_SECONDS = 45000       # ~12.5h of age is worth 10x the score
+    RISING_GRAVITY = 1.5
+    COMMENT_WEIGHT = 2
+    RISING_WINDOW_HOURS = float(os.environ.get("FORUM_RISING_WINDOW_HOURS", 48))
+
+    @classmethod
+    def sort_field(cls, sort_by: str) -> str:
+        """Firestore field to order by for a sort mode (unknown modes fall back to 'new')."""
+        return cls.SORT_FIELDS.get(sort_by, cls.SORT_FIELDS["new"])
+
+    @staticmethod
+    def _comment_count(post: Dict) -> int:
+        return post.get("comment_count", len(post.get("comments") or []))
+
+    @classmethod
+    def rank_key(cls, score: int, comment_count: int, created_at: Optional[datetime],
+                 now: Optional[datetime] = None) -> Dict[str, float]:
+        """Compute both ranking keys for a post."""
+        now = now or datetime.now(timezone.utc)
+        created_at = created_at or now
+        engagement = score + cls.COMMENT_WEIGHT * comment_count
+
+        order = math.log10(max(abs(engagement), 1))
+        sign = 1 if engagement > 0 else -1 if engagement < 0 else 0
+        hot = round(sign * order + (created_at - cls.EPOCH).total_seconds() / cls.HOT_HALF_LIFE_SECONDS, 7)
+
+        age_hours = max((now - created_at).total_seconds() / 3600, 0)
+        if age_hours > cls.RISING_WINDOW_HOURS:
+            rising = 0.0
+        else:
+            rising = round(engagement / math.pow(age_hours + 2, cls.RISING_GRAVITY), 7)
+        return {"hot": hot, "rising": rising}
+
+    @classmethod
+    def rank_key_for(cls, post: Dict, score: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, float]:
+        """Rank key for a post document's data, optionally with an updated score."""
+        created_at = post.get("timestamp")
+        if not isinstance(created_at, datetime):
+            created_at = None
+        return cls.rank_key(
+            post.get("score", 0) if score is None else score,
+            cls._comment_count(post), created_at, now
+        )
+
+    @classmethod
+    def rerank_recent(cls, window_hours: Optional[float] = None) -> int:
+        """Periodic job: refresh decayed rank keys.
+
+        Covers posts up to twice the rising window old, so posts that just aged
+        out get their ``rising`` key zeroed. Pass ``window_hours=0`` to rerank
+        every post (see :meth:`backfill_once`). Returns the number of posts written.
+        """
+        window = cls.RISING_WINDOW_HOURS if window_hours is None else window_hours
+        now = datetime.now(timezone.utc)
+        q = db.collection(cls.POSTS)
+        if window:
+            q = q.where("timestamp", ">=", now - timedelta(hours=2 * window))
+
+        batch, pending, written = db.batch(), 0, 0
+        for doc in q.stream():
+            data = doc.to_dict()
+            key = cls.rank_key_for(data, now=now)
+            if data.get("rank_key") == key:
+                continue
+            batch.update(doc.reference, {"rank_key": key})
+            pending += 1
+            if pending == 400:
+                batch.commit()
+                written += pending
+                batch, pending = db.batch(), 0
+        if pending:
+            batch.commit()
+            written += pending
+        return written
+
+    @classmethod
+    def backfill_once(cls) -> Optional[int]:
+        """Give every post a rank_key, once per database. Returns posts written, or None if already done."""
+        marker = db.collection(cls.BACKFILL_MARKER[0]).document(cls.BACKFILL_MARKER[1])
+        if marker.get().exists:
+            return None
+        written = cls.rerank_recent(window_hours=0)
+        marker.set({"posts_written": written, "done_at": firestore.SERVER_TIMESTAMP})
+        return written
@@ -0,0 +1,125 @@
+# kalasetu/forum_votes.py
+import os
+import random
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from firebase_config import db
+from firebase_admin import firestore
+import background
+from forum_ranking import ForumRanking
+
+
+class ForumVoteEngine:
+    """Contention-free voting for forum posts.
+
+    Each (post, user) vote is its own document in ``forum_posts/{id}/votes`` and
+    score deltas land on one of ``NUM_SHARDS`` counter documents in
+    ``forum_posts/{id}/score_shards``, so concurrent voters never write the same
+    document. The post's ``score`` field (used by the ``top`` sort) and its
+    ``rank_key`` (``hot``/``rising``) are folded in from the shards by
+    :meth:`refresh_score`, debounced after each vote and also runnable as a
+    periodic job via :meth:`aggregate_dirty_scores`.
+    """
+
+    POSTS = "forum_posts"
+    VOTES = "votes"
+    SHARDS = "score_shards"
+
+    NUM_SHARDS = int(os.environ.get("FORUM_SCORE_SHARDS", 10))
+    AGGREGATE_DELAY_SECONDS = float(os.environ.get("FORUM_SCORE_AGGREGATE_DELAY", 2))
+
+    @classmethod
+    def _post_ref(cls, post_id: str):
+        return db.collection(cls.POSTS).document(post_id)
+
+    @classmethod
+    def cast_vote(cls, post_id: str, uid: str, vote_type: str) -> Dict:
+        """Cast, change, or remove (by repeating) a user's vote. Returns the new vote and an estimated score.
+
+        The score is the post's last folded ``score`` plus this vote's change;
+        votes still sitting in the shards are counted by the debounced
+        :meth:`refresh_score`, so a vote costs two reads (post and own vote).
+        """
+        if vote_type not in ['up', 'down']:
+            raise ValueError("Vote type must be 'up' or 'down'")
+
+        post_ref = cls._post_ref(post_id)
+        post_doc = post_ref.get()
+        if not post_doc.exists:
+            raise ValueError("Post not found")
+        post_data = post_doc.to_dict()
+        # Votes cast before the subcollection existed still live in the post's map.
+        legacy_vote = (post_data.get("votes") or {}).get(uid, 0)
+
+        vote_ref = post_ref.collection(cls.VOTES).document(uid)
+        shard_ref = post_ref.collection(cls.SHARDS).document(str(random.randrange(cls.NUM_SHARDS)))
+        requested = 1 if vote_type == 'up' else -1
+
+        @firestore.transactional
+        def update_in_transaction(transaction):
+            # Only this user's vote document is read, so voters never contend with each other.
+            vote_doc = vote_ref.get(transaction=transaction)
+            current = vote_doc.to_dict().get("value", 0) if vote_doc.exists else legacy_vote
+
+            # Clicking the same arrow again removes the vote (stored as 0 so the legacy map stays shadowed).
+            new_value = 0 if current == requested else requested
+            delta = new_value - current
+
+            transaction.set(vote_ref, {"value": new_value, "updated_at": firestore.SERVER_TIMESTAMP})
+            if delta:
+                transaction.set(shard_ref, {
+                    "count": firestore.Increment(delta),
+                    "updated_at": firestore.SERVER_TIMESTAMP
+                }, merge=True)
+            return new_value, delta
+
+        new_value, delta = update_in_transaction(db.transaction())
+        background.schedule_once(f"forum-score:{post_id}", cls.AGGREGATE_DELAY_SECONDS, cls.refresh_score, post_id)
+        return {"message": "Vote cast successfully", "vote": new_value, "score": post_data.get("score", 0) + delta}
+
+    @classmethod
+    def _shard_total(cls, post_ref) -> int:
+        return sum((s.to_dict() or {}).get("count", 0) for s in post_ref.collection(cls.SHARDS).stream())
+
+    @classmethod
+    def refresh_score(cls, post_id: str) -> Optional[int]:
+        """Fold the shard counters into the post's ``score`` and ``rank_key``. Returns the new score."""
+        post_ref = cls._post_ref(post_id)
+        post_doc = post_ref.get()
+        if not post_doc.exists:
+            return None
+        data = post_doc.to_dict()
+        # Posts created before sharding keep their old score as a fixed base.
+        base = data.get("score_base", data.get("score", 0))
+        score = base + cls._shard_total(post_ref)
+        post_ref.update({
+            "score": score,
+            "score_base": base,
+            "rank_key": ForumRanking.rank_key_for(data, score=score),
+            "updated_at": firestore.SERVER_TIMESTAMP
+        })
+        return score
+
+    @classmethod
+    def aggregate_dirty_scores(cls, since: datetime) -> List[str]:
+        """Refresh every post whose shards changed after ``since`` (for a periodic job)."""
+        dirty = {
+            shard.reference.parent.parent.id
+            for shard in db.collection_group(cls.SHARDS).where("updated_at", ">", since).stream()
+        }
+        for post_id in dirty:
+            cls.refresh_score(post_id)
+        return sorted(dirty)
+
+    @classmethod
+    def votes_for_user(cls, post_ids: Iterable[str], uid: str) -> Dict[str, int]:
+        """The user's vote on each post, read with one batched ``get_all``."""
+        post_ids = list(post_ids)
+        if not uid or not post_ids:
+            return {}
+        refs = [cls._post_ref(pid).collection(cls.VOTES).document(uid) for pid in post_ids]
+        return {
+            snap.reference.parent.parent.id: (snap.to_dict() or {}).get("value", 0)
+            for snap in db.get_all(refs)
+            if snap.exists
+        }
@@ -0,0 +1,11 @@
+# kalasetu/gunicorn.conf.py
+"""gunicorn settings, read automatically when gunicorn is started from this directory.
+
+    gunicorn app:app --worker-class gthread --threads 32
+"""
+
+
+def post_worker_init(worker):
+    # Importing app starts nothing; each worker starts its own background work once it has loaded the app.
+    from app import start_background_work
+    start_background_work()
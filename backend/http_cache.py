@@ -0,0 +1,81 @@
+# kalasetu/http_cache.py
+"""Validators and compression for JSON responses.
+
+``json_response`` tags a payload with a weak ETag. If the payload carries a
+``version`` (a pagination.Page built from document update times), that is the
+ETag and a matching If-None-Match is answered with a bodiless 304 before
+anything is serialized; otherwise the ETag is a hash of the serialized body.
+``init_app`` compresses larger text responses with brotli (when the optional
+``brotli`` package is installed) or gzip, whichever the client prefers.
+"""
+import gzip
+import hashlib
+import os
+from typing import Any, Optional
+from flask import current_app, jsonify, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+MIN_COMPRESS_BYTES = int(os.environ.get("HTTP_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("HTTP_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("HTTP_BROTLI_QUALITY", 5))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Browsers keep the body but revalidate on every poll; an unchanged listing then costs a 304.
+CACHE_CONTROL = "private, no-cache"
+
+
+def json_response(payload: Any, version: Optional[str] = None):
+    """jsonify ``payload`` with a weak ETag, or return 304 if the client's copy is current."""
+    if version is None:
+        version = getattr(payload, "version", None)
+    if version is not None:
+        etag = f"v{version}"
+        if request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = CACHE_CONTROL
+            return response
+
+    response = jsonify(payload)
+    if version is None:
+        etag = "h" + hashlib.sha1(response.get_data()).hexdigest()[:20]
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response.make_conditional(request)
+
+
+def _negotiate() -> Optional[str]:
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_response(response):
+    """after_request hook: encode the body as the client prefers (br > gzip), if it is worth it."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _negotiate()
+    data = response.get_data()
+    if encoding is None or len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    if encoding == "br":
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers["Content-Encoding"] = encoding
+    # The encoded body differs byte for byte, so a strong validator would no longer be true.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app) -> None:
+    """Compress responses served by ``app``."""
+    app.after_request(compress_response)
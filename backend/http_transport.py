@@ -0,0 +1,155 @@
+# kalasetu/http_transport.py
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HTTPTransport:
+    """Pooled, retrying HTTP client shared by the AI provider calls.
+
+    One keep-alive ``requests.Session`` per provider per process, with jittered
+    exponential backoff on retryable statuses (e.g. Hugging Face's 503 while a
+    model loads), separate connect/read timeouts, and per-call latency stats.
+    """
+
+    def __init__(self, name: str, pool_size: int = 10, max_retries: int = 3,
+                 backoff_factor: float = 1.0, backoff_jitter: float = 0.5,
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 sample_size: int = 256):
+        self.name = name
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self._session: Optional[requests.Session] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=sample_size)
+        self._stats = {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+    @classmethod
+    def from_env(cls, name: str, **defaults) -> "HTTPTransport":
+        """Build a transport whose knobs can be overridden with <NAME>_HTTP_* env vars."""
+        prefix = f"{name.upper()}_HTTP_"
+
+        def env(key, cast, default):
+            value = os.environ.get(prefix + key)
+            return cast(value) if value is not None else default
+
+        return cls(
+            name,
+            pool_size=env("POOL_SIZE", int, defaults.get("pool_size", 10)),
+            max_retries=env("MAX_RETRIES", int, defaults.get("max_retries", 3)),
+            backoff_factor=env("BACKOFF", float, defaults.get("backoff_factor", 1.0)),
+            backoff_jitter=env("BACKOFF_JITTER", float, defaults.get("backoff_jitter", 0.5)),
+            connect_timeout=env("CONNECT_TIMEOUT", float, defaults.get("connect_timeout", 5.0)),
+            read_timeout=env("READ_TIMEOUT", float, defaults.get("read_timeout", 60.0)),
+        )
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,  # a read timeout on a slow generation is not worth repeating
+            status=self.max_retries,
+            status_forcelist=RETRYABLE_STATUSES,
+            allowed_methods=None,  # AI inference POSTs are safe to repeat
+            backoff_factor=self.backoff_factor,
+            backoff_jitter=self.backoff_jitter,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        # Sockets must not be shared across a pre-fork server's workers.
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        retries = 0
+        try:
+            resp = self.session.request(method, url, **kwargs)
+            history = getattr(getattr(resp.raw, "retries", None), "history", None) or ()
+            retries = len(history)
+            return resp
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._record(elapsed_ms, retries)
+            logger.info(f"[{self.name}] {method} {url} took {elapsed_ms:.0f} ms ({retries} retries)")
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def _record(self, elapsed_ms: float, retries: int) -> None:
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["retries"] += retries
+            self._stats["total_ms"] += elapsed_ms
+            self._stats["max_ms"] = max(self._stats["max_ms"], elapsed_ms)
+            self._samples.append(elapsed_ms)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            samples = sorted(self._samples)
+
+        def pct(p):
+            return round(samples[min(int(len(samples) * p), len(samples) - 1)], 1) if samples else 0.0
+
+        stats["avg_ms"] = round(stats["total_ms"] / stats["calls"], 1) if stats["calls"] else 0.0
+        stats["p50_ms"] = pct(0.50)
+        stats["p95_ms"] = pct(0.95)
+        stats["total_ms"] = round(stats["total_ms"], 1)
+        stats["max_ms"] = round(stats["max_ms"], 1)
+        return stats
+
+
+_transports: Dict[str, HTTPTransport] = {}
+_registry_lock = threading.Lock()
+
+
+def get_transport(name: str, **defaults) -> HTTPTransport:
+    """Process-wide transport for a provider, created on first use."""
+    with _registry_lock:
+        if name not in _transports:
+            _transports[name] = HTTPTransport.from_env(name, **defaults)
+        return _transports[name]
+
+
+def all_stats() -> Dict[str, Dict]:
+    with _registry_lock:
+        transports = dict(_transports)
+    return {name: t.stats() for name, t in transports.items()}
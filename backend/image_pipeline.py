@@ -0,0 +1,158 @@
+# kalasetu/image_pipeline.py
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# name -> longest edge in pixels (None keeps the original size, capped at MAX_EDGE)
+VARIANTS = {"thumb": 320, "medium": 960, "full": None}
+MAX_EDGE = 2048
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+# Blobs are content-addressed, so browsers and CDNs may cache them forever.
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Uploaded last: its presence means every variant of the image is already stored.
+MARKER = ("full", "webp")
+
+WORKERS = int(os.environ.get("IMAGE_PIPELINE_WORKERS", 2))
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_path(prefix: str, digest: str, variant: str, fmt: str) -> str:
+    return f"{prefix}/{digest}/{variant}.{fmt}"
+
+
+def render_variants(data: bytes) -> Dict[str, Dict]:
+    """Decode an image and encode every variant/format pair.
+
+    Runs inside the process pool, so it must stay a picklable module-level
+    function that only touches Pillow. Returns
+    ``{variant: {"width", "height", "files": {fmt: (bytes, content_type)}}}``.
+    """
+    with Image.open(io.BytesIO(data)) as src:
+        src.load()
+        if src.mode not in ("RGB", "RGBA"):
+            src = src.convert("RGBA" if "transparency" in src.info or src.mode in ("LA", "PA") else "RGB")
+
+        rendered = {}
+        for variant, edge in VARIANTS.items():
+            img = src.copy()
+            img.thumbnail((edge or MAX_EDGE, edge or MAX_EDGE), Image.Resampling.LANCZOS)
+            files = {}
+            for fmt, (pil_format, content_type, options) in FORMATS.items():
+                out = img
+                if pil_format == "JPEG" and img.mode == "RGBA":
+                    out = Image.new("RGB", img.size, (255, 255, 255))
+                    out.paste(img, mask=img.getchannel("A"))
+                buf = io.BytesIO()
+                out.save(buf, pil_format, **options)
+                files[fmt] = (buf.getvalue(), content_type)
+            rendered[variant] = {"width": img.width, "height": img.height, "files": files}
+        return rendered
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool for the CPU-bound resize/encode work (None when disabled)."""
+    global _pool, _pool_pid
+    if WORKERS <= 0:
+        return None
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # "spawn" starts clean interpreters instead of forking the parent's gRPC/Firebase threads.
+                # A spawned worker still re-imports the main script as __mp_main__: app.py skips
+                # building the app in that case, and this module imports nothing from the app.
+                _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                _pool_pid = pid
+    return _pool
+
+
+def _render(data: bytes) -> Dict[str, Dict]:
+    pool = _get_pool()
+    if pool is None:
+        return render_variants(data)
+    return pool.submit(render_variants, data).result()
+
+
+def _srcset(variants: Dict[str, Dict], fmt: str) -> str:
+    return ", ".join(f"{v[fmt]} {v['width']}w" for v in variants.values())
+
+
+def process_and_upload(data: bytes, prefix: str = "mockups") -> Dict:
+    """Store resized WebP/JPEG variants of an image under its SHA-256 and return their URLs.
+
+    An image whose hash is already stored is not re-encoded or re-uploaded.
+    Returns ``{"url", "thumbnail_url", "sha256", "deduplicated", "variants", "srcset"}``
+    where ``srcset`` holds ready-to-use ``srcset`` attribute strings per format.
+    """
+    # Imported here so the spawned render workers never load the Firebase/Cohere clients.
+    from ai_clients import storage_blob_url, upload_image_to_storage
+
+    digest = content_hash(data)
+    marker_url = storage_blob_url(blob_path(prefix, digest, *MARKER))
+    deduplicated = marker_url is not None
+
+    if deduplicated:
+        # Every variant is stored; sizes come from decoding the header only.
+        with Image.open(io.BytesIO(data)) as src:
+            size = src.size
+        variants = {}
+        for variant, edge in VARIANTS.items():
+            scale = min(1.0, (edge or MAX_EDGE) / max(size))
+            entry = {"width": max(1, round(size[0] * scale)), "height": max(1, round(size[1] * scale))}
+            for fmt in FORMATS:
+                entry[fmt] = storage_blob_url(blob_path(prefix, digest, variant, fmt), check=False)
+            variants[variant] = entry
+    else:
+        rendered = _render(data)
+        uploads: Dict[Tuple[str, str], Tuple[bytes, str]] = {
+            (variant, fmt): payload
+            for variant, info in rendered.items()
+            for fmt, payload in info["files"].items()
+        }
+        marker_payload = uploads.pop(MARKER)
+
+        def upload(key, payload):
+            return upload_image_to_storage(blob_path(prefix, digest, *key), payload[0], payload[1],
+                                           cache_control=CACHE_CONTROL)
+
+        with ThreadPoolExecutor(max_workers=len(uploads)) as pool:
+            futures = {key: pool.submit(upload, key, payload) for key, payload in uploads.items()}
+            urls = {key: f.result() for key, f in futures.items()}
+        urls[MARKER] = upload(MARKER, marker_payload)
+
+        variants = {
+            variant: dict({"width": info["width"], "height": info["height"]},
+                          **{fmt: urls[(variant, fmt)] for fmt in FORMATS})
+            for variant, info in rendered.items()
+        }
+
+    logger.info(f"Image {digest[:12]} {'already stored' if deduplicated else 'stored'} under {prefix}/")
+    return {
+        "url": variants["full"]["webp"],
+        "thumbnail_url": variants["thumb"]["webp"],
+        "sha256": digest,
+        "deduplicated": deduplicated,
+        "variants": variants,
+        "srcset": {fmt: _srcset(variants, fmt) for fmt in FORMATS},
+    }
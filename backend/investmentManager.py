@@ -2,6 +2,8 @@
 from typing import Dict, List
 from firebase_config import db
 from firebase_admin import firestore
+from pagination import Page, paginate, snapshot_version
+from batch_lookup import get_by_ids
 
 class InvestmentManager:
     """Handles logic for the investment marketplace (pitches, funding, etc.)."""
@@ -11,8 +13,8 @@ class InvestmentManager:
         """Helper function to fetch basic profiles for a list of investor UIDs."""
         if not investor_uids:
             return []
-        investor_docs = db.collection("investors").where("__name__", "in", investor_uids).stream()
-        return [{"uid": doc.id, "name": doc.to_dict().get("name", "Unknown Investor")} for doc in investor_docs]
+        investors = get_by_ids("investors", investor_uids, field_paths=["name"])
+        return [{"uid": uid, "name": data.get("name", "Unknown Investor")} for uid, data in investors.items() if data is not None]
 
     @classmethod
     def get_pitch_details(cls, pitch_id: str) -> Dict | None:
@@ -73,15 +75,16 @@ class InvestmentManager:
         return pitch_ref.id
 
     @classmethod
-    def list_open_pitches(cls) -> List[Dict]:
-        """Lists all pitches that are open for investment."""
-        q = db.collection("pitches").where("status", "==", "open").order_by("created_at", direction=firestore.Query.DESCENDING)
+    def list_open_pitches(cls, limit: int = 50, cursor: str = None) -> Page:
+        """Lists one page of pitches that are open for investment, newest first."""
+        q = db.collection("pitches").where("status", "==", "open")
+        snaps, next_cursor, prev_cursor = paginate(q, "created_at", descending=True, limit=limit, cursor=cursor)
         pitches = []
-        for doc in q.stream():
+        for doc in snaps:
             data = doc.to_dict()
             data["id"] = doc.id
             pitches.append(data)
-        return pitches
+        return Page(pitches, next_cursor, prev_cursor, version=snapshot_version(snaps))
 
     @classmethod
     def show_interest(cls, pitch_id: str, investor_uid: str) -> Dict:
@@ -2,6 +2,9 @@
 from typing import Dict, List, Optional
 from firebase_config import db
 from firebase_admin import firestore
+from user_directory import UserDirectory
+from batch_lookup import get_by_ids
+import projections
 from investor import Investor
 
 
@@ -9,6 +12,10 @@ class InvestorManager:
     """Manager for handling Investor collection operations in Firestore."""
 
     COLLECTION = "investors"
+    # What a profile card shows; get_many reads only these by default.
+    CARD_FIELDS = ["name", "bio", "interests", "location", "avatar_url"]
+    DETAIL_FIELDS = CARD_FIELDS + ["created_at"]
+    PROJECTIONS = {"card": CARD_FIELDS, "detail": DETAIL_FIELDS, "full": None}
 
     @classmethod
     def signup(cls, data: Dict) -> str:
@@ -33,6 +40,7 @@ class InvestorManager:
             "updated_at": firestore.SERVER_TIMESTAMP
         }
         doc_ref.set(investor_data)
+        UserDirectory.invalidate(uid)
         return uid
 
     @classmethod
@@ -41,31 +49,43 @@ class InvestorManager:
         doc = db.collection(cls.COLLECTION).document(uid).get()
         return doc.to_dict() if doc.exists else None
 
+    @classmethod
+    def get_many(cls, uids: List[str], fields: Optional[List[str]] = None) -> List[Dict]:
+        """Fetch several investor profiles with one batched read, in the order given (unknown uids skipped).
+
+        Only ``fields`` (default: CARD_FIELDS) are read; each profile also carries its ``uid``.
+        """
+        profiles = get_by_ids(cls.COLLECTION, uids, field_paths=fields or cls.CARD_FIELDS)
+        return [dict(data, uid=uid) for uid, data in profiles.items() if data is not None]
+
     @classmethod
     def update_profile(cls, uid: str, updates: Dict) -> Dict:
         """Update an investor’s profile fields."""
         updates["updated_at"] = firestore.SERVER_TIMESTAMP
         db.collection(cls.COLLECTION).document(uid).update(updates)
+        UserDirectory.invalidate(uid)
         return {"message": "Profile updated", "uid": uid}
 
     @classmethod
     def delete(cls, uid: str) -> Dict:
         """Delete investor profile."""
         db.collection(cls.COLLECTION).document(uid).delete()
+        UserDirectory.invalidate(uid)
         return {"message": "Investor deleted", "uid": uid}
 
     @classmethod
-    def list_all(cls, limit: int = 50) -> List[Dict]:
-        """List all investors (basic info)."""
-        q = db.collection(cls.COLLECTION).limit(limit)
-        return [dict(d.to_dict(), uid=d.id) for d in q.stream()]
+    def list_all(cls, limit: int = 50, projection: Optional[str] = None) -> List[Dict]:
+        """List investors, reading only the fields of ``projection`` (see PROJECTIONS)."""
+        q = projections.select(db.collection(cls.COLLECTION), projections.field_mask(cls.PROJECTIONS, projection))
+        return [projections.public_profile(d) for d in q.limit(limit).stream()]
 
     @classmethod
-    def search_by_interest(cls, interest: str, limit: int = 20) -> List[Dict]:
+    def search_by_interest(cls, interest: str, limit: int = 20, projection: Optional[str] = None) -> List[Dict]:
         """Search investors by area of interest (case-insensitive)."""
         interest_lower = interest.lower()
-        q = db.collection(cls.COLLECTION).where("interests", "array_contains", interest_lower).limit(limit)
-        return [dict(d.to_dict(), uid=d.id) for d in q.stream()]
+        q = db.collection(cls.COLLECTION).where("interests", "array_contains", interest_lower)
+        q = projections.select(q, projections.field_mask(cls.PROJECTIONS, projection))
+        return [projections.public_profile(d) for d in q.limit(limit).stream()]
 
     @classmethod
     def hydrate_entity(cls, uid: str) -> Optional[Investor]:
@@ -0,0 +1,135 @@
+# kalasetu/job_manager.py
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from firebase_config import db
+from firebase_admin import firestore
+from ai_helper import AIHelper
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class JobLimitExceeded(Exception):
+    """Raised when a user (or this worker) already has too many jobs in flight."""
+
+
+class JobManager:
+    """Asynchronous jobs for slow AI work (currently image generation).
+
+    Jobs run on a bounded thread pool; their state lives in the ``jobs``
+    collection so any worker can answer a status poll.
+    Statuses: queued -> running -> succeeded | failed.
+    """
+
+    COLLECTION = "jobs"
+    ACTIVE_STATUSES = ["queued", "running"]
+
+    MAX_WORKERS = int(os.environ.get("IMAGE_JOB_WORKERS", 4))
+    MAX_QUEUED = int(os.environ.get("IMAGE_JOB_QUEUE_LIMIT", 32))
+    PER_USER_LIMIT = int(os.environ.get("IMAGE_JOBS_PER_USER", 2))
+    # A job still "active" after this long is assumed lost (e.g. its worker was restarted).
+    STALE_AFTER = timedelta(seconds=float(os.environ.get("JOB_STALE_SECONDS", 600)))
+
+    _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="kalasetu-jobs")
+    _in_flight = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def _active_jobs_for_user(cls, uid: str) -> int:
+        """Best-effort count: a plain query, not a transaction, so simultaneous submits can both pass."""
+        cutoff = datetime.now(timezone.utc) - cls.STALE_AFTER
+        q = db.collection(cls.COLLECTION).where("uid", "==", uid) \
+            .where("status", "in", cls.ACTIVE_STATUSES).limit(cls.PER_USER_LIMIT + 5)
+        return sum(1 for doc in q.stream() if ((doc.to_dict() or {}).get("created_at") or cutoff) > cutoff)
+
+    @classmethod
+    def submit_image_job(cls, uid: str, prompt: str) -> Dict:
+        """Queue an image generation job and return its id immediately.
+
+        PER_USER_LIMIT is a soft limit (see :meth:`_active_jobs_for_user`); the
+        per-worker pool bound below is exact.
+        """
+        if not prompt:
+            raise ValueError("Description required.")
+        if cls._active_jobs_for_user(uid) >= cls.PER_USER_LIMIT:
+            raise JobLimitExceeded(f"You already have {cls.PER_USER_LIMIT} image jobs in progress.")
+
+        with cls._lock:
+            if cls._in_flight >= cls.MAX_WORKERS + cls.MAX_QUEUED:
+                raise JobLimitExceeded("Image generation is busy, please try again shortly.")
+            cls._in_flight += 1
+
+        try:
+            job_ref = db.collection(cls.COLLECTION).document()
+            job_ref.set({
+                "kind": "image",
+                "uid": uid,
+                "status": "queued",
+                "params": {"prompt": prompt},
+                "created_at": datetime.now(timezone.utc),
+                "updated_at": firestore.SERVER_TIMESTAMP
+            })
+            cls._executor.submit(cls._run_image_job, job_ref, prompt)
+        except Exception:
+            with cls._lock:
+                cls._in_flight -= 1
+            raise
+        return {"job_id": job_ref.id, "status": "queued"}
+
+    @staticmethod
+    def _image_error(result: Dict) -> Optional[str]:
+        """Why an image result is unusable, or None if it has an uploaded URL to show."""
+        if result.get("error"):
+            return result["error"]
+        if result.get("upload_error"):
+            return f"Image upload failed: {result['upload_error']}"
+        if not result.get("url"):
+            return "Image generation returned no image URL."
+        return None
+
+    @classmethod
+    def _run_image_job(cls, job_ref, prompt: str) -> None:
+        try:
+            job_ref.update({"status": "running", "started_at": firestore.SERVER_TIMESTAMP,
+                            "updated_at": firestore.SERVER_TIMESTAMP})
+            result = AIHelper().generate_image(prompt, upload=True)
+            error = cls._image_error(result)
+            if error:
+                job_ref.update({"status": "failed", "error": error,
+                                "finished_at": firestore.SERVER_TIMESTAMP,
+                                "updated_at": firestore.SERVER_TIMESTAMP})
+            else:
+                job_ref.update({"status": "succeeded", "result": result,
+                                "finished_at": firestore.SERVER_TIMESTAMP,
+                                "updated_at": firestore.SERVER_TIMESTAMP})
+        except Exception as e:
+            logger.error(f"Image job {job_ref.id} failed: {e}")
+            try:
+                job_ref.update({"status": "failed", "error": str(e),
+                                "finished_at": firestore.SERVER_TIMESTAMP,
+                                "updated_at": firestore.SERVER_TIMESTAMP})
+            except Exception as update_error:
+                logger.error(f"Could not record failure for job {job_ref.id}: {update_error}")
+        finally:
+            with cls._lock:
+                cls._in_flight -= 1
+
+    @classmethod
+    def get_job(cls, job_id: str) -> Optional[Dict]:
+        """Current state of a job, or None if it does not exist."""
+        doc = db.collection(cls.COLLECTION).document(job_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        return {
+            "job_id": doc.id,
+            "kind": data.get("kind"),
+            "uid": data.get("uid"),
+            "status": data.get("status"),
+            "result": data.get("result"),
+            "error": data.get("error"),
+        }
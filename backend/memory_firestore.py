@@ -0,0 +1,943 @@
+# kalasetu/memory_firestore.py
+"""In-process stand-in for the Firestore client.
+
+Selected with ``FIRESTORE_BACKEND=memory`` (see firebase_client), so every
+manager runs unchanged against it: local benchmarking and end-to-end tests need
+no Firebase project. It implements the subset of the google-cloud-firestore API
+this codebase uses:
+
+* collections, documents and sub-collections, ``collection_group``, ``get_all``
+* queries: ``where`` (==, !=, <, <=, >, >=, array_contains, array_contains_any,
+  in, not-in; ``__name__``; dotted paths), ``order_by``, ``limit``,
+  ``limit_to_last``, ``offset``, ``select`` and the four cursor methods
+* writes: ``set`` (with ``merge``), ``update`` (dotted paths), ``create``,
+  ``delete``, ``add``, write batches and transactions that work with
+  ``firestore.transactional`` (optimistic: a commit whose reads went stale
+  raises ``Aborted`` and the decorator retries it)
+* transforms: SERVER_TIMESTAMP, DELETE_FIELD, Increment, Maximum, Minimum,
+  ArrayUnion and ArrayRemove
+* ``on_snapshot`` listeners on documents and queries. Callbacks get the usual
+  ``(docs, changes, read_time)`` but run synchronously on the writing thread,
+  right after the commit, instead of on a watch thread
+
+Every RPC can be slowed down by a configurable latency (per operation) and is
+counted, so a benchmark can report reads/writes per request.
+"""
+import copy
+import heapq
+import logging
+import os
+import random
+import string
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+logger = logging.getLogger(__name__)
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+MAX_IN_VALUES = 30
+MAX_BATCH_WRITES = 500
+RPC_OPS = ("get", "get_all", "query", "commit", "begin_transaction", "rollback")
+
+WriteResult = namedtuple("WriteResult", ["update_time"])
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_MISSING = object()
+_DELETE = object()
+
+
+def _auto_id() -> str:
+    return "".join(random.choice(_AUTO_ID_CHARS) for _ in range(20))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ---------------- Values ---------------- #
+def _sort_key(value: Any) -> Tuple:
+    """Firestore's cross-type ordering: null < bool < number < timestamp < string < bytes < reference < array < map."""
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, _utc(value))
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, DocumentReference):
+        return (6, value.path)
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(_sort_key(v) for v in value))
+    if isinstance(value, dict):
+        return (9, tuple(sorted((k, _sort_key(v)) for k, v in value.items())))
+    return (7, repr(value))
+
+
+def _utc(value: datetime) -> datetime:
+    # Firestore stores UTC instants; naive datetimes are taken to be UTC, like the SDK does.
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _get_path(data: Dict, field_path: str) -> Any:
+    current = data
+    for part in field_path.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _resolve(value: Any, current: Any = _MISSING) -> Any:
+    """Apply transforms/sentinels against the field's current value and copy containers."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return _now()
+    if value is transforms.DELETE_FIELD:
+        return _DELETE
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.Maximum):
+        return value.value if not isinstance(current, (int, float)) else max(current, value.value)
+    if isinstance(value, transforms.Minimum):
+        return value.value if not isinstance(current, (int, float)) else min(current, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        keys = [_sort_key(v) for v in result]
+        for item in value.values:
+            if _sort_key(item) not in keys:
+                result.append(_resolve(item))
+                keys.append(_sort_key(item))
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        removed = {_sort_key(v) for v in value.values}
+        return [v for v in current if _sort_key(v) not in removed] if isinstance(current, list) else []
+    if isinstance(value, dict):
+        base = current if isinstance(current, dict) else {}
+        resolved = {k: _resolve(v, base.get(k, _MISSING)) for k, v in value.items()}
+        return {k: v for k, v in resolved.items() if v is not _DELETE}
+    if isinstance(value, (list, tuple)):
+        return [_resolve(v) for v in value]
+    if isinstance(value, datetime):
+        return _utc(value)
+    return value
+
+
+def _merge(target: Dict, data: Dict) -> Dict:
+    """``set(..., merge=True)``: nested maps are merged field by field."""
+    result = dict(target)
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = _merge(result[key], value)
+        else:
+            resolved = _resolve(value, result.get(key, _MISSING))
+            if resolved is _DELETE:
+                result.pop(key, None)
+            else:
+                result[key] = resolved
+    return result
+
+
+def _update(target: Dict, field_updates: Dict) -> Dict:
+    """``update()``: keys are dotted field paths; each value replaces that field."""
+    result = copy.deepcopy(target)
+    for field_path, value in field_updates.items():
+        parts = field_path.split(".")
+        parent = result
+        for part in parts[:-1]:
+            if not isinstance(parent.get(part), dict):
+                parent[part] = {}
+            parent = parent[part]
+        resolved = _resolve(value, parent.get(parts[-1], _MISSING))
+        if resolved is _DELETE:
+            parent.pop(parts[-1], None)
+        else:
+            parent[parts[-1]] = resolved
+    return result
+
+
+def _project(data: Dict, field_paths: Optional[Iterable[str]]) -> Dict:
+    if field_paths is None:
+        return copy.deepcopy(data)
+    projected: Dict = {}
+    for field_path in field_paths:
+        value = _get_path(data, field_path)
+        if value is _MISSING:
+            continue
+        parts = field_path.split(".")
+        parent = projected
+        for part in parts[:-1]:
+            parent = parent.setdefault(part, {})
+        parent[parts[-1]] = copy.deepcopy(value)
+    return projected
+
+
+# ---------------- Snapshots and references ---------------- #
+class _StoredDoc:
+    __slots__ = ("data", "create_time", "update_time", "version")
+
+    def __init__(self, data: Dict, create_time: datetime, version: int):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = create_time
+        self.version = version
+
+
+class DocumentSnapshot:
+    """Immutable view of a document at read time (``exists`` is False for a missing document)."""
+
+    def __init__(self, reference: "DocumentReference", data: Optional[Dict],
+                 create_time: Optional[datetime] = None, update_time: Optional[datetime] = None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = _now()
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        value = _get_path(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(f"'{field_path}' is not contained in the data")
+        return copy.deepcopy(value)
+
+    def __repr__(self):
+        return f"<DocumentSnapshot {self.reference.path} exists={self.exists}>"
+
+
+class DocumentReference:
+    def __init__(self, client: "MemoryFirestore", path: str):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "CollectionReference":
+        return CollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str) -> "CollectionReference":
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def collections(self) -> List["CollectionReference"]:
+        return self._client._child_collections(self.path)
+
+    def get(self, field_paths: Optional[Iterable[str]] = None, transaction: "MemoryTransaction" = None,
+            **kwargs) -> DocumentSnapshot:
+        self._client._rpc("get")
+        return self._client._read([self], field_paths, transaction)[0]
+
+    def set(self, document_data: Dict, merge: bool = False) -> WriteResult:
+        return self._client._commit([("set", self, document_data, bool(merge))])[0]
+
+    def update(self, field_updates: Dict, option=None) -> WriteResult:
+        return self._client._commit([("update", self, field_updates, False)])[0]
+
+    def create(self, document_data: Dict) -> WriteResult:
+        return self._client._commit([("create", self, document_data, False)])[0]
+
+    def delete(self, option=None) -> datetime:
+        return self._client._commit([("delete", self, None, False)])[0].update_time
+
+    def on_snapshot(self, callback) -> "MemoryWatch":
+        return self._client._listen(MemoryWatch(self._client, callback, document=self))
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other._client is self._client and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"<DocumentReference {self.path}>"
+
+
+# ---------------- Queries ---------------- #
+class Query:
+    ASCENDING = ASCENDING
+    DESCENDING = DESCENDING
+
+    _OPERATORS = {"<", "<=", "==", "!=", ">=", ">", "array_contains", "array-contains",
+                  "array_contains_any", "array-contains-any", "in", "not-in", "not_in"}
+    _INEQUALITIES = {"<", "<=", "!=", ">=", ">", "not-in", "not_in"}
+
+    def __init__(self, client: "MemoryFirestore", parent_path: str, all_descendants: bool = False):
+        self._client = client
+        self._parent_path = parent_path
+        self._all_descendants = all_descendants
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._orders: List[Tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._limit_to_last = False
+        self._offset = 0
+        self._projection: Optional[List[str]] = None
+        self._start: Optional[Tuple[Any, bool]] = None  # (cursor, inclusive)
+        self._end: Optional[Tuple[Any, bool]] = None
+
+    def _copy(self) -> "Query":
+        q = Query.__new__(Query)
+        q.__dict__.update(self.__dict__)
+        q._filters = list(self._filters)
+        q._orders = list(self._orders)
+        return q
+
+    # -- builders --
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter=None) -> "Query":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in self._OPERATORS:
+            raise ValueError(f"Operator string {op_string!r} is invalid.")
+        op = op_string.replace("-", "_")
+        if op in ("in", "not_in", "array_contains_any"):
+            if not isinstance(value, (list, tuple)) or not value:
+                raise ValueError(f"'{op_string}' requires a non-empty list.")
+            if len(value) > MAX_IN_VALUES:
+                raise exceptions.InvalidArgument(
+                    f"'{op_string}' filters support up to {MAX_IN_VALUES} values, got {len(value)}.")
+        q = self._copy()
+        q._filters.append((field_path, op, value))
+        return q
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "Query":
+        direction = str(direction).upper()
+        if direction not in (ASCENDING, DESCENDING):
+            raise ValueError(f"Invalid direction {direction!r}")
+        q = self._copy()
+        q._orders.append((field_path, direction))
+        return q
+
+    def limit(self, count: int) -> "Query":
+        q = self._copy()
+        q._limit, q._limit_to_last = count, False
+        return q
+
+    def limit_to_last(self, count: int) -> "Query":
+        q = self._copy()
+        q._limit, q._limit_to_last = count, True
+        return q
+
+    def offset(self, num_to_skip: int) -> "Query":
+        q = self._copy()
+        q._offset = num_to_skip
+        return q
+
+    def select(self, field_paths: Iterable[str]) -> "Query":
+        q = self._copy()
+        q._projection = list(field_paths)
+        return q
+
+    def start_at(self, document_fields_or_snapshot) -> "Query":
+        q = self._copy()
+        q._start = (document_fields_or_snapshot, True)
+        return q
+
+    def start_after(self, document_fields_or_snapshot) -> "Query":
+        q = self._copy()
+        q._start = (document_fields_or_snapshot, False)
+        return q
+
+    def end_at(self, document_fields_or_snapshot) -> "Query":
+        q = self._copy()
+        q._end = (document_fields_or_snapshot, True)
+        return q
+
+    def end_before(self, document_fields_or_snapshot) -> "Query":
+        q = self._copy()
+        q._end = (document_fields_or_snapshot, False)
+        return q
+
+    # -- execution --
+    def stream(self, transaction: "MemoryTransaction" = None, **kwargs):
+        self._client._rpc("query")
+        return iter(self._client._run_query(self, transaction))
+
+    def get(self, transaction: "MemoryTransaction" = None, **kwargs) -> List[DocumentSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+    def on_snapshot(self, callback) -> "MemoryWatch":
+        return self._client._listen(MemoryWatch(self._client, callback, query=self))
+
+    def _watches(self, collection_path: str) -> bool:
+        if self._all_descendants:
+            return collection_path.rsplit("/", 1)[-1] == self._parent_path
+        return collection_path == self._parent_path
+
+    # -- evaluation helpers (called with the store lock held) --
+    def _name_value(self, value: Any) -> str:
+        if isinstance(value, DocumentReference):
+            return value.path
+        if isinstance(value, str) and "/" not in value and not self._all_descendants:
+            return f"{self._parent_path}/{value}"
+        return value
+
+    def _field(self, path: str, data: Dict, field_path: str) -> Any:
+        return path if field_path == "__name__" else _get_path(data, field_path)
+
+    def _matches(self, path: str, data: Dict) -> bool:
+        for field_path, op, expected in self._filters:
+            if field_path == "__name__":
+                expected = ([self._name_value(v) for v in expected] if isinstance(expected, (list, tuple))
+                            else self._name_value(expected))
+            actual = self._field(path, data, field_path)
+            if actual is _MISSING:
+                return False
+            key = _sort_key(actual)
+            if op == "==":
+                ok = key == _sort_key(expected)
+            elif op == "!=":
+                ok = key != _sort_key(expected) and actual is not None
+            elif op in ("<", "<=", ">", ">="):
+                other = _sort_key(expected)
+                if key[0] != other[0]:
+                    return False
+                ok = {"<": key < other, "<=": key <= other, ">": key > other, ">=": key >= other}[op]
+            elif op == "array_contains":
+                ok = isinstance(actual, list) and _sort_key(expected) in {_sort_key(v) for v in actual}
+            elif op == "array_contains_any":
+                wanted = {_sort_key(v) for v in expected}
+                ok = isinstance(actual, list) and any(_sort_key(v) in wanted for v in actual)
+            elif op == "in":
+                ok = key in {_sort_key(v) for v in expected}
+            else:  # not_in
+                ok = key not in {_sort_key(v) for v in expected} and actual is not None
+            if not ok:
+                return False
+        return True
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        orders = list(self._orders)
+        if not orders:
+            inequality = next((f for f, op, _ in self._filters if op in {"<", "<=", ">", ">=", "!=", "not_in"}), None)
+            if inequality and inequality != "__name__":
+                orders.append((inequality, ASCENDING))
+        if not any(f == "__name__" for f, _ in orders):
+            orders.append(("__name__", orders[-1][1] if orders else ASCENDING))
+        return orders
+
+    def _cursor_values(self, cursor: Any, orders: List[Tuple[str, str]]) -> List[Any]:
+        if isinstance(cursor, DocumentSnapshot):
+            data = cursor._data or {}
+            return [cursor.reference.path if f == "__name__" else _get_path(data, f) for f, _ in orders]
+        if isinstance(cursor, dict):
+            values = []
+            for f, _ in orders:
+                if f not in cursor:
+                    break
+                values.append(self._name_value(cursor[f]) if f == "__name__" else cursor[f])
+            return values
+        values = list(cursor)
+        return [self._name_value(v) if f == "__name__" else v for (f, _), v in zip(orders, values)]
+
+    @staticmethod
+    def _compare(a: List, b: List, orders: List[Tuple[str, str]]) -> int:
+        for (_, direction), x, y in zip(orders, a, b):
+            kx, ky = _sort_key(x), _sort_key(y)
+            if kx != ky:
+                result = -1 if kx < ky else 1
+                return -result if direction == DESCENDING else result
+        return 0
+
+
+class _OrderKey:
+    """Sort key for a query row, with each ordered value's Firestore sort key computed once."""
+    __slots__ = ("keys", "descending")
+
+    def __init__(self, values: List[Any], descending: List[bool]):
+        self.keys = [_sort_key(v) for v in values]
+        self.descending = descending
+
+    def __lt__(self, other: "_OrderKey") -> bool:
+        for x, y, desc in zip(self.keys, other.keys, self.descending):
+            if x != y:
+                return x > y if desc else x < y
+        return False
+
+
+class CollectionReference(Query):
+    def __init__(self, client: "MemoryFirestore", path: str):
+        super().__init__(client, path)
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> Optional[DocumentReference]:
+        if "/" not in self.path:
+            return None
+        return DocumentReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, f"{self.path}/{document_id or _auto_id()}")
+
+    def add(self, document_data: Dict, document_id: Optional[str] = None) -> Tuple[datetime, DocumentReference]:
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+    def list_documents(self, page_size: Optional[int] = None) -> List[DocumentReference]:
+        self._client._rpc("query")
+        with self._client._lock:
+            ids = list(self._client._collections.get(self.path, {}))
+        return [self.document(doc_id) for doc_id in ids]
+
+    def __repr__(self):
+        return f"<CollectionReference {self.path}>"
+
+
+# ---------------- Writes ---------------- #
+class MemoryWriteBatch:
+    """Accumulates writes and applies them atomically in one commit."""
+
+    def __init__(self, client: "MemoryFirestore"):
+        self._client = client
+        self._writes: List[Tuple] = []
+
+    def _add(self, write: Tuple) -> None:
+        if len(self._writes) >= MAX_BATCH_WRITES:
+            raise exceptions.InvalidArgument(f"A batch can contain at most {MAX_BATCH_WRITES} writes.")
+        self._writes.append(write)
+
+    def set(self, reference: DocumentReference, document_data: Dict, merge: bool = False) -> None:
+        self._add(("set", reference, document_data, bool(merge)))
+
+    def update(self, reference: DocumentReference, field_updates: Dict, option=None) -> None:
+        self._add(("update", reference, field_updates, False))
+
+    def create(self, reference: DocumentReference, document_data: Dict) -> None:
+        self._add(("create", reference, document_data, False))
+
+    def delete(self, reference: DocumentReference, option=None) -> None:
+        self._add(("delete", reference, None, False))
+
+    def commit(self, **kwargs) -> List[WriteResult]:
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes) if writes else []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """Transaction compatible with ``firestore.transactional``.
+
+    Reads record the version of every document they saw; the commit raises
+    ``Aborted`` if any of them changed meanwhile, which the decorator retries.
+    """
+
+    def __init__(self, client: "MemoryFirestore", max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id: Optional[bytes] = None
+        self._read_versions: Dict[str, int] = {}
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    @property
+    def id(self) -> Optional[bytes]:
+        return self._id
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    def _begin(self, retry_id: Optional[bytes] = None) -> None:
+        if self.in_progress:
+            raise ValueError("The transaction has already begun.")
+        self._client._rpc("begin_transaction")
+        self._client._count("transactions")
+        if retry_id is not None:
+            self._client._count("transaction_retries")
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self) -> None:
+        if self.in_progress:
+            self._client._rpc("rollback")
+        self._clean_up()
+
+    def _commit(self) -> List[WriteResult]:
+        if not self.in_progress:
+            raise ValueError("The transaction has not begun.")
+        try:
+            return self._client._commit(self._writes, self._read_versions)
+        finally:
+            self._clean_up()
+
+    def _add(self, write: Tuple) -> None:
+        if self._read_only:
+            raise ValueError("Cannot perform write operation in read-only transaction.")
+        super()._add(write)
+
+    def _record_read(self, path: str, version: int) -> None:
+        self._read_versions.setdefault(path, version)
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, DocumentReference):
+            return self._client.get_all([ref_or_query], transaction=self)
+        return ref_or_query.stream(transaction=self)
+
+    def get_all(self, references: Iterable[DocumentReference], **kwargs):
+        return self._client.get_all(references, transaction=self)
+
+    def commit(self, **kwargs):
+        raise ValueError("Use firestore.transactional to commit a transaction.")
+
+
+# ---------------- Listeners ---------------- #
+class MemoryWatch:
+    """Handle returned by ``on_snapshot``; ``unsubscribe()`` stops further callbacks.
+
+    Each delivery diffs the current result set against the previous one, so the
+    callback sees ADDED / MODIFIED / REMOVED changes like a Firestore listener,
+    and only the changed documents count as reads.
+    """
+
+    def __init__(self, client: "MemoryFirestore", callback, query: Optional[Query] = None,
+                 document: Optional[DocumentReference] = None):
+        self._client = client
+        self._callback = callback
+        self._query = query
+        self._document = document
+        self._previous: Dict[str, DocumentSnapshot] = {}
+        self._order: List[str] = []
+        self._lock = threading.RLock()  # a callback may write, which re-delivers
+        self.is_active = True
+
+    def unsubscribe(self) -> None:
+        self.is_active = False
+        self._client._unlisten(self)
+
+    def _watches(self, collection_paths: Iterable[str]) -> bool:
+        if self._document is not None:
+            return self._document.parent.path in collection_paths
+        return any(self._query._watches(path) for path in collection_paths)
+
+    def _current(self) -> List[DocumentSnapshot]:
+        if self._document is not None:
+            return self._client._read([self._document], None, None, count=False)
+        return self._client._evaluate(self._query, None)
+
+    def _deliver(self, initial: bool = False) -> None:
+        with self._lock:
+            if not self.is_active:
+                return
+            docs = self._current()
+            current = {snap.reference.path: snap for snap in docs if snap.exists}
+            order = [snap.reference.path for snap in docs if snap.exists]
+            changes = []
+            for old_index, path in enumerate(self._order):
+                if path not in current:
+                    changes.append(DocumentChange(ChangeType.REMOVED, self._previous[path], old_index, -1))
+            for new_index, path in enumerate(order):
+                old = self._previous.get(path)
+                if old is None:
+                    changes.append(DocumentChange(ChangeType.ADDED, current[path], -1, new_index))
+                elif old.update_time != current[path].update_time or old._data != current[path]._data:
+                    changes.append(DocumentChange(ChangeType.MODIFIED, current[path],
+                                                  self._order.index(path), new_index))
+            self._previous, self._order = current, order
+            if not changes and not initial:
+                return
+            reads = sum(c.type != ChangeType.REMOVED for c in changes)
+            self._client._count("reads", max(1, reads) if initial else reads)
+            try:
+                self._callback(docs if self._document is not None else [current[p] for p in order],
+                               changes, _now())
+            except Exception:
+                logger.exception("on_snapshot callback failed")
+
+
+# ---------------- Client ---------------- #
+class MemoryFirestore:
+    """Drop-in for ``google.cloud.firestore.Client`` backed by Python dicts."""
+
+    def __init__(self, latency_ms: float = 0.0, latency_by_op: Optional[Dict[str, float]] = None,
+                 jitter_ms: float = 0.0, project: str = "kalasetu-memory"):
+        self.project = project
+        self.latency_ms = latency_ms
+        self.latency_by_op = dict(latency_by_op or {})
+        self.jitter_ms = jitter_ms
+        self._collections: Dict[str, Dict[str, _StoredDoc]] = {}
+        self._lock = threading.RLock()
+        self._version = 0
+        self._stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._listeners: List[MemoryWatch] = []
+
+    @classmethod
+    def from_env(cls) -> "MemoryFirestore":
+        """FIRESTORE_MEMORY_LATENCY_MS is either one number for every RPC or e.g. ``"2,query=8,commit=10"``."""
+        latency_ms, by_op = 0.0, {}
+        for part in filter(None, (p.strip() for p in os.environ.get("FIRESTORE_MEMORY_LATENCY_MS", "").split(","))):
+            if "=" in part:
+                op, value = part.split("=", 1)
+                by_op[op.strip()] = float(value)
+            else:
+                latency_ms = float(part)
+        return cls(latency_ms=latency_ms, latency_by_op=by_op,
+                   jitter_ms=float(os.environ.get("FIRESTORE_MEMORY_JITTER_MS", 0)))
+
+    # -- public API --
+    def collection(self, *collection_path: str) -> CollectionReference:
+        path = "/".join(collection_path)
+        if path.count("/") % 2:
+            raise ValueError(f"{path!r} is not a collection path")
+        return CollectionReference(self, path)
+
+    def document(self, *document_path: str) -> DocumentReference:
+        path = "/".join(document_path)
+        if not path.count("/") % 2:
+            raise ValueError(f"{path!r} is not a document path")
+        return DocumentReference(self, path)
+
+    def collection_group(self, collection_id: str) -> Query:
+        return Query(self, collection_id, all_descendants=True)
+
+    def collections(self) -> List[CollectionReference]:
+        return self._child_collections("")
+
+    def get_all(self, references: Iterable[DocumentReference], field_paths: Optional[Iterable[str]] = None,
+                transaction: MemoryTransaction = None, **kwargs):
+        references = list(references)
+        self._rpc("get_all")
+        return iter(self._read(references, field_paths, transaction))
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> MemoryTransaction:
+        return MemoryTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def close(self) -> None:
+        pass
+
+    # -- test / benchmark helpers --
+    def stats(self) -> Dict[str, Any]:
+        """RPC and document counters since the last :meth:`reset_stats`."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        result = {key: stats.get(key, 0) for key in ("reads", "writes", "transactions", "transaction_retries", "aborted")}
+        result["rpcs"] = {op: stats.get(f"rpc.{op}", 0) for op in RPC_OPS}
+        result["rpc_total"] = sum(result["rpcs"].values())
+        return result
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats.clear()
+
+    def clear(self) -> None:
+        """Drop every document (stats are kept)."""
+        with self._lock:
+            self._collections.clear()
+
+    def document_count(self, collection_path: Optional[str] = None) -> int:
+        with self._lock:
+            if collection_path is not None:
+                return len(self._collections.get(collection_path, {}))
+            return sum(len(docs) for docs in self._collections.values())
+
+    # -- internals --
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _rpc(self, op: str) -> None:
+        self._count(f"rpc.{op}")
+        delay = self.latency_by_op.get(op, self.latency_ms)
+        if self.jitter_ms:
+            delay += random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _child_collections(self, doc_path: str) -> List[CollectionReference]:
+        prefix = f"{doc_path}/" if doc_path else ""
+        depth = prefix.count("/")
+        with self._lock:
+            paths = [p for p in self._collections if p.startswith(prefix) and p.count("/") == depth and self._collections[p]]
+        return [CollectionReference(self, p) for p in sorted(paths)]
+
+    def _stored(self, path: str) -> Optional[_StoredDoc]:
+        collection_path, doc_id = path.rsplit("/", 1)
+        return self._collections.get(collection_path, {}).get(doc_id)
+
+    def _listen(self, watch: MemoryWatch) -> MemoryWatch:
+        with self._lock:
+            self._listeners.append(watch)
+        watch._deliver(initial=True)
+        return watch
+
+    def _unlisten(self, watch: MemoryWatch) -> None:
+        with self._lock:
+            if watch in self._listeners:
+                self._listeners.remove(watch)
+
+    def _notify(self, collection_paths: set) -> None:
+        with self._lock:
+            watches = [w for w in self._listeners if w._watches(collection_paths)]
+        for watch in watches:
+            watch._deliver()
+
+    def _read(self, references: List[DocumentReference], field_paths, transaction,
+              count: bool = True) -> List[DocumentSnapshot]:
+        snapshots = []
+        with self._lock:
+            for ref in references:
+                stored = self._stored(ref.path)
+                if transaction is not None:
+                    transaction._record_read(ref.path, stored.version if stored else 0)
+                if stored is None:
+                    snapshots.append(DocumentSnapshot(ref, None))
+                else:
+                    snapshots.append(DocumentSnapshot(ref, _project(stored.data, field_paths),
+                                                      stored.create_time, stored.update_time))
+        if count:
+            self._count("reads", len(references))
+        return snapshots
+
+    def _run_query(self, query: Query, transaction) -> List[DocumentSnapshot]:
+        snapshots = self._evaluate(query, transaction)
+        # Like Firestore billing, a query costs at least one read even when it matches nothing.
+        self._count("reads", max(1, len(snapshots)))
+        return snapshots
+
+    def _evaluate(self, query: Query, transaction) -> List[DocumentSnapshot]:
+        orders = query._effective_orders()
+        with self._lock:
+            if query._all_descendants:
+                sources = [(p, docs) for p, docs in self._collections.items()
+                           if p.rsplit("/", 1)[-1] == query._parent_path]
+            else:
+                sources = [(query._parent_path, self._collections.get(query._parent_path, {}))]
+
+            rows = []
+            for collection_path, docs in sources:
+                for doc_id, stored in docs.items():
+                    path = f"{collection_path}/{doc_id}"
+                    if not query._matches(path, stored.data):
+                        continue
+                    values = [query._field(path, stored.data, f) for f, _ in orders]
+                    if any(v is _MISSING for v in values):
+                        continue  # Firestore omits documents without the ordered fields
+                    rows.append((values, path, stored))
+
+            descending = [d == DESCENDING for _, d in orders]
+            order_key = lambda row: _OrderKey(row[0], descending)
+            if query._start is not None:
+                cursor, inclusive = query._start
+                bound = query._cursor_values(cursor, orders)
+                rows = [r for r in rows if (Query._compare(r[0], bound, orders) >= 0 if inclusive
+                                            else Query._compare(r[0], bound, orders) > 0)]
+            if query._end is not None:
+                cursor, inclusive = query._end
+                bound = query._cursor_values(cursor, orders)
+                rows = [r for r in rows if (Query._compare(r[0], bound, orders) <= 0 if inclusive
+                                            else Query._compare(r[0], bound, orders) < 0)]
+            if query._limit is not None and not query._limit_to_last:
+                # A page of a large collection: no need to sort every match.
+                rows = heapq.nsmallest(query._offset + query._limit, rows, key=order_key)
+            else:
+                rows.sort(key=order_key)
+            rows = rows[query._offset:]
+            if query._limit is not None:
+                rows = rows[-query._limit:] if query._limit_to_last else rows[:query._limit]
+                if query._limit == 0:
+                    rows = []
+
+            snapshots = []
+            for _, path, stored in rows:
+                if transaction is not None:
+                    transaction._record_read(path, stored.version)
+                snapshots.append(DocumentSnapshot(DocumentReference(self, path), _project(stored.data, query._projection),
+                                                  stored.create_time, stored.update_time))
+        return snapshots
+
+    def _commit(self, writes: List[Tuple], read_versions: Optional[Dict[str, int]] = None) -> List[WriteResult]:
+        self._rpc("commit")
+        with self._lock:
+            for path, version in (read_versions or {}).items():
+                stored = self._stored(path)
+                if (stored.version if stored else 0) != version:
+                    self._count("aborted")
+                    raise exceptions.Aborted(f"Transaction lock timeout / contention on {path}")
+
+            # Apply to a staged view first so a failing write leaves nothing half-applied.
+            now = _now()
+            staged: Dict[str, Optional[Dict]] = {}
+
+            def current(path):
+                if path in staged:
+                    return staged[path]
+                stored = self._stored(path)
+                return stored.data if stored else None
+
+            for op, ref, data, merge in writes:
+                existing = current(ref.path)
+                if op == "create":
+                    if existing is not None:
+                        raise exceptions.AlreadyExists(f"Document already exists: {ref.path}")
+                    staged[ref.path] = _merge({}, data)
+                elif op == "set":
+                    staged[ref.path] = _merge(copy.deepcopy(existing) if merge and existing else {}, data)
+                elif op == "update":
+                    if existing is None:
+                        raise exceptions.NotFound(f"No document to update: {ref.path}")
+                    staged[ref.path] = _update(existing, data)
+                else:
+                    staged[ref.path] = None
+
+            for path, data in staged.items():
+                collection_path, doc_id = path.rsplit("/", 1)
+                docs = self._collections.setdefault(collection_path, {})
+                if data is None:
+                    docs.pop(doc_id, None)
+                    continue
+                self._version += 1
+                stored = docs.get(doc_id)
+                if stored is None:
+                    docs[doc_id] = _StoredDoc(data, now, self._version)
+                else:
+                    stored.data, stored.update_time, stored.version = data, now, self._version
+        self._count("writes", len(writes))
+        if self._listeners:
+            self._notify({path.rsplit("/", 1)[0] for path in staged})
+        return [WriteResult(now) for _ in writes]
@@ -2,6 +2,9 @@
 from typing import Dict, List, Optional
 from firebase_config import db
 from firebase_admin import firestore
+from user_directory import UserDirectory
+from batch_lookup import get_by_ids
+import projections
 from mentor import Mentor
 
 
@@ -9,6 +12,10 @@ class MentorManager:
     """Manager for handling Mentor collection operations in Firestore."""
 
     COLLECTION = "mentors"
+    # What a profile card shows; get_many reads only these by default.
+    CARD_FIELDS = ["name", "bio", "expertise", "location", "avatar_url"]
+    DETAIL_FIELDS = CARD_FIELDS + ["connected_artisans", "created_at"]
+    PROJECTIONS = {"card": CARD_FIELDS, "detail": DETAIL_FIELDS, "full": None}
 
     @classmethod
     def signup(cls, data: Dict) -> str:
@@ -33,6 +40,7 @@ class MentorManager:
             "updated_at": firestore.SERVER_TIMESTAMP
         }
         doc_ref.set(mentor_data)
+        UserDirectory.invalidate(uid)
         return uid
 
     @classmethod
@@ -41,31 +49,43 @@ class MentorManager:
         doc = db.collection(cls.COLLECTION).document(uid).get()
         return doc.to_dict() if doc.exists else None
 
+    @classmethod
+    def get_many(cls, uids: List[str], fields: Optional[List[str]] = None) -> List[Dict]:
+        """Fetch several mentor profiles with one batched read, in the order given (unknown uids skipped).
+
+        Only ``fields`` (default: CARD_FIELDS) are read; each profile also carries its ``uid``.
+        """
+        profiles = get_by_ids(cls.COLLECTION, uids, field_paths=fields or cls.CARD_FIELDS)
+        return [dict(data, uid=uid) for uid, data in profiles.items() if data is not None]
+
     @classmethod
     def update_profile(cls, uid: str, updates: Dict) -> Dict:
         """Update a mentor’s profile fields."""
         updates["updated_at"] = firestore.SERVER_TIMESTAMP
         db.collection(cls.COLLECTION).document(uid).update(updates)
+        UserDirectory.invalidate(uid)
         return {"message": "Profile updated", "uid": uid}
 
     @classmethod
     def delete(cls, uid: str) -> Dict:
         """Delete mentor profile."""
         db.collection(cls.COLLECTION).document(uid).delete()
+        UserDirectory.invalidate(uid)
         return {"message": "Mentor deleted", "uid": uid}
 
     @classmethod
-    def list_all(cls, limit: int = 50) -> List[Dict]:
-        """List all mentors (basic info)."""
-        q = db.collection(cls.COLLECTION).limit(limit)
-        return [dict(d.to_dict(), uid=d.id) for d in q.stream()]
+    def list_all(cls, limit: int = 50, projection: Optional[str] = None) -> List[Dict]:
+        """List mentors, reading only the fields of ``projection`` (see PROJECTIONS)."""
+        q = projections.select(db.collection(cls.COLLECTION), projections.field_mask(cls.PROJECTIONS, projection))
+        return [projections.public_profile(d) for d in q.limit(limit).stream()]
 
     @classmethod
-    def search_by_expertise(cls, expertise: str, limit: int = 20) -> List[Dict]:
+    def search_by_expertise(cls, expertise: str, limit: int = 20, projection: Optional[str] = None) -> List[Dict]:
         """Search mentors by area of expertise (case-insensitive)."""
         expertise_lower = expertise.lower()
-        q = db.collection(cls.COLLECTION).where("expertise", "array_contains", expertise_lower).limit(limit)
-        return [dict(d.to_dict(), uid=d.id) for d in q.stream()]
+        q = db.collection(cls.COLLECTION).where("expertise", "array_contains", expertise_lower)
+        q = projections.select(q, projections.field_mask(cls.PROJECTIONS, projection))
+        return [projections.public_profile(d) for d in q.limit(limit).stream()]
 
     @classmethod
     def hydrate_entity(cls, uid: str) -> Optional[Mentor]:
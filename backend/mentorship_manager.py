@@ -26,15 +26,12 @@ class MentorshipManager:
     def get_received_requests(cls, mentor_uid: str) -> List[Dict]:
         """Fetches all pending mentorship requests for a given mentor."""
         requests_ref = db.collection("mentorship_requests").where("mentor_uid", "==", mentor_uid).where("status", "==", "pending")
-        
-        requests = []
-        for doc in requests_ref.stream():
-            request_data = doc.to_dict()
-            request_data["id"] = doc.id
-            # Hydrate with artisan's name for easier display on the frontend
-            artisan_profile = ArtisanManager.get_profile(request_data["artisan_uid"])
-            request_data["artisan_name"] = artisan_profile.get("name", "Unknown Artisan") if artisan_profile else "Unknown Artisan"
-            requests.append(request_data)
+        requests = [dict(doc.to_dict(), id=doc.id) for doc in requests_ref.stream()]
+
+        # Hydrate with artisan names (one batched read) for easier display on the frontend
+        names = {a["uid"]: a.get("name") for a in ArtisanManager.get_many([r["artisan_uid"] for r in requests], fields=["name"])}
+        for request_data in requests:
+            request_data["artisan_name"] = names.get(request_data["artisan_uid"]) or "Unknown Artisan"
         return requests
 
     @classmethod
@@ -0,0 +1,121 @@
+# kalasetu/pagination.py
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from firebase_admin import firestore
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor token we did not issue (or for another query)."""
+
+
+class Page(list):
+    """A list of results that also carries opaque cursors for the adjacent pages.
+
+    It serializes exactly like a plain list, so existing clients keep working;
+    routes expose the cursors through the X-Next-Cursor / X-Prev-Cursor headers.
+    ``version``, when set, changes whenever the page's content would (see
+    :func:`snapshot_version`) and lets routes answer conditional GETs early.
+    ``watermark``, on the first page of a synced listing, is what the client
+    passes back as ``?since=`` to fetch only later changes (see delta_sync).
+    """
+
+    def __init__(self, items=(), next_cursor: Optional[str] = None, prev_cursor: Optional[str] = None,
+                 version: Optional[str] = None, watermark: Optional[str] = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.version = version
+        self.watermark = watermark
+
+
+def snapshot_version(snaps: Iterable, extra: Iterable = ()) -> str:
+    """Short digest of the snapshots' ids and ``update_time``s, plus any derived values in ``extra``.
+
+    Derived data that is not stored on the documents themselves (resolved
+    names, the viewer's own votes) must go in ``extra``, or it could change
+    without the version changing.
+    """
+    digest = hashlib.sha1()
+    for snap in snaps:
+        update_time = getattr(snap, "update_time", None)
+        digest.update(f"{snap.id}@{update_time.isoformat() if update_time else ''};".encode("utf-8"))
+    for value in extra:
+        digest.update(repr(value).encode("utf-8"))
+        digest.update(b";")
+    return digest.hexdigest()[:20]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$ts": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$ts" in value:
+        return datetime.fromisoformat(value["$ts"])
+    return value
+
+
+def encode_cursor(order_field: str, value: Any, doc_id: str, direction: str) -> str:
+    """Build an opaque token pointing just past ``doc_id`` in the given direction."""
+    payload = {"f": order_field, "v": _encode_value(value), "id": doc_id, "d": direction}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, order_field: str) -> Dict:
+    """Decode a token produced by :func:`encode_cursor` for the same order field."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload["d"] not in ("next", "prev") or not payload["id"]:
+            raise ValueError
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+    if payload.get("f") != order_field:
+        raise InvalidCursor("Cursor does not belong to this listing")
+    payload["v"] = _decode_value(payload.get("v"))
+    return payload
+
+
+def paginate(query, order_field: str, descending: bool = True,
+             limit: int = 20, cursor: Optional[str] = None) -> Tuple[List, Optional[str], Optional[str]]:
+    """Run ``query`` one page at a time using ``start_after`` on (order_field, document id).
+
+    Returns ``(snapshots, next_cursor, prev_cursor)``. Snapshots are always in the
+    listing's natural order; ``next_cursor`` continues in that order and
+    ``prev_cursor`` walks back towards the first page. Each call reads at most
+    ``limit + 1`` documents.
+    """
+    state = decode_cursor(cursor, order_field) if cursor else None
+    backwards = bool(state) and state["d"] == "prev"
+
+    forward_dir = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+    reverse_dir = firestore.Query.ASCENDING if descending else firestore.Query.DESCENDING
+    direction = reverse_dir if backwards else forward_dir
+
+    q = query.order_by(order_field, direction=direction).order_by("__name__", direction=direction)
+    if state:
+        q = q.start_after({order_field: state["v"], "__name__": state["id"]})
+    snaps = list(q.limit(limit + 1).stream())
+
+    has_more = len(snaps) > limit
+    snaps = snaps[:limit]
+    if backwards:
+        snaps.reverse()
+
+    def cursor_for(snap, d):
+        return encode_cursor(order_field, snap.get(order_field), snap.id, d)
+
+    next_cursor = prev_cursor = None
+    if snaps:
+        # Walking backwards we came from a later page, so there is always a "next" one.
+        if has_more or backwards:
+            next_cursor = cursor_for(snaps[-1], "next")
+        if state and (has_more or not backwards):
+            prev_cursor = cursor_for(snaps[0], "prev")
+    return snaps, next_cursor, prev_cursor
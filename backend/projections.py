@@ -0,0 +1,38 @@
+# kalasetu/projections.py
+"""Named field projections for list and search endpoints.
+
+Every role manager declares ``PROJECTIONS``: ``card`` and ``detail`` map to a
+Firestore ``select()`` field mask, so only those fields leave the server;
+``full`` (None) reads the whole document. Whichever one is used,
+PRIVATE_FIELDS are stripped before a profile is returned.
+"""
+from typing import Dict, List, Optional
+
+DEFAULT = "card"
+PRIVATE_FIELDS = ("password",)
+
+
+class UnknownProjection(ValueError):
+    """Raised when a client asks for a projection the collection does not define."""
+
+
+def field_mask(projections: Dict[str, Optional[List[str]]], name: Optional[str] = None) -> Optional[List[str]]:
+    """The field mask for projection ``name`` (default: card). None means every field."""
+    name = name or DEFAULT
+    if name not in projections:
+        raise UnknownProjection(f"Unknown projection '{name}'; use one of: {', '.join(projections)}")
+    return projections[name]
+
+
+def select(query, mask: Optional[List[str]]):
+    """Apply ``mask`` to ``query`` (a no-op for the full projection)."""
+    return query if mask is None else query.select(mask)
+
+
+def public_profile(snap) -> Dict:
+    """A profile snapshot as a response dict: private fields dropped, ``uid`` added."""
+    data = snap.to_dict() or {}
+    for field in PRIVATE_FIELDS:
+        data.pop(field, None)
+    data["uid"] = snap.id
+    return data
@@ -1,36 +1,97 @@
 # kalasetu/scheme_manager.py
-from typing import List, Dict
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
 from firebase_config import db
 from firebase_admin import firestore
 from ai_helper import AIHelper
+from ai_clients import FALLBACK_SCHEMES
+import background
 
 
 class SchemeManager:
     """OOP manager for fetching government schemes relevant to artisans."""
 
+    # Profile fields the recommendations depend on; a change in any of them invalidates the cache.
+    PROFILE_FIELDS = ("location", "skills", "bio")
+    MAX_AGE = timedelta(seconds=float(os.environ.get("SCHEMES_CACHE_MAX_AGE_SECONDS", 24 * 3600)))
+
     def __init__(self, uid: str):
         self.uid = uid
         self.ai = AIHelper()
 
+    @property
+    def _cache_ref(self):
+        return db.collection("users").document(self.uid).collection("schemes_cache").document("latest")
+
+    @classmethod
+    def profile_fingerprint(cls, profile: Dict) -> str:
+        """Hash of the profile fields that feed the scheme prompt."""
+        relevant = {
+            "location": (profile.get("location") or "").strip().lower(),
+            "skills": sorted(str(s).strip().lower() for s in profile.get("skills") or []),
+            "bio": (profile.get("bio") or "").strip(),
+        }
+        return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
     def get_schemes(self) -> List[Dict]:
         """Fetch schemes based on artisan profile (skills, location, bio)."""
         doc = db.collection("artisans").document(self.uid).get()
         profile = doc.to_dict() if doc.exists else {}
         return self.ai.get_schemes(profile)
 
-    def refresh_schemes_cache(self) -> Dict:
+    def refresh_schemes_cache(self, profile: Optional[Dict] = None) -> Dict:
         """
         Fetch and save schemes into Firestore for offline availability.
         Useful for mobile clients.
+
+        If the AI call fails nothing is written: the previous entry (if any) is
+        kept and served, and the next stale read tries again.
         """
-        schemes = self.get_schemes()
-        db.collection("users").document(self.uid).collection("schemes_cache").document("latest").set({
+        if profile is None:
+            doc = db.collection("artisans").document(self.uid).get()
+            profile = doc.to_dict() if doc.exists else {}
+        schemes = self.ai.get_schemes(profile, fallback=False)
+        if schemes is None:
+            previous = self.get_cached_schemes()
+            # Nothing cached yet: show the generic list, but don't store it
+            schemes = previous or [dict(s) for s in FALLBACK_SCHEMES]
+            return {"message": "Schemes refresh failed", "count": len(schemes), "schemes": schemes}
+        self._cache_ref.set({
             "schemes": schemes,
+            "profile_hash": self.profile_fingerprint(profile),
             "updated_at": firestore.SERVER_TIMESTAMP
         })
-        return {"message": "Schemes refreshed", "count": len(schemes)}
+        return {"message": "Schemes refreshed", "count": len(schemes), "schemes": schemes}
+
+    def refresh_in_background(self, profile: Optional[Dict] = None) -> bool:
+        """Queue a cache refresh; concurrent requests for the same user collapse into one."""
+        return background.submit_once(f"schemes:{self.uid}", self.refresh_schemes_cache, profile)
 
     def get_cached_schemes(self) -> List[Dict]:
         """Get cached schemes if available (offline mode)."""
-        doc = db.collection("users").document(self.uid).collection("schemes_cache").document("latest").get()
+        doc = self._cache_ref.get()
         return doc.to_dict().get("schemes", []) if doc.exists else []
+
+    def get_schemes_swr(self, profile: Dict) -> Tuple[List[Dict], str]:
+        """Stale-while-revalidate lookup. Returns ``(schemes, cache_state)``.
+
+        A cached list is returned immediately ("hit", or "stale" when it is older
+        than MAX_AGE or was built from different location/skills/bio, in which case
+        a background refresh is queued). Only a user with no cache at all waits
+        for the LLM ("miss").
+        """
+        doc = self._cache_ref.get()
+        if not doc.exists:
+            return self.refresh_schemes_cache(profile)["schemes"], "miss"
+
+        cached = doc.to_dict()
+        updated_at = cached.get("updated_at")
+        too_old = not updated_at or datetime.now(timezone.utc) - updated_at > self.MAX_AGE
+        profile_changed = cached.get("profile_hash") != self.profile_fingerprint(profile)
+        if too_old or profile_changed:
+            self.refresh_in_background(profile)
+            return cached.get("schemes", []), "stale"
+        return cached.get("schemes", []), "hit"
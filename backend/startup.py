@@ -0,0 +1,104 @@
+# kalasetu/startup.py
+"""Cold-start helpers: SDK client warm-up and an import-time profile report.
+
+    python startup.py                 # what importing app.py costs, module by module
+    python startup.py --warm          # ...plus how long each lazy client takes to build
+"""
+import argparse
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _lazy_clients() -> List[Tuple[str, Callable]]:
+    import firebase_client
+    import ai_clients
+    return [
+        ("firestore", firebase_client.connect_db),
+        ("storage", firebase_client.get_bucket),
+        ("cohere", ai_clients.get_cohere_client),
+    ]
+
+
+def warm_up() -> Dict[str, float]:
+    """Build the lazily created SDK clients now instead of on the first request.
+
+    Returns how long each one took, in ms. Failures are logged, not raised, so a
+    missing credential only surfaces when the client is actually used.
+    """
+    timings = {}
+    for name, init in _lazy_clients():
+        start = time.perf_counter()
+        try:
+            init()
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Warm-up finished: {timings}")
+    return timings
+
+
+def import_profile(module: str = "app") -> List[Dict]:
+    """Import ``module`` in a fresh interpreter under ``-X importtime``.
+
+    Returns one row per imported module: ``{"module", "self_ms", "cumulative_ms", "depth"}``
+    in import order (depth 1 = imported directly by ``module``'s own imports).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            rows.append({
+                "module": match.group(4),
+                "self_ms": int(match.group(1)) / 1000,
+                "cumulative_ms": int(match.group(2)) / 1000,
+                "depth": len(match.group(3)) // 2,
+            })
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not _IMPORTTIME.match(line)]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(errors[-10:]))
+    return rows
+
+
+def format_report(rows: List[Dict], module: str = "app", top: int = 15) -> str:
+    total = next((r["cumulative_ms"] for r in rows if r["module"] == module), 0.0)
+    direct = sorted((r for r in rows if r["depth"] == 1), key=lambda r: r["cumulative_ms"], reverse=True)
+    heaviest = sorted(rows, key=lambda r: r["self_ms"], reverse=True)
+
+    lines = [f"import {module}: {total:.0f} ms", "", f"{'cumulative ms':>14}  direct import"]
+    lines += [f"{r['cumulative_ms']:>14.1f}  {r['module']}" for r in direct[:top]]
+    lines += ["", f"{'self ms':>14}  slowest modules"]
+    lines += [f"{r['self_ms']:>14.1f}  {r['module']}" for r in heaviest[:top]]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report what app start-up spends its time on.")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--warm", action="store_true", help="also time building the lazy SDK clients")
+    args = parser.parse_args(argv)
+
+    print(format_report(import_profile(args.module), args.module, args.top))
+    if args.warm:
+        print("")
+        for name, ms in warm_up().items():
+            print(f"{ms:>14.1f}  warm-up {name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
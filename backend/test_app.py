@@ -275,4 +275,1449 @@ def test_5_04_chat(client, mocker, desc, action, payload, expected_status):
         res = client.get('/chat/u1/get/chat1')
         
     print(f"   -> Status: {res.status_code}")
-    assert res.status_code == expected_status
\ No newline at end of file
+    assert res.status_code == expected_status
+
+# ==============================================================================
+# FEATURE 13: User Directory (shared author/name lookup)
+# Tests: 1. Artisans Read First, 2. Mentor Falls Through, 3. Cache Hit, 4. Unknown User, 5. Missing Name
+# ==============================================================================
+@pytest.mark.parametrize("desc, lookups, expected_get_all_calls, expected_reads, expected_name", [
+    ("Happy Path: Artisans Only, One Read Each", [["a1", "a2"]], 1, 2, "Asha"),
+    ("Mixed Roles: Mentor Looked Up Only After Artisans", [["a1", "m1"]], 2, 3, "Asha"),
+    ("State: Second Lookup Served From Cache", [["a1", "m1"], ["a1"]], 2, 3, "Asha"),
+    ("Edge: Unknown User", [["ghost"]], 3, 3, None),
+    ("Edge: Profile Without A Name", [["nameless"]], 1, 1, "Unknown"),
+])
+def test_13_user_directory(memory_db, desc, lookups, expected_get_all_calls, expected_reads, expected_name):
+    print(f"[13 User Directory] Running Test: {desc}")
+    from user_directory import UserDirectory
+    memory_db.collection("artisans").document("a1").set({"name": "Asha"})
+    memory_db.collection("artisans").document("a2").set({"name": "Arjun"})
+    memory_db.collection("artisans").document("nameless").set({"skills": []})
+    memory_db.collection("mentors").document("m1").set({"name": "Meera"})
+    memory_db.reset_stats()
+
+    results = {}
+    for uids in lookups:
+        results = UserDirectory.resolve(uids)
+    stats = memory_db.stats()
+    print(f"   -> get_all calls: {stats['rpcs']['get_all']}, reads: {stats['reads']}")
+
+    assert stats["rpcs"]["get_all"] == expected_get_all_calls
+    assert stats["reads"] == expected_reads
+    first = results.get(lookups[-1][0])
+    assert (first or {}).get("name") == expected_name
+    if "m1" in lookups[0]:
+        assert UserDirectory.get("m1")["role"] == "mentor"
+
+# ==============================================================================
+# FEATURE 14: Cursor Pagination (forum, channel, chat, pitches)
+# Tests: 1. Cursors In Headers, 2. Last Page, 3. Invalid Cursor
+# ==============================================================================
+@pytest.mark.parametrize("desc, mock_ret, expected_status, expected_next", [
+    ("Happy Path: Next Page Available", ("items", "next_tok", "prev_tok"), 200, "next_tok"),
+    ("State: Last Page Has No Next Cursor", ("items", None, "prev_tok"), 200, None),
+    ("Validation: Tampered Cursor", "invalid", 400, None),
+])
+def test_14_pagination(client, mocker, desc, mock_ret, expected_status, expected_next):
+    print(f"[14 Pagination] Running Test: {desc}")
+    from pagination import Page, InvalidCursor
+    if mock_ret == "invalid":
+        mocker.patch('app.InvestmentManager.list_open_pitches', side_effect=InvalidCursor("Invalid pagination cursor"))
+    else:
+        mocker.patch('app.InvestmentManager.list_open_pitches',
+                     return_value=Page([{"id": "p1"}], mock_ret[1], mock_ret[2]))
+
+    res = client.get('/marketplace/pitches?cursor=abc&limit=10')
+    print(f"   -> Status: {res.status_code}, Next: {res.headers.get('X-Next-Cursor')}")
+    assert res.status_code == expected_status
+    assert res.headers.get("X-Next-Cursor") == expected_next
+
+def test_14_cursor_round_trip():
+    print("[14 Pagination] Running Test: Cursor Round Trip")
+    from datetime import datetime, timezone
+    from pagination import encode_cursor, decode_cursor, InvalidCursor
+    ts = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    token = encode_cursor("timestamp", ts, "post_1", "next")
+    state = decode_cursor(token, "timestamp")
+    assert state["v"] == ts and state["id"] == "post_1" and state["d"] == "next"
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, "score")
+
+
+# ==============================================================================
+# FEATURE 15: Forum Voting (sharded counters)
+# Tests: 1. Upvote, 2. Post Not Found, 3. Missing UID, 4. Vote Skips The Shards
+# ==============================================================================
+@pytest.mark.parametrize("desc, payload, mock_ret, expected_status", [
+    ("Happy Path: Upvote Returns Live Score", {"uid": "u1", "vote_type": "up"}, {"vote": 1, "score": 5}, 200),
+    ("Error: Post Not Found", {"uid": "u1", "vote_type": "up"}, ValueError("Post not found"), 404),
+    ("Validation: Missing UID", {"vote_type": "down"}, None, 400),
+])
+def test_15_forum_voting(client, mocker, desc, payload, mock_ret, expected_status):
+    print(f"[15 Forum Voting] Running Test: {desc}")
+    if isinstance(mock_ret, Exception):
+        mocker.patch('app.CommunityManager.vote_on_post', side_effect=mock_ret)
+    else:
+        mocker.patch('app.CommunityManager.vote_on_post', return_value=mock_ret)
+
+    res = client.post('/forum/post/p1/vote', json=payload)
+    print(f"   -> Status: {res.status_code}")
+    assert res.status_code == expected_status
+    if expected_status == 200:
+        assert res.json["score"] == 5 and res.json["vote"] == 1
+
+def test_15_vote_reads_no_shards(client, memory_db, mocker):
+    print("[15 Forum Voting] Running Test: Vote Skips The Shards")
+    mocker.patch('forum_votes.background.schedule_once')  # the debounced fold runs separately
+    memory_db.collection("forum_posts").document("p1").set({"title": "T", "score": 4})
+    for shard in range(3):
+        memory_db.collection("forum_posts").document("p1").collection("score_shards").document(str(shard)).set({"count": 1})
+    memory_db.reset_stats()
+    res = client.post('/forum/post/p1/vote', json={"uid": "u1", "vote_type": "down"})
+    print(f"   -> Reads: {memory_db.stats()['reads']}")
+    assert res.json == {"message": "Vote cast successfully", "vote": -1, "score": 3}  # folded score + this vote
+    assert memory_db.stats()["reads"] == 2  # the post and the voter's own vote document
+
+
+# ==============================================================================
+# FEATURE 16: Forum Ranking (hot / rising)
+# Tests: 1. Newer Post Ranks Hotter, 2. Rising Decays With Age, 3. Sort Field Mapping,
+#        4. Legacy Posts Backfilled Once, 5. One Worker Holds The Maintenance Lease
+# ==============================================================================
+def test_16_hot_rank_prefers_newer_posts():
+    print("[16 Forum Ranking] Running Test: Newer Post Ranks Hotter")
+    from datetime import datetime, timedelta, timezone
+    from forum_ranking import ForumRanking
+    now = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    old_popular = ForumRanking.rank_key(10, 0, now - timedelta(days=3), now)
+    new_modest = ForumRanking.rank_key(10, 0, now - timedelta(hours=1), now)
+    assert new_modest["hot"] > old_popular["hot"]
+
+def test_16_rising_decays_with_age():
+    print("[16 Forum Ranking] Running Test: Rising Decays With Age")
+    from datetime import datetime, timedelta, timezone
+    from forum_ranking import ForumRanking
+    created = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    early = ForumRanking.rank_key(5, 1, created, created + timedelta(hours=1))
+    later = ForumRanking.rank_key(5, 1, created, created + timedelta(hours=10))
+    expired = ForumRanking.rank_key(5, 1, created, created + timedelta(days=5))
+    assert early["rising"] > later["rising"] > 0
+    assert expired["rising"] == 0
+    # hot does not depend on the current time, so it never needs a decay rewrite
+    assert early["hot"] == later["hot"]
+
+@pytest.mark.parametrize("sort_by, expected_field", [
+    ("hot", "rank_key.hot"), ("rising", "rank_key.rising"), ("bogus", "timestamp"),
+])
+def test_16_sort_field_mapping(sort_by, expected_field):
+    print(f"[16 Forum Ranking] Running Test: sort_by={sort_by}")
+    from forum_ranking import ForumRanking
+    assert ForumRanking.sort_field(sort_by) == expected_field
+
+def test_16_backfill_makes_legacy_posts_rankable(client, memory_db):
+    print("[16 Forum Ranking] Running Test: Legacy Posts Backfilled Once")
+    from datetime import datetime, timezone
+    from community_manager import CommunityManager
+    memory_db.collection("forum_posts").document("legacy").set(
+        {"author_uid": "a1", "title": "Old", "body": "b", "score": 3, "timestamp": datetime(2024, 5, 1, tzinfo=timezone.utc)})
+    assert client.get("/forum/posts?sort_by=hot").json == []
+    assert CommunityManager.run_feed_maintenance()["backfilled"] == 1
+    assert [p["id"] for p in client.get("/forum/posts?sort_by=hot").json] == ["legacy"]
+    assert CommunityManager.run_feed_maintenance()["backfilled"] == 0  # marker: the full scan runs once
+
+def test_16_maintenance_lease_elects_one_worker(memory_db):
+    print("[16 Forum Ranking] Running Test: One Worker Holds The Lease")
+    from datetime import datetime, timedelta, timezone
+    from community_manager import CommunityManager
+    assert CommunityManager.acquire_lease("forum", "worker-1", 60)
+    assert not CommunityManager.acquire_lease("forum", "worker-2", 60)
+    assert CommunityManager.acquire_lease("forum", "worker-1", 60)  # the holder renews
+    memory_db.collection("maintenance").document("forum").update(
+        {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)})
+    assert CommunityManager.acquire_lease("forum", "worker-2", 60)  # a dead holder's lease is taken over
+
+
+# ==============================================================================
+# FEATURE 17: Product-Idea Cache (2.01 follow-up)
+# Tests: 1. Miss Then Memory Hit, 2. Refresh Bypass, 3. Key Normalisation
+# ==============================================================================
+@pytest.mark.parametrize("desc, refresh_second, expected_computes", [
+    ("Happy Path: Second Call Served From Cache", False, 1),
+    ("State: refresh=true Bypasses Cache", True, 2),
+])
+def test_17_idea_cache(mocker, desc, refresh_second, expected_computes):
+    print(f"[17 Idea Cache] Running Test: {desc}")
+    from ai_cache import TwoLevelCache
+    mock_db = mocker.patch('ai_cache.db')
+    mock_db.collection.return_value.document.return_value.get.return_value.exists = False
+
+    cache = TwoLevelCache("test_ideas", ttl_seconds=60)
+    compute = mocker.Mock(return_value=["Idea A"])
+    cache.get_or_compute("k1", compute)
+    value, cached = cache.get_or_compute("k1", compute, refresh=refresh_second)
+
+    print(f"   -> Stats: {cache.stats()}")
+    assert value == ["Idea A"]
+    assert cached is (not refresh_second)
+    assert compute.call_count == expected_computes
+
+def test_17_idea_cache_key_normalisation():
+    print("[17 Idea Cache] Running Test: Key Normalisation")
+    from ai_clients import ideas_cache_key
+    assert ideas_cache_key(["Weaving", " pottery"], ["Clay"]) == ideas_cache_key(["pottery", "weaving"], ["clay "])
+    assert ideas_cache_key(["weaving"], ["clay"]) != ideas_cache_key(["weaving"], ["clay"], model="other-model")
+
+def test_17_ideas_route_refresh_flag(client, mocker):
+    print("[17 Idea Cache] Running Test: Route Passes refresh Flag")
+    mock_artisan = mocker.Mock()
+    mock_artisan.generate_business_idea.return_value = ["Idea A"]
+    mocker.patch('app.ArtisanManager.hydrate_entity', return_value=mock_artisan)
+    res = client.get('/artisan/u1/ideas?refresh=true')
+    assert res.status_code == 200
+    mock_artisan.generate_business_idea.assert_called_once_with(refresh=True)
+
+
+# ==============================================================================
+# FEATURE 18: Scheme Recommendations (stale-while-revalidate)
+# Tests: 1. Fresh Cache Hit, 2. Profile Changed -> Stale + Background Refresh, 3. Cold Miss
+# ==============================================================================
+@pytest.mark.parametrize("desc, cached_profile, age_hours, cache_exists, expected_state", [
+    ("Happy Path: Fresh Cache Hit", {"location": "Jaipur", "skills": ["weaving"], "bio": "b"}, 1, True, "hit"),
+    ("State: Profile Changed", {"location": "Delhi", "skills": ["weaving"], "bio": "b"}, 1, True, "stale"),
+    ("State: Cache Expired", {"location": "Jaipur", "skills": ["weaving"], "bio": "b"}, 48, True, "stale"),
+    ("Edge: No Cache Yet", None, 0, False, "miss"),
+])
+def test_18_schemes_swr(mocker, desc, cached_profile, age_hours, cache_exists, expected_state):
+    print(f"[18 Schemes SWR] Running Test: {desc}")
+    from datetime import datetime, timedelta, timezone
+    from schemeManager import SchemeManager
+
+    profile = {"location": "Jaipur", "skills": ["weaving"], "bio": "b"}
+    cached_doc = mocker.Mock()
+    cached_doc.exists = cache_exists
+    if cache_exists:
+        cached_doc.to_dict.return_value = {
+            "schemes": [{"name": "Cached"}],
+            "profile_hash": SchemeManager.profile_fingerprint(cached_profile),
+            "updated_at": datetime.now(timezone.utc) - timedelta(hours=age_hours),
+        }
+    mock_db = mocker.patch('schemeManager.db')
+    mock_db.collection.return_value.document.return_value.collection.return_value \
+        .document.return_value.get.return_value = cached_doc
+    bg = mocker.patch.object(SchemeManager, 'refresh_in_background')
+    sync = mocker.patch.object(SchemeManager, 'refresh_schemes_cache', return_value={"schemes": [{"name": "Fresh"}]})
+
+    schemes, state = SchemeManager("u1").get_schemes_swr(profile)
+    print(f"   -> Cache state: {state}")
+    assert state == expected_state
+    assert bg.called == (expected_state == "stale")
+    assert sync.called == (expected_state == "miss")
+    assert schemes[0]["name"] == ("Fresh" if expected_state == "miss" else "Cached")
+
+
+@pytest.mark.parametrize("desc, previous", [
+    ("Failure: Previous Entry Kept", [{"name": "Cached"}]),
+    ("Failure: No Entry, Fallback Not Stored", None),
+])
+def test_18_schemes_refresh_failure(memory_db, mocker, desc, previous):
+    print(f"[18 Schemes SWR] Running Test: {desc}")
+    from schemeManager import SchemeManager
+    mocker.patch('ai_helper.get_government_schemes', return_value=None)  # provider or JSON failure
+    manager = SchemeManager("u1")
+    if previous:
+        manager._cache_ref.set({"schemes": previous, "profile_hash": "old"})
+    profile = {"location": "Jaipur", "skills": ["weaving", 7], "bio": "b"}  # non-string skills hash too
+
+    result = manager.refresh_schemes_cache(profile)
+    cached = manager._cache_ref.get()
+    if previous:
+        assert result["schemes"] == previous and cached.to_dict()["profile_hash"] == "old"
+    else:
+        assert result["schemes"][0]["name"].startswith("Pradhan Mantri") and not cached.exists
+
+
+# ==============================================================================
+# FEATURE 19: Image Generation Jobs (2.02)
+# Tests: 1. Job Queued, 2. Per-User Limit, 3. Unknown Artisan, 4. Upload Failure Fails The Job
+# ==============================================================================
+@pytest.mark.parametrize("desc, profile, submit_ret, expected_status", [
+    ("Happy Path: Job Queued", {"name": "A"}, {"job_id": "j1", "status": "queued"}, 202),
+    ("Error: Too Many Jobs In Flight", {"name": "A"}, "limit", 429),
+    ("Error: Artisan Not Found", None, None, 404),
+])
+def test_19_image_jobs(client, mocker, desc, profile, submit_ret, expected_status):
+    print(f"[19 Image Jobs] Running Test: {desc}")
+    from job_manager import JobLimitExceeded
+    mocker.patch('app.ArtisanManager.get_profile', return_value=profile)
+    if submit_ret == "limit":
+        mocker.patch('app.JobManager.submit_image_job', side_effect=JobLimitExceeded("busy"))
+    else:
+        mocker.patch('app.JobManager.submit_image_job', return_value=submit_ret)
+
+    res = client.post('/artisan/u1/image', json={"prompt": "blue vase"})
+    print(f"   -> Status: {res.status_code}")
+    assert res.status_code == expected_status
+    if expected_status == 202:
+        assert res.json["status_url"] == "/jobs/j1"
+
+@pytest.mark.parametrize("desc, job, expected_status", [
+    ("Happy Path: Finished Job", {"job_id": "j1", "status": "succeeded", "result": {"url": "http://x"}}, 200),
+    ("Error: Unknown Job", None, 404),
+])
+def test_19_job_status(client, mocker, desc, job, expected_status):
+    print(f"[19 Image Jobs] Running Test: {desc}")
+    mocker.patch('app.JobManager.get_job', return_value=job)
+    res = client.get('/jobs/j1')
+    assert res.status_code == expected_status
+
+@pytest.mark.parametrize("desc, result, expected_status", [
+    ("Happy Path: Uploaded", {"url": "http://x/img.webp"}, "succeeded"),
+    ("Error: Upload Failed", {"upload_error": "403 Forbidden", "mime": "image/png"}, "failed"),
+    ("Error: No URL", {"mime": "image/png"}, "failed"),
+    ("Error: Generation Failed", {"error": "model unavailable"}, "failed"),
+])
+def test_19_job_outcome(memory_db, mocker, desc, result, expected_status):
+    print(f"[19 Image Jobs] Running Test: {desc}")
+    from job_manager import JobManager
+    mocker.patch('job_manager.AIHelper').return_value.generate_image.return_value = result
+    job_ref = memory_db.collection("jobs").document("j1")
+    job_ref.set({"kind": "image", "uid": "u1", "status": "queued"})
+    with JobManager._lock:
+        JobManager._in_flight += 1  # as submit_image_job does; the run releases it
+    JobManager._run_image_job(job_ref, "blue vase")
+
+    job = JobManager.get_job("j1")
+    print(f"   -> {job['status']}: {job['error']}")
+    assert job["status"] == expected_status
+    assert (job["error"] is None) == (expected_status == "succeeded")
+
+
+# ==============================================================================
+# FEATURE 20: AI HTTP Transport (pooled + retrying)
+# Tests: 1. Retries 503 Then Succeeds, 2. Gives Up After Max Retries
+# ==============================================================================
+@pytest.mark.parametrize("desc, failures, max_retries, expected_status", [
+    ("Happy Path: Model Loading Then Ready", 2, 3, 200),
+    ("Error: Still Loading After Retries", 5, 1, 503),
+])
+def test_20_http_transport(desc, failures, max_retries, expected_status):
+    print(f"[20 HTTP Transport] Running Test: {desc}")
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from http_transport import HTTPTransport
+
+    calls = {"n": 0}
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            calls["n"] += 1
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(503 if calls["n"] <= failures else 200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        transport = HTTPTransport("test", max_retries=max_retries, backoff_factor=0, backoff_jitter=0)
+        resp = transport.post(f"http://127.0.0.1:{server.server_port}/infer", json={"inputs": "x"})
+    finally:
+        server.shutdown()
+
+    print(f"   -> Status: {resp.status_code}, Stats: {transport.stats()}")
+    assert resp.status_code == expected_status
+    assert transport.stats()["calls"] == 1
+    assert transport.stats()["retries"] == min(failures, max_retries)
+
+
+# ==============================================================================
+# FEATURE 21: Image Derivative Pipeline
+# Tests: 1. New Image Stores All Variants, 2. Identical Image Is Not Re-uploaded
+# ==============================================================================
+@pytest.mark.parametrize("desc, already_stored, expected_uploads", [
+    ("Happy Path: New Image Gets Six Variants", False, 6),
+    ("Dedupe: Same Hash Already In Storage", True, 0),
+])
+def test_21_image_pipeline(mocker, desc, already_stored, expected_uploads):
+    print(f"[21 Image Pipeline] Running Test: {desc}")
+    import io
+    from PIL import Image
+    import image_pipeline
+
+    buf = io.BytesIO()
+    Image.new("RGB", (1200, 800), (200, 120, 40)).save(buf, "PNG")
+    png = buf.getvalue()
+
+    mocker.patch.object(image_pipeline, "WORKERS", 0)
+    mocker.patch("ai_clients.storage_blob_url",
+                 side_effect=lambda path, check=True: f"https://cdn/{path}" if already_stored or not check else None)
+    mock_upload = mocker.patch("ai_clients.upload_image_to_storage",
+                               side_effect=lambda path, data, content_type, cache_control=None: f"https://cdn/{path}")
+
+    result = image_pipeline.process_and_upload(png)
+
+    digest = image_pipeline.content_hash(png)
+    print(f"   -> Uploads: {mock_upload.call_count}, Srcset: {result['srcset']['webp']}")
+    assert mock_upload.call_count == expected_uploads
+    assert result["deduplicated"] is already_stored
+    assert result["url"] == f"https://cdn/mockups/{digest}/full.webp"
+    assert result["variants"]["thumb"]["width"] == 320
+    assert result["variants"]["medium"]["height"] == 640
+    assert f"https://cdn/mockups/{digest}/thumb.jpeg 320w" in result["srcset"]["jpeg"]
+    if not already_stored:
+        # The marker variant goes last so a half-finished upload is never treated as stored.
+        assert mock_upload.call_args_list[-1].args[0].endswith("full.webp")
+        thumb = next(c.args[1] for c in mock_upload.call_args_list if c.args[0].endswith("thumb.webp"))
+        assert Image.open(io.BytesIO(thumb)).size == (320, 213)
+
+
+def test_21_render_worker_skips_app(mocker):
+    print("[21 Image Pipeline] Running Test: Spawned Render Worker Does Not Build The App")
+    import runpy
+    import app as app_module
+    mock_maintenance = mocker.patch('community_manager.CommunityManager.start_feed_maintenance')
+    # What a spawn worker does when the server was started with ``python app.py``
+    worker_main = runpy.run_path(app_module.__file__, run_name="__mp_main__")
+    assert "create_app" in worker_main and "app" not in worker_main
+    mock_maintenance.assert_not_called()
+
+
+# ==============================================================================
+# FEATURE 22: Streaming Audio Messages
+# Tests: 1. Raw Body Streamed + Transcription Queued, 2. Duration Too Long,
+#        3. Declared Size Too Large, 4. Stream Overruns Limit Mid-Upload
+# ==============================================================================
+@pytest.mark.parametrize("desc, body_size, duration, multipart, expected_status", [
+    ("Happy Path: Raw Audio Body", 40 * 1024, "12.5", False, 200),
+    ("Validation: Duration Over Limit", 4 * 1024, "9000", False, 400),
+    ("Limit: Content-Length Over Limit", 200 * 1024, "10", True, 413),
+    ("Limit: Stream Grows Past Limit", 60 * 1024, "10", True, 413),
+])
+def test_22_audio_messages(client, mocker, desc, body_size, duration, multipart, expected_status):
+    print(f"[22 Audio Messages] Running Test: {desc}")
+    import io
+    from chat_manager import ChatManager
+
+    mocker.patch.object(ChatManager, "MAX_AUDIO_BYTES", 50 * 1024)
+    mocker.patch.object(ChatManager, "_verify_recipient_exists", return_value=True)
+    mock_send = mocker.patch.object(ChatManager, "send_message",
+                                    return_value={"message_id": "m1", "chat_id": "dm_a_b"})
+    mock_submit = mocker.patch("chat_manager.background.submit_once")
+    reads = []
+    def fake_upload(path, stream, content_type, size=None):
+        while True:
+            chunk = stream.read(8 * 1024)
+            if not chunk:
+                break
+            reads.append(len(chunk))
+        return f"https://cdn/{path}"
+    mocker.patch("chat_manager.upload_stream_to_storage", side_effect=fake_upload)
+
+    payload = b"\x00" * body_size
+    if multipart:
+        res = client.post("/chat/a/send_audio", content_type="multipart/form-data", data={
+            "to_id": "b", "duration": duration, "audio_data": (io.BytesIO(payload), "clip.webm", "audio/webm")})
+    else:
+        res = client.post(f"/chat/a/send_audio?to_id=b&duration={duration}", data=payload,
+                          content_type="audio/webm")
+
+    print(f"   -> Status: {res.status_code}, Chunks read: {len(reads)}")
+    assert res.status_code == expected_status
+    if expected_status == 200:
+        assert max(reads) <= 8 * 1024 and sum(reads) == body_size
+        assert res.json["transcription_status"] == "pending"
+        assert res.json["audio_url"].startswith("https://cdn/chats/dm_a_b/") and res.json["audio_url"].endswith(".webm")
+        assert mock_send.call_args.kwargs["extra"]["transcription_status"] == "pending"
+        mock_submit.assert_called_once()
+    else:
+        mock_send.assert_not_called()
+        mock_submit.assert_not_called()
+
+
+def test_22_transcription_streams_audio(memory_db, mocker):
+    print("[22 Audio Messages] Running Test: Transcription Gets A File, Not The Whole Recording")
+    from chat_manager import ChatManager
+    msg_ref = memory_db.collection("chats").document("dm_a_b").collection("messages").document("m1")
+    msg_ref.set({"content": "(Audio message)", "transcription_status": "pending"})
+    mocker.patch("chat_manager.download_blob_to_file", side_effect=lambda path, f: f.write(b"\x00" * 1024) or True)
+    stt = mocker.patch("ai_helper.speech_to_text", return_value="Namaste")
+
+    ChatManager.transcribe_audio_message("dm_a_b", "m1", "chats/dm_a_b/clip.webm")
+
+    audio = stt.call_args.args[0]
+    assert not isinstance(audio, bytes) and hasattr(audio, "read")
+    assert msg_ref.get().to_dict()["content"] == "Namaste"
+
+
+# ==============================================================================
+# FEATURE 23: Application Factory + Lazy Start-up
+# Tests: 1. Building The App Starts Nothing, 2. Serving Process Starts Maintenance, 3. Warm-up Requested,
+#        4. Importing app Leaves No Threads Behind
+# ==============================================================================
+@pytest.mark.parametrize("desc, serve, warm_up, expect_maintenance, expect_warm_up", [
+    ("Happy Path: Building The App Starts Nothing", False, None, False, False),
+    ("Serving: Feed Maintenance Started", True, False, True, False),
+    ("Option: Warm-up Hook Queued", True, True, True, True),
+])
+def test_23_create_app(mocker, desc, serve, warm_up, expect_maintenance, expect_warm_up):
+    print(f"[23 App Factory] Running Test: {desc}")
+    import app as app_module
+    mock_maintenance = mocker.patch('app.CommunityManager.start_feed_maintenance')
+    mock_submit = mocker.patch('app.background.submit_once')
+
+    new_app = app_module.create_app({"TESTING": True})
+    if serve:
+        app_module.start_background_work(warm_up=warm_up)
+    res = new_app.test_client().get('/health')
+
+    print(f"   -> Status: {res.status_code}, Maintenance: {mock_maintenance.called}, Warm-up: {mock_submit.called}")
+    assert res.status_code == 200
+    assert new_app is not app_module.app
+    assert mock_maintenance.called is expect_maintenance
+    assert mock_submit.called is expect_warm_up
+    if expect_warm_up:
+        assert mock_submit.call_args.args[1] is app_module.startup.warm_up
+
+def test_23_import_has_no_side_effects():
+    print("[23 App Factory] Running Test: Importing app Starts No Threads")
+    import os
+    import subprocess
+    import sys
+    proc = subprocess.run(
+        [sys.executable, "-c", "import app, threading; print(threading.active_count())"],
+        capture_output=True, text=True, timeout=60, cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ, FIRESTORE_BACKEND="memory")
+    )
+    print(f"   -> Threads after import: {proc.stdout.strip()}")
+    assert proc.returncode == 0 and proc.stdout.strip() == "1"
+
+def test_23_warm_up_reports_each_client(mocker):
+    print("[23 App Factory] Running Test: Warm-up Times Each Lazy Client")
+    import startup
+    built = []
+    mocker.patch('startup._lazy_clients', return_value=[
+        ("firestore", lambda: built.append("firestore")),
+        ("cohere", mocker.Mock(side_effect=RuntimeError("no key"))),
+    ])
+    timings = startup.warm_up()
+    print(f"   -> Timings: {timings}")
+    assert built == ["firestore"]
+    assert set(timings) == {"firestore", "cohere"}
+
+
+# ==============================================================================
+# FEATURE 24: Firebase Client Registry
+# Tests: 1. Clients Reused Within A Process, 2. Forked Worker Builds Its Own,
+#        3. Forked Worker Gets Its Own Background Pool, 4. Tuned Channel With SDK Fallback
+# ==============================================================================
+@pytest.mark.parametrize("desc, forked, expected_builds", [
+    ("Happy Path: Handles Reused", False, 1),
+    ("Fork: Child Process Rebuilds", True, 2),
+])
+def test_24_client_registry(mocker, monkeypatch, tmp_path, desc, forked, expected_builds):
+    print(f"[24 Client Registry] Running Test: {desc}")
+    import os
+    import firebase_client
+    sa = tmp_path / "sa.json"
+    sa.write_text("{}")
+    monkeypatch.setenv("FIREBASE_SERVICE_ACCOUNT", str(sa))
+    mocker.patch('firebase_client.credentials.Certificate')
+    mock_init = mocker.patch('firebase_client.firebase_admin.initialize_app',
+                             side_effect=lambda cred, options, name: mocker.Mock(project_id="demo", name=name))
+    mock_client = mocker.patch('firebase_client._TunedFirestoreClient', side_effect=lambda **kw: mocker.Mock())
+    mock_bucket = mocker.patch('firebase_client.storage.bucket', side_effect=lambda **kw: mocker.Mock())
+
+    firebase_client._reset_after_fork()
+    try:
+        first_db, first_bucket = firebase_client.get_db(), firebase_client.get_bucket()
+        if forked:
+            mocker.patch('firebase_client.os.getpid', return_value=os.getpid() + 1)
+        second_db, second_bucket = firebase_client.get_db(), firebase_client.get_bucket()
+        firebase_client.db.collection("artisans")
+    finally:
+        firebase_client._reset_after_fork()
+
+    print(f"   -> Apps: {mock_init.call_count}, Clients: {mock_client.call_count}, Buckets: {mock_bucket.call_count}")
+    assert mock_init.call_count == expected_builds
+    assert mock_client.call_count == expected_builds
+    assert mock_bucket.call_count == expected_builds
+    assert (second_db is first_db) is (not forked)
+    assert (second_bucket is first_bucket) is (not forked)
+
+def test_24_background_after_fork():
+    print("[24 Client Registry] Running Test: Forked Worker Gets Its Own Background Pool")
+    import os
+    import threading
+    import background
+    background.run_periodically("fork-probe", 3600, lambda: None)
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # child: the parent's loop must not block this worker's own
+        try:
+            ran = threading.Event()
+            ok = background.run_periodically("fork-probe", 3600, lambda: None) \
+                and background.submit_once("fork-probe-task", ran.set) and ran.wait(5)
+            os.write(write_end, b"1" if ok else b"0")
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    result = os.read(read_end, 1)
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    print(f"   -> Child scheduled its own work: {result == b'1'}")
+    assert result == b"1"
+    assert background.run_periodically("fork-probe", 3600, lambda: None) is False  # still running in the parent
+
+@pytest.mark.parametrize("desc, missing_attr, expect_tuned", [
+    ("Happy Path: Channel Built With Keepalive Options", None, True),
+    ("Fallback: SDK Internals Moved", "_renamed_by_upgrade", False),
+])
+def test_24_tuned_channel(mocker, desc, missing_attr, expect_tuned):
+    print(f"[24 Client Registry] Running Test: {desc}")
+    import firebase_client
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud.firestore_v1.services.firestore.transports import grpc as firestore_grpc
+    create_channel = mocker.spy(firestore_grpc.FirestoreGrpcTransport, "create_channel")
+    client = firebase_client._TunedFirestoreClient(project="demo", credentials=AnonymousCredentials())
+    if missing_attr:
+        mocker.patch.object(firebase_client, "_SDK_PRIVATE_ATTRS", firebase_client._SDK_PRIVATE_ATTRS + (missing_attr,))
+
+    assert client._firestore_api is not None
+    options = [c.kwargs.get("options") for c in create_channel.call_args_list]
+    print(f"   -> Channels built: {len(options)}, tuned: {firebase_client.CHANNEL_OPTIONS in options}")
+    assert (firebase_client.CHANNEL_OPTIONS in options) is expect_tuned
+
+
+# ==============================================================================
+# FEATURE 25: In-Memory Firestore Backend
+# Tests: 1. Query Semantics, 2. Field Transforms, 3. Transaction Retry On Contention,
+#        4. Routes End-To-End Without Mocks
+# ==============================================================================
+@pytest.fixture
+def memory_db():
+    import firebase_client
+    from memory_firestore import MemoryFirestore
+    from user_directory import UserDirectory
+    from community_manager import CommunityManager
+    from chat_manager import ChatManager
+    previous = firebase_client._db
+    store = MemoryFirestore()
+    firebase_client.set_db(store)
+    UserDirectory.clear()
+    CommunityManager.clear_directory_cache()
+    ChatManager.clear_known_chats()
+    yield store
+    UserDirectory.clear()
+    CommunityManager.clear_directory_cache()
+    ChatManager.clear_known_chats()
+    firebase_client.set_db(previous)
+
+@pytest.mark.parametrize("desc, build, expected_ids", [
+    ("Filter: array_contains + limit", lambda c: c.where("skills", "array_contains", "pottery").limit(2), ["a1", "a2"]),
+    ("Filter: in on __name__", lambda c: c.where("__name__", "in", ["a4", "a2"]), ["a2", "a4"]),
+    ("Order: Nested Field Descending", lambda c: c.order_by("rank.hot", direction="DESCENDING"), ["a3", "a2", "a1"]),
+    ("Cursor: start_after Dict", lambda c: c.order_by("age").start_after({"age": 30, "__name__": "a2"}), ["a3", "a4"]),
+    ("Range: Missing Fields Excluded", lambda c: c.where("age", ">=", 30), ["a2", "a3", "a4"]),
+])
+def test_25_memory_queries(memory_db, desc, build, expected_ids):
+    print(f"[25 Memory Firestore] Running Test: {desc}")
+    artisans = memory_db.collection("artisans")
+    artisans.document("a1").set({"age": 20, "skills": ["pottery"], "rank": {"hot": 1.0}})
+    artisans.document("a2").set({"age": 30, "skills": ["pottery", "weaving"], "rank": {"hot": 2.5}})
+    artisans.document("a3").set({"age": 30, "skills": ["pottery"], "rank": {"hot": 9.0}})
+    artisans.document("a4").set({"age": 41, "skills": []})
+    memory_db.reset_stats()
+
+    ids = [snap.id for snap in build(artisans).stream()]
+    print(f"   -> Result: {ids}, Stats: {memory_db.stats()['rpcs']}")
+    assert ids == expected_ids
+    assert memory_db.stats()["rpcs"]["query"] == 1
+
+def test_25_memory_transforms(memory_db):
+    print("[25 Memory Firestore] Running Test: Increment / ArrayUnion / Dotted Update / Merge")
+    from firebase_admin import firestore
+    ref = memory_db.collection("pitches").document("p1")
+    ref.set({"current_funding": 100, "tags": ["a"], "meta": {"views": 1, "owner": "x"}})
+    ref.update({"current_funding": firestore.Increment(50), "tags": firestore.ArrayUnion(["a", "b"]),
+                "meta.views": firestore.Increment(1), "updated_at": firestore.SERVER_TIMESTAMP})
+    ref.set({"meta": {"owner": "y"}, "tags": firestore.ArrayRemove(["a"])}, merge=True)
+
+    data = ref.get().to_dict()
+    print(f"   -> Data: {data}")
+    assert data["current_funding"] == 150
+    assert data["tags"] == ["b"]
+    assert data["meta"] == {"views": 2, "owner": "y"}
+    assert data["updated_at"].tzinfo is not None
+    snap = ref.get(field_paths=["meta.owner"])
+    assert snap.to_dict() == {"meta": {"owner": "y"}}
+    with pytest.raises(Exception):
+        memory_db.collection("pitches").document("missing").update({"x": 1})
+
+def test_25_memory_transaction_retry(memory_db):
+    print("[25 Memory Firestore] Running Test: Stale Read Aborts And Retries")
+    from firebase_admin import firestore
+    ref = memory_db.collection("counters").document("c1")
+    ref.set({"n": 0})
+    attempts = []
+
+    @firestore.transactional
+    def bump(transaction):
+        snap = ref.get(transaction=transaction)
+        attempts.append(snap.get("n"))
+        if len(attempts) == 1:
+            ref.update({"n": 10})  # a concurrent writer sneaks in before our commit
+        transaction.update(ref, {"n": snap.get("n") + 1})
+
+    bump(memory_db.transaction())
+    print(f"   -> Attempts saw: {attempts}, Stats: {memory_db.stats()}")
+    assert attempts == [0, 10]
+    assert ref.get().to_dict()["n"] == 11
+    assert memory_db.stats()["aborted"] == 1
+    assert memory_db.stats()["transaction_retries"] == 1
+
+@pytest.mark.parametrize("desc, amount, expected_status, expected_funding", [
+    ("Happy Path: Investment Recorded", 400, 200, 400),
+    ("Validation: Exceeds Goal", 5000, 500, 0),
+])
+def test_25_memory_end_to_end(client, memory_db, desc, amount, expected_status, expected_funding):
+    print(f"[25 Memory Firestore] Running Test: {desc}")
+    client.post("/signup/artisan", json={"uid": "a1", "name": "Asha", "skills": ["pottery"]})
+    memory_db.collection("businesses").document("b1").set({"owner_uids": ["a1"], "status": "verified"})
+    res = client.post("/marketplace/pitch", json={"uid": "a1", "business_id": "b1", "funding_goal": 1000,
+                                                  "pitch_title": "Kiln", "pitch_details": "New kiln"})
+    pitch_id = res.json["pitch_id"]
+
+    res = client.post(f"/marketplace/pitch/{pitch_id}/fund", json={"uid": "inv1", "amount": amount})
+    pitch = memory_db.collection("pitches").document(pitch_id).get().to_dict()
+    print(f"   -> Status: {res.status_code}, Funding: {pitch['current_funding']}")
+    assert res.status_code == expected_status
+    assert pitch["current_funding"] == expected_funding
+    assert [p["id"] for p in client.get("/marketplace/pitches").json] == [pitch_id]
+
+# ==============================================================================
+# FEATURE 26: Route Benchmark Suite
+# Tests: 1. Fixed-Cost Listing Within Budget, 2. Paged Channel Within Budget,
+#        3. Batched Connected-Mentor Lookup Within Budget, 4. Over-Budget Route Flagged
+# ==============================================================================
+BENCH_SCALE = dict(artisans=6, mentors=4, investors=3, communities=2, posts=12,
+                   channel_posts=8, messages=16, businesses=2)
+
+@pytest.mark.parametrize("desc, route_name, expect_over_budget", [
+    ("Happy Path: Forum Feed Within Budget", "forum_posts_new", False),
+    ("Happy Path: Channel Posts Within Budget", "channel_posts", False),
+    ("Happy Path: Connected Mentors Batched", "connected_mentors", False),
+    ("Regression: Budget Tightened Below Cost", "tight_budget", True),
+])
+def test_26_benchmark_budgets(client, memory_db, desc, route_name, expect_over_budget):
+    print(f"[26 Benchmark] Running Test: {desc}")
+    import benchmark
+    routes = [r for r in benchmark.ROUTES if r.name == route_name]
+    if route_name == "tight_budget":
+        routes = [benchmark.Route("tight_budget", "GET", lambda f, i: f"/artisan/{f.pick(f.artisans, i)}/mentors", 1)]
+    report = benchmark.run(BENCH_SCALE, iterations=3, routes=routes, flask_app=app)
+
+    result = report["routes"][0]
+    print(f"   -> {benchmark.format_report(report).splitlines()[-1]}")
+    assert result["statuses"] == [200]
+    assert result["bytes_avg"] > 0 and result["reads_avg"] >= 1
+    assert result["p95_ms"] >= result["p50_ms"] > 0
+    assert result["over_budget"] == expect_over_budget
+    assert report["over_budget"] == ([route_name] if expect_over_budget else [])
+
+# ==============================================================================
+# FEATURE 27: Per-Request Firestore I/O Accounting
+# Tests: 1. Server-Timing Matches Backend Counters, 2. Transaction Retry Counted,
+#        3. Admin Aggregates By Route And Uid
+# ==============================================================================
+def _server_timing_counts(header):
+    import re
+    rpcs, reads, writes = re.search(r'desc="(\d+) rpcs, (\d+) reads, (\d+) writes"', header).groups()
+    return {"rpc_total": int(rpcs), "reads": int(reads), "writes": int(writes)}
+
+@pytest.mark.parametrize("desc, method, path, body, expected_writes", [
+    ("Read: Single Profile Get", "GET", "/profile/artisan/a1", None, 0),
+    ("Listing: Feed Query + Author Lookup", "GET", "/forum/posts?uid=a1", None, 0),
+    ("Write: Create Forum Post", "POST", "/forum/post", {"uid": "a1", "title": "Hi", "content": "Body"}, 1),
+    ("Transaction: Vote On Post", "POST", "/forum/post/{post}/vote", {"uid": "a1", "vote_type": "up"}, 2),
+])
+def test_27_server_timing(client, memory_db, desc, method, path, body, expected_writes):
+    print(f"[27 Firestore I/O] Running Test: {desc}")
+    client.post("/signup/artisan", json={"uid": "a1", "name": "Asha"})
+    post_id = client.post("/forum/post", json={"uid": "a1", "title": "First", "content": "Post"}).json["post_id"]
+    memory_db.reset_stats()
+
+    res = client.open(path.format(post=post_id), method=method, json=body)
+    header = res.headers.get("Server-Timing", "")
+    counts, backend = _server_timing_counts(header), memory_db.stats()
+    print(f"   -> Server-Timing: {header}")
+    assert res.status_code in (200, 201)
+    assert counts == {"rpc_total": backend["rpc_total"], "reads": backend["reads"], "writes": backend["writes"]}
+    assert counts["writes"] == expected_writes
+    assert "app;dur=" in header
+
+def test_27_transaction_retry_counted(memory_db):
+    print("[27 Firestore I/O] Running Test: Transaction Retry Attributed To Request")
+    import firestore_metrics
+    from firebase_admin import firestore
+    from firebase_client import db
+    ref = db.collection("counters").document("c1")
+    ref.set({"n": 0})
+    attempts = []
+
+    @firestore.transactional
+    def bump(transaction):
+        snap = ref.get(transaction=transaction)
+        attempts.append(snap.get("n"))
+        if len(attempts) == 1:
+            memory_db.collection("counters").document("c1").update({"n": 5})  # concurrent writer
+        transaction.update(ref, {"n": snap.get("n") + 1})
+
+    io = firestore_metrics.RequestIO()
+    token = firestore_metrics._current.set(io)
+    try:
+        bump(db.transaction())
+    finally:
+        firestore_metrics._current.reset(token)
+    print(f"   -> {io.as_dict()}")
+    assert io.transaction_retries == 1
+    assert io.writes == 1 and io.reads == 2
+    assert memory_db.collection("counters").document("c1").get().to_dict() == {"n": 6}
+
+def test_27_query_stream_stays_lazy(memory_db):
+    print("[27 Firestore I/O] Running Test: Query Results Streamed, Counted When Drained")
+    import firestore_metrics
+    from firebase_client import db
+    for n in range(5):
+        memory_db.collection("counters").document(f"c{n}").set({"n": n})
+    io = firestore_metrics.RequestIO()
+    token = firestore_metrics._current.set(io)
+    try:
+        stream = db.collection("counters").stream()
+        first = next(stream)
+        assert first.id == "c0" and io.rpcs == 0  # nothing buffered or recorded up front
+        rest = [snap.id for snap in stream]
+        partial = db.collection("counters").stream()
+        next(partial)
+        partial.close()
+    finally:
+        firestore_metrics._current.reset(token)
+    print(f"   -> {io.as_dict()}")
+    assert rest == ["c1", "c2", "c3", "c4"]
+    assert io.queries == 2 and io.reads == 5 + 1
+
+def test_27_retries_counted_across_threads():
+    print("[27 Firestore I/O] Running Test: Retries From Pool Threads Share The Request Lock")
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+    import firestore_metrics
+    io = firestore_metrics.RequestIO()
+    token = firestore_metrics._current.set(io)
+    try:
+        def retry_many():
+            for _ in range(2000):
+                firestore_metrics._record_retry()
+                firestore_metrics._record("read", 0.0, reads=1)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for f in [pool.submit(contextvars.copy_context().run, retry_many) for _ in range(8)]:
+                f.result()
+    finally:
+        firestore_metrics._current.reset(token)
+    print(f"   -> {io.as_dict()}")
+    assert io.transaction_retries == 16000 and io.reads == 16000
+
+def test_27_admin_aggregates(client, memory_db):
+    print("[27 Firestore I/O] Running Test: Aggregates By Route And Uid")
+    import firestore_metrics
+    firestore_metrics.aggregates.reset()
+    client.post("/signup/artisan", json={"uid": "a1", "name": "Asha"})
+    client.post("/signup/artisan", json={"uid": "a2", "name": "Ravi"})
+    for uid in ("a1", "a1", "a2"):
+        client.get(f"/profile/artisan/{uid}")
+
+    stats = client.get("/admin/firestore/stats?top=1").json
+    print(f"   -> Routes: {list(stats['routes'])}, Users: {list(stats['users'])}")
+    profile = stats["routes"]["GET /profile/<role>/<uid>"]
+    assert profile["requests"] == 3 and profile["reads"] == 3 and profile["reads_per_request"] == 1
+    assert stats["routes"]["POST /signup/<role>"]["writes"] == 2
+    assert list(stats["users"]) == ["a1"]
+    assert stats["users"]["a1"]["requests"] == 3  # signup (uid from JSON body) + two profile reads
+
+# ==============================================================================
+# FEATURE 28: Batched Id Lookups Past The 30-Value "in" Limit
+# Tests: 1. 75 Collaborators, 2. 45 Businesses With A Dangling Id, 3. 35 Interested Investors,
+#        4. Collab Request Senders Across Roles
+# ==============================================================================
+@pytest.mark.parametrize("desc, kind, count, expected_get_all_calls", [
+    ("Scale: 75 Collaborators In Profile Order", "collaborators", 75, 4),
+    ("Edge: 45 Businesses, Dangling Id Skipped", "businesses", 45, 3),
+    ("Scale: 35 Interested Investors", "investors", 35, 2),
+])
+def test_28_batched_lookups(client, memory_db, monkeypatch, desc, kind, count, expected_get_all_calls):
+    print(f"[28 Batched Lookups] Running Test: {desc}")
+    import batch_lookup
+    monkeypatch.setattr(batch_lookup, "GET_ALL_CHUNK", 20)
+    ids = [f"{kind[:3]}{n:03d}" for n in range(count)][::-1]  # deliberately not sorted
+    collection = {"collaborators": "artisans", "businesses": "businesses", "investors": "investors"}[kind]
+    for doc_id in ids[:-1] if kind == "businesses" else ids:
+        memory_db.collection(collection).document(doc_id).set({"name": f"Name {doc_id}", "business_name": doc_id})
+    memory_db.collection("artisans").document("a1").set({"name": "Asha", "collaborators": ids, "businesses": ids})
+    memory_db.collection("pitches").document("p1").set({"interested_investors": ids})
+    memory_db.reset_stats()
+
+    if kind == "collaborators":
+        got = [c["uid"] for c in client.get("/artisan/a1/collaborators").json]
+    elif kind == "businesses":
+        got = [b["id"] for b in client.get("/artisan/a1/business").json]
+    else:
+        got = [i["uid"] for i in client.get("/marketplace/pitch/p1").json["interested_investors_details"]]
+    print(f"   -> {len(got)} results, RPCs: {memory_db.stats()['rpcs']}")
+    assert got == (ids[:-1] if kind == "businesses" else ids)
+    assert memory_db.stats()["rpcs"]["get_all"] == expected_get_all_calls
+    assert memory_db.stats()["rpcs"]["query"] == 0
+
+def test_28_collab_request_names(client, memory_db, monkeypatch):
+    print("[28 Batched Lookups] Running Test: 45 Collab Requests, Senders Named In Chunks")
+    import batch_lookup
+    monkeypatch.setattr(batch_lookup, "GET_ALL_CHUNK", 20)
+    senders = [f"art{n:03d}" for n in range(44)] + ["men000"]
+    for uid in senders[:-1]:
+        memory_db.collection("artisans").document(uid).set({"name": f"Name {uid}"})
+    memory_db.collection("mentors").document("men000").set({"name": "Meera"})
+    for n, uid in enumerate(senders + ["ghost"]):
+        memory_db.collection("requests").document(f"r{n:03d}").set({"from_uid": uid, "to_uid": "a1", "status": "pending"})
+    memory_db.reset_stats()
+
+    received = client.get("/collab/a1/requests").json["received"]
+    names = {r["from_uid"]: r["from_name"] for r in received}
+    print(f"   -> {len(received)} requests, RPCs: {memory_db.stats()['rpcs']}")
+    assert names["art000"] == "Name art000" and names["men000"] == "Meera" and names["ghost"] == "Unknown"
+    # artisans: 46 uids in 3 chunks; mentors and investors: only the 2 still missing, 1 chunk each
+    assert memory_db.stats()["rpcs"]["get_all"] == 5
+    assert memory_db.stats()["rpcs"]["query"] == 2  # received + sent requests
+
+# ==============================================================================
+# FEATURE 29: Batched Connected Mentors / Artisans
+# Tests: 1. Mentor With 100 Artisans, 2. Artisan's Mentors In Order, 3. Missing Caller Profile
+# ==============================================================================
+@pytest.mark.parametrize("desc, path, caller, connections, expected_status", [
+    ("Scale: Mentor With 100 Artisans", "/mentor/m0/artisans", ("mentors", "m0", "connected_artisans"), 100, 200),
+    ("Happy Path: Artisan's Mentors", "/artisan/a0/mentors", ("artisans", "a0", "connected_mentors"), 3, 200),
+    ("Edge: Caller Profile Missing", "/artisan/ghost/mentors", None, 0, 404),
+])
+def test_29_connected_profiles(client, memory_db, desc, path, caller, connections, expected_status):
+    print(f"[29 Connected Profiles] Running Test: {desc}")
+    uids = []
+    if caller:
+        collection, caller_uid, field = caller
+        other = "artisans" if collection == "mentors" else "mentors"
+        uids = [f"{other[0]}{n}" for n in range(connections, 0, -1)]
+        for uid in uids:
+            memory_db.collection(other).document(uid).set(
+                {"name": f"User {uid}", "bio": "Bio", "password": "secret", "email": f"{uid}@x.in"})
+        memory_db.collection(collection).document(caller_uid).set({"name": "Caller", field: uids + ["deleted_uid"]})
+    memory_db.reset_stats()
+
+    res = client.get(path)
+    rpcs = memory_db.stats()["rpcs"]
+    print(f"   -> Status: {res.status_code}, RPCs: {rpcs}")
+    assert res.status_code == expected_status
+    if expected_status == 200:
+        assert [p["uid"] for p in res.json] == uids
+        assert all("password" not in p and "email" not in p for p in res.json)
+        assert res.json[0]["name"] == f"User {uids[0]}"
+        import batch_lookup  # +1 for the dangling uid; chunks run concurrently
+        assert rpcs["get"] == 1 and rpcs["get_all"] == -(-(connections + 1) // batch_lookup.GET_ALL_CHUNK)
+
+# ==============================================================================
+# FEATURE 30: Community Membership Subcollection
+# Tests: 1. Double Join Counted Once, 2. Leave Twice, 3. 120 Members Paged,
+#        4. Legacy Array Member Joins And Migrates
+# ==============================================================================
+@pytest.mark.parametrize("desc, scenario, expected_count", [
+    ("Edge: Joining Twice Counts Once", "double_join", 2),
+    ("Edge: Leaving Twice Decrements Once", "double_leave", 1),
+    ("Scale: 120 Members Over Three Pages", "paged", 121),
+    ("Migration: Legacy Array Member", "legacy", 2),
+])
+def test_30_community_membership(client, memory_db, desc, scenario, expected_count):
+    print(f"[30 Community Membership] Running Test: {desc}")
+    from community_manager import CommunityManager
+    memory_db.collection("mentors").document("m0").set({"name": "Meera"})
+    memory_db.collection("artisans").document("a1").set({"name": "Asha"})
+
+    if scenario == "legacy":
+        cid = "legacy"
+        memory_db.collection("communities").document(cid).set(
+            {"name": "Old", "members": ["m0", "a1"], "member_count": 2})
+    else:
+        cid = client.post("/community/m0/create", json={"name": "Weavers"}).json["community_id"]
+
+    if scenario == "double_join":
+        first = client.post(f"/community/a1/join/{cid}").json
+        second = client.post(f"/community/a1/join/{cid}").json
+        assert first["joined"] is True and second["joined"] is False
+    elif scenario == "double_leave":
+        client.post(f"/community/a1/join/{cid}")
+        assert client.post(f"/community/a1/leave/{cid}").json["left"] is True
+        assert client.post(f"/community/a1/leave/{cid}").json["left"] is False
+    elif scenario == "paged":
+        for n in range(120):
+            CommunityManager(f"u{n:03d}").join_specific_community(cid)
+        seen, cursor, pages = [], None, 0
+        while True:
+            res = client.get(f"/community/{cid}/members?limit=50" + (f"&cursor={cursor}" if cursor else ""))
+            seen += [m["uid"] for m in res.json]
+            pages += 1
+            cursor = res.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert pages == 3 and seen[0] == "m0" and len(set(seen)) == expected_count
+    else:
+        assert client.post(f"/community/a1/join/{cid}").json["joined"] is True
+        assert "a1" not in memory_db.collection("communities").document(cid).get().to_dict()["members"]
+        # m0 is still in the legacy array but already has a membership doc from a partial earlier run
+        m0_ref = memory_db.collection("communities").document(cid).collection("members").document("m0")
+        m0_ref.set({"uid": "m0", "name": "Meera", "role": "mentor", "joined_at": "2020-01-01"})
+        CommunityManager.migrate_legacy_members()
+        assert m0_ref.get().to_dict()["joined_at"] == "2020-01-01"  # an existing member keeps their join date
+
+    comm = memory_db.collection("communities").document(cid).get().to_dict()
+    print(f"   -> member_count: {comm['member_count']}")
+    assert comm["member_count"] == expected_count
+    assert "members" not in comm
+    members = client.get(f"/community/{cid}/members").json
+    assert len(members) == min(expected_count, 50)
+    assert {"uid": "m0", "name": "Meera", "role": "mentor"} in members
+    if scenario != "double_leave":
+        assert [c["id"] for c in client.get("/user/a1/communities").json] == ([] if scenario == "paged" else [cid])
+
+# ==============================================================================
+# FEATURE 31: Community Directory
+# Tests: 1. Ordered By member_count And Projected, 2. Skill Tag Filter,
+#        3. Paged Two At A Time, 4. Cached Until Membership Changes
+# ==============================================================================
+@pytest.mark.parametrize("desc, query, expected_ids", [
+    ("Happy Path: Largest First, Display Fields Only", "", ["c4", "c3", "c2", "c1", "c0"]),
+    ("Filter: Skill Tag", "?skill_tag=weaving", ["c4", "c2", "c0"]),
+    ("Pagination: Two Per Page", "?limit=2", ["c4", "c3", "c2", "c1", "c0"]),
+    ("Cache: Served Until A Join", "", ["c0", "c4", "c3", "c2", "c1"]),
+])
+def test_31_community_directory(client, memory_db, desc, query, expected_ids):
+    print(f"[31 Community Directory] Running Test: {desc}")
+    for n in range(5):
+        memory_db.collection("communities").document(f"c{n}").set({
+            "name": f"Community {n}", "description": "", "member_count": n * 10,
+            "skill_tags": ["weaving" if n % 2 == 0 else "pottery"],
+            "members": [f"u{i}" for i in range(n * 10)], "channels": [{"id": "general", "name": "general"}],
+        })
+    memory_db.reset_stats()
+
+    ids, url, pages = [], f"/communities/list{query}", 0
+    while url:
+        res = client.get(url)
+        assert res.status_code == 200
+        assert all(set(c) == {"id", "name", "description", "skill_tags", "member_count"} for c in res.json)
+        ids += [c["id"] for c in res.json]
+        pages += 1
+        next_cursor = res.headers.get("X-Next-Cursor")
+        url = f"/communities/list{query}&cursor={next_cursor}" if next_cursor else None
+    print(f"   -> {ids} in {pages} page(s), RPCs: {memory_db.stats()['rpc_total']}")
+    assert pages == (3 if "limit=2" in query else 1)
+
+    if desc.startswith("Cache"):
+        memory_db.reset_stats()
+        assert [c["id"] for c in client.get("/communities/list").json] == ids
+        assert memory_db.stats()["rpc_total"] == 0
+        memory_db.collection("communities").document("c0").update({"member_count": 99})
+        memory_db.collection("artisans").document("a1").set({"name": "Asha"})
+        client.post("/community/a1/join/c0")
+        ids = [c["id"] for c in client.get("/communities/list").json]
+        assert client.get("/communities/list").json[0]["member_count"] == 100
+    assert ids == expected_ids
+
+# ==============================================================================
+# FEATURE 32: Named Field Projections On Discovery Routes
+# Tests: 1. Artisan Cards By Default, 2. Detail, 3. Full, 4. Mentor Search,
+#        5. Name Prefix Search, 6. Unknown Projection
+# ==============================================================================
+PROFILE_DOC = {"name": "Asha", "name_lower": "asha", "bio": "Weaver", "skills": ["weaving"], "expertise": ["weaving"],
+               "location": "Pune", "email": "asha@x.in", "password": "secret", "age": 30,
+               "materials": ["silk"] * 50, "collaborators": [f"c{n}" for n in range(200)]}
+
+@pytest.mark.parametrize("desc, url, expected_status, expected_fields", [
+    ("Default: Artisan Cards", "/artisans/search", 200, {"uid", "name", "bio", "skills", "location"}),
+    ("Detail: Artisans By Skill", "/artisans/search?skill=Weaving&fields=detail", 200,
+     {"uid", "name", "bio", "skills", "location", "materials", "collaborators"}),
+    ("Full: Everything But The Password", "/artisans/search?fields=full", 200, set(PROFILE_DOC) - {"password"} | {"uid"}),
+    ("Mentors: Search By Expertise", "/mentors/search?expertise=weaving", 200, {"uid", "name", "bio", "expertise", "location"}),
+    ("Users: Name Prefix", "/users/search?name=as", 200, {"uid", "name", "bio", "skills", "location"}),
+    ("Error: Unknown Projection", "/mentors/search?fields=everything", 400, None),
+])
+def test_32_field_projections(client, memory_db, desc, url, expected_status, expected_fields):
+    print(f"[32 Field Projections] Running Test: {desc}")
+    for collection in ("artisans", "mentors"):
+        for n in range(3):
+            memory_db.collection(collection).document(f"{collection[0]}{n}").set(PROFILE_DOC)
+
+    res = client.get(url)
+    print(f"   -> Status: {res.status_code}, {len(res.get_data())} bytes")
+    assert res.status_code == expected_status
+    if expected_fields is None:
+        assert "Unknown projection" in res.json["error"]
+        return
+    assert len(res.json) == 3
+    assert all(set(profile) == expected_fields for profile in res.json)
+    assert all("password" not in profile for profile in res.json)
+
+# ==============================================================================
+# FEATURE 33: Conditional GETs And Response Compression
+# Tests: 1-4. Unchanged Polls Return 304 (Forum, Communities, Pitches, Chats),
+#        5. Content-Hash ETag Without A Version, 6. gzip, 7. Preferred Encoding
+# ==============================================================================
+@pytest.mark.parametrize("desc, url, change", [
+    ("Forum Posts", "/forum/posts?sort_by=new", lambda db: db.collection("forum_posts").document("p0").update({"title": "Edited"})),
+    ("Community Directory", "/communities/list", None),
+    ("Open Pitches", "/marketplace/pitches", lambda db: db.collection("pitches").document("p0").update({"title": "Edited"})),
+    ("Conversations", "/chat/a0/conversations", lambda db: db.collection("chat_index").document("c0").update({"last_message": "hi"})),
+    ("Members (Content Hash)", "/community/c0/members", lambda db: db.collection("communities").document("c0")
+        .collection("members").document("a0").update({"name": "Renamed"})),
+])
+def test_33_conditional_get(client, memory_db, desc, url, change):
+    print(f"[33 Conditional GET] Running Test: {desc}")
+    from datetime import datetime, timezone
+    now = datetime.now(timezone.utc)
+    memory_db.collection("artisans").document("a0").set({"name": "Asha"})
+    for n in range(3):
+        memory_db.collection("forum_posts").document(f"p{n}").set(
+            {"author_uid": "a0", "title": f"Post {n}", "body": "b", "timestamp": now, "score": 0})
+        memory_db.collection("pitches").document(f"p{n}").set({"title": f"Pitch {n}", "status": "open", "created_at": now})
+        memory_db.collection("chat_index").document(f"c{n}").set(
+            {"participants": ["a0", f"m{n}"], "last_message_at": now, "participant_details": {}})
+        memory_db.collection("communities").document(f"c{n}").set({"name": f"C{n}", "member_count": n, "skill_tags": []})
+        memory_db.collection("communities").document("c0").collection("members").document(f"a{n}").set(
+            {"uid": f"a{n}", "name": f"Member {n}", "joined_at": now})
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+    memory_db.reset_stats()
+    again = client.get(url, headers={"If-None-Match": etag})
+    print(f"   -> 304 poll cost {memory_db.stats()['rpc_total']} RPC(s)")
+    assert again.status_code == 304 and again.get_data() == b""
+    assert again.headers["ETag"] == etag
+    if change is None:
+        assert memory_db.stats()["rpc_total"] == 0  # served from the directory cache
+        return
+    change(memory_db)
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+@pytest.mark.parametrize("desc, accept_encoding, expected_encoding", [
+    ("gzip Only", "gzip", "gzip"),
+    ("Client Prefers br", "gzip, deflate, br", "br-if-installed"),
+    ("No Compression Accepted", "", None),
+])
+def test_33_compression(client, memory_db, desc, accept_encoding, expected_encoding):
+    print(f"[33 Compression] Running Test: {desc}")
+    import gzip, http_cache
+    for n in range(40):
+        memory_db.collection("pitches").document(f"p{n}").set(
+            {"title": f"Handloom pitch {n}", "description": "Scaling a weaving cooperative. " * 5, "status": "open", "created_at": n})
+    if expected_encoding == "br-if-installed":
+        expected_encoding = "br" if http_cache.brotli is not None else "gzip"
+
+    res = client.get("/marketplace/pitches", headers={"Accept-Encoding": accept_encoding} if accept_encoding else {})
+    body = res.get_data()
+    print(f"   -> Content-Encoding: {res.headers.get('Content-Encoding')}, {len(body)} bytes")
+    assert res.headers.get("Content-Encoding") == expected_encoding
+    assert "Accept-Encoding" in res.headers.get("Vary", "")
+    if expected_encoding == "gzip":
+        body = gzip.decompress(body)
+    elif expected_encoding == "br":
+        body = http_cache.brotli.decompress(body)
+    assert len(json.loads(body)) == 40
+
+# ==============================================================================
+# FEATURE 34: Chat Streaming Over Server-Sent Events
+# Tests: 1. Two Tabs Share One Listener, 2. Reconnect Replays Missed Events,
+#        3. Reconnect After A Long Gap Catches Up, 4. Older Audio Message Transcribed, 5. Not A Participant
+# ==============================================================================
+def _next_event(stream):
+    for frame in stream:
+        if frame.startswith(b"id:"):
+            lines = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n"))
+            return int(lines["id"]), lines["event"], json.loads(lines["data"])
+
+@pytest.mark.parametrize("desc, scenario", [
+    ("Fan-Out: Two Tabs, One Listener", "fan_out"),
+    ("Reconnect: Last-Event-ID Replay", "replay"),
+    ("Reconnect: Gap Longer Than The Lookback", "long_gap"),
+    ("Update: Older Audio Message Transcribed", "modified"),
+    ("Error: Not A Participant", "forbidden"),
+])
+def test_34_chat_stream(client, memory_db, monkeypatch, desc, scenario):
+    print(f"[34 Chat Stream] Running Test: {desc}")
+    from datetime import datetime, timedelta, timezone
+    import chat_stream
+    monkeypatch.setattr(chat_stream, "hub", chat_stream.ListenerHub())
+    memory_db.collection("artisans").document("a1").set({"name": "Asha"})
+    memory_db.collection("mentors").document("m1").set({"name": "Meera"})
+    # An existing conversation whose last message, an audio clip, was sent an hour ago
+    hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+    memory_db.collection("chat_index").document("dm_a1_m1").set({
+        "participants": ["a1", "m1"], "last_message_at": hour_ago,
+        "participant_details": {"a1": {"name": "Asha"}, "m1": {"name": "Meera"}},
+    })
+    memory_db.collection("chats").document("dm_a1_m1").collection("messages").document("audio0").set({
+        "sender_uid": "m1", "recipient_uid": "a1", "content": "(Audio message)", "message_type": "audio",
+        "transcription_status": "pending", "created_at": hour_ago, "updated_at": hour_ago,
+    })
+    url = "/chat/a1/stream?chat_id=dm_a1_m1"
+
+    if scenario == "forbidden":
+        assert client.get("/chat/x9/stream?chat_id=dm_a1_m1").status_code == 403
+        assert client.get("/chat/a1/stream?chat_id=dm_a1_m1_x9").status_code == 403  # no such chat
+        return
+
+    tabs = [client.get(url, buffered=False) for _ in range(2 if scenario == "fan_out" else 1)]
+    assert all(t.headers["Content-Type"].startswith("text/event-stream") for t in tabs)
+    assert chat_stream.hub.stats() == {"listeners": 2, "subscribers": 2 * len(tabs)}
+    sent = client.post("/chat/m1/send", json={"to_id": "a1", "content": "Namaste"}).json
+
+    if scenario == "fan_out":
+        for tab in tabs:
+            # message and chat_index are committed in one batch, so their events may arrive in either order
+            events = {kind: data for _, kind, data in (_next_event(tab.response), _next_event(tab.response))}
+            assert events["message"]["message"]["id"] == sent["message_id"]
+            assert events["conversation"]["conversation"]["other_user"]["name"] == "Meera"
+        memory_db.reset_stats()  # names are cached now, so only the listeners read
+        client.post("/chat/m1/send", json={"to_id": "a1", "content": "Again"})
+        print(f"   -> Reads for one message with two tabs open: {memory_db.stats()['reads']}")
+        assert memory_db.stats()["reads"] == 2  # one per listener (messages + chat_index), not per tab
+    elif scenario == "long_gap":
+        first_id, _, _ = _next_event(tabs[0].response)
+        tabs[0].close()
+        second = client.post("/chat/m1/send", json={"to_id": "a1", "content": "Missed?"}).json
+        # The restarted listener only looks back 0s, so only the catch-up read can deliver the message
+        monkeypatch.setattr(chat_stream, "LOOKBACK_SECONDS", 0)
+        back = client.get(url, headers={"Last-Event-ID": str(first_id)}, buffered=False)
+        _, kind, data = _next_event(back.response)
+        assert (kind, data["type"], data["message"]["id"]) == ("message", "added", second["message_id"])
+        tabs = [back]
+    elif scenario == "replay":
+        first_id, _, _ = _next_event(tabs[0].response)
+        tabs[0].close()
+        second = client.post("/chat/m1/send", json={"to_id": "a1", "content": "Missed?"}).json
+        assert chat_stream.hub.stats()["listeners"] == 0
+        back = client.get(url, headers={"Last-Event-ID": str(first_id)}, buffered=False)
+        seen = set()
+        for _ in range(3):
+            _, kind, data = _next_event(back.response)
+            if kind == "message":
+                seen.add(data["message"]["id"])
+        assert second["message_id"] in seen
+        tabs = [back]
+    else:
+        _next_event(tabs[0].response)
+        _next_event(tabs[0].response)
+        # The transcript lands long after the listener started, on a message it never delivered
+        from chat_manager import ChatManager
+        monkeypatch.setattr("chat_manager.download_blob_to_file", lambda path, f: f.write(b"\x00") or True)
+        monkeypatch.setattr("ai_helper.speech_to_text", lambda audio: "Transcribed text")
+        ChatManager.transcribe_audio_message("dm_a1_m1", "audio0", "chats/dm_a1_m1/clip.webm")
+        _, kind, data = _next_event(tabs[0].response)
+        assert (kind, data["type"], data["message"]["id"]) == ("message", "modified", "audio0")
+        assert (data["message"]["content"], data["message"]["transcription_status"]) == ("Transcribed text", "done")
+
+    for tab in tabs:
+        tab.close()
+    assert chat_stream.hub.stats() == {"listeners": 0, "subscribers": 0}
+
+
+# ==============================================================================
+# FEATURE 35: One-Batch Chat Sends
+# Tests: 1. New Conversation Resolves Names Once, 2. Known Conversation Sends With No Reads,
+#        3. New Process Checks The Index Once, 4. Error: Unknown Recipient Writes Nothing
+# ==============================================================================
+@pytest.mark.parametrize("desc, scenario", [
+    ("New Conversation: One Name Lookup", "new"),
+    ("Known Conversation: Zero Reads", "known"),
+    ("Cold Process: One Index Check", "cold"),
+    ("Error: Unknown Recipient", "unknown"),
+])
+def test_35_chat_send_batch(client, memory_db, desc, scenario):
+    print(f"[35 Chat Send] Running Test: {desc}")
+    from chat_manager import ChatManager
+    memory_db.collection("artisans").document("a1").set({"name": "Asha"})
+    memory_db.collection("mentors").document("m1").set({"name": "Meera"})
+    if scenario in ("known", "cold"):
+        client.post("/chat/a1/send", json={"to_id": "m1", "content": "Hello"})
+    if scenario == "cold":
+        ChatManager.clear_known_chats()
+    memory_db.reset_stats()
+
+    resp = client.post("/chat/a1/send", json={"to_id": "zz" if scenario == "unknown" else "m1", "content": "Namaste"})
+    stats = memory_db.stats()
+    print(f"   -> RPCs: {stats['rpcs']}")
+
+    if scenario == "unknown":
+        assert resp.status_code == 404 and stats["writes"] == 0
+        assert not memory_db.collection("chat_index").document(ChatManager.pair_chat_id("a1", "zz")).get().exists
+        return
+    assert resp.status_code == 200
+    assert stats["rpcs"]["commit"] == 1 and stats["writes"] == 2  # message + chat_index, atomically
+    assert stats["rpcs"]["get"] == {"new": 1, "known": 0, "cold": 1}[scenario]
+    if scenario == "known":
+        assert stats["reads"] == 0
+    index = memory_db.collection("chat_index").document("dm_a1_m1").get().to_dict()
+    assert index["participant_details"] == {"a1": {"name": "Asha"}, "m1": {"name": "Meera"}}
+    assert index["last_message_content"] == "Namaste" and index["last_sender"] == "a1"
+    message = memory_db.collection("chats").document("dm_a1_m1").collection("messages").document(resp.json["message_id"])
+    assert message.get().to_dict()["content"] == "Namaste"
+
+
+# ==============================================================================
+# FEATURE 36: Unread Counters And Read Receipts
+# Tests: 1. Sends Increment The Recipient's Counter, 2. Mark Read Resets It With One Write,
+#        3. Replying Clears The Sender's Badge, 4. Error: Not A Participant, 5. Error: No Conversation
+# ==============================================================================
+@pytest.mark.parametrize("desc, scenario, expected_status", [
+    ("Counter: Three Unread", "unread", 200),
+    ("Mark Read: Reset And Receipt", "mark_read", 200),
+    ("Reply: Sender Has Read It", "reply", 200),
+    ("Error: Not A Participant", "forbidden", 403),
+    ("Error: No Conversation", "missing", 404),
+])
+def test_36_unread_counters(client, memory_db, desc, scenario, expected_status):
+    print(f"[36 Unread] Running Test: {desc}")
+    memory_db.collection("artisans").document("a1").set({"name": "Asha"})
+    memory_db.collection("mentors").document("m1").set({"name": "Meera"})
+    if scenario != "missing":
+        for n in range(3):
+            client.post("/chat/a1/send", json={"to_id": "m1", "content": f"Hello {n}"})
+
+    def inbox(uid):
+        return {c["chat_id"]: c for c in client.get(f"/chat/{uid}/conversations").json}
+
+    if scenario == "unread":
+        assert inbox("m1")["dm_a1_m1"]["unread_count"] == 3
+        assert inbox("a1")["dm_a1_m1"]["unread_count"] == 0
+        return
+    if scenario == "reply":
+        client.post("/chat/m1/send", json={"to_id": "a1", "content": "Hi!"})
+        assert inbox("m1")["dm_a1_m1"]["unread_count"] == 0
+        assert inbox("a1")["dm_a1_m1"]["unread_count"] == 1
+        return
+
+    memory_db.reset_stats()
+    resp = client.post(f"/chat/{'x9' if scenario == 'forbidden' else 'm1'}/read/dm_a1_m1")
+    assert resp.status_code == expected_status
+    if scenario != "mark_read":
+        return
+    stats = memory_db.stats()
+    assert stats["reads"] == 0 and stats["writes"] == 1
+    assert inbox("m1")["dm_a1_m1"]["unread_count"] == 0
+    receipt = inbox("a1")["dm_a1_m1"]["other_user"]["last_read_at"]
+    print(f"   -> Read receipt seen by the sender: {receipt}")
+    assert receipt
+
+
+# ==============================================================================
+# FEATURE 37: Delta Sync Since A Watermark
+# Tests: 1. Forum: New, Rescored And Deleted Posts, 2. Messages: New And Transcribed,
+#        3. Conversations: Read Receipts, 4. Channel: Backlog Drained In Pages,
+#        5. Error: Malformed Watermark, 6. Error: Expired Watermark
+# ==============================================================================
+@pytest.mark.parametrize("desc, scenario", [
+    ("Forum: Created, Rescored, Deleted", "forum"),
+    ("Messages: Sent And Transcribed", "messages"),
+    ("Conversations: Read Receipt", "conversations"),
+    ("Channel: Paged Backlog", "channel"),
+    ("Error: Malformed Watermark", "malformed"),
+    ("Error: Expired Watermark", "expired"),
+])
+def test_37_delta_sync(client, memory_db, monkeypatch, desc, scenario):
+    print(f"[37 Delta Sync] Running Test: {desc}")
+    from datetime import datetime, timedelta, timezone
+    from firebase_admin import firestore
+    import delta_sync
+    monkeypatch.setattr(delta_sync, "CLOCK_SKEW_SECONDS", 0)
+    memory_db.collection("artisans").document("a1").set({"name": "Asha"})
+    memory_db.collection("mentors").document("m1").set({"name": "Meera"})
+    posts = [client.post("/forum/post", json={"uid": "a1", "title": f"T{n}", "content": "b"}).json["post_id"] for n in range(3)]
+    sent = client.post("/chat/a1/send", json={"to_id": "m1", "content": "Hello"}).json
+    for n in range(3):
+        client.post("/community/c1/general/posts", json={"uid": "a1", "message": f"old {n}"})
+    url = {"forum": "/forum/posts", "messages": "/chat/m1/get/dm_a1_m1", "conversations": "/chat/a1/conversations",
+           "channel": "/community/c1/general/posts"}.get(scenario, "/forum/posts")
+    full = client.get(url)
+    watermark = full.headers["X-Watermark"]
+
+    if scenario == "malformed":
+        assert client.get(f"{url}?since=not-a-watermark").status_code == 400
+        return
+    if scenario == "expired":
+        old = (datetime.now(timezone.utc) - timedelta(days=delta_sync.TOMBSTONE_TTL_DAYS + 1), "")
+        assert client.get(f"{url}?since={delta_sync.encode_watermark(old, old)}").status_code == 410
+        return
+
+    if scenario == "forum":
+        new_post = client.post("/forum/post", json={"uid": "m1", "title": "Fresh", "content": "b"}).json["post_id"]
+        from forum_votes import ForumVoteEngine
+        ForumVoteEngine.refresh_score(posts[0])
+        client.delete(f"/forum/post/{posts[1]}", json={"uid": "a1"})
+    elif scenario == "messages":
+        second = client.post("/chat/m1/send", json={"to_id": "a1", "content": "Hi"}).json
+        memory_db.collection("chats").document("dm_a1_m1").collection("messages").document(sent["message_id"]) \
+            .update({"content": "Transcribed", "updated_at": firestore.SERVER_TIMESTAMP})
+    elif scenario == "conversations":
+        client.post("/chat/m1/read/dm_a1_m1")
+    else:
+        for n in range(3):
+            client.post("/community/c1/general/posts", json={"uid": "m1", "message": f"new {n}"})
+
+    memory_db.reset_stats()
+    delta = client.get(f"{url}?since={watermark}&limit=2").json
+    print(f"   -> {len(delta['items'])} changed, {len(delta['removed'])} removed, reads: {memory_db.stats()['reads']}")
+    ids = [item.get("id", item.get("chat_id")) for item in delta["items"]]
+    if scenario == "forum":
+        assert sorted(ids) == sorted([posts[0], new_post]) and delta["removed"] == [posts[1]]
+        assert all(item["author_name"] for item in delta["items"])
+    elif scenario == "messages":
+        assert ids == [second["message_id"], sent["message_id"]] and delta["items"][1]["content"] == "Transcribed"
+    elif scenario == "conversations":
+        receipt = delta["items"][0]["other_user"]["last_read_at"]
+        assert ids == ["dm_a1_m1"] and receipt
+    else:
+        assert [item["message"] for item in delta["items"]] == ["new 0", "new 1"] and delta["has_more"]
+        delta = client.get(f"{url}?since={delta['watermark']}&limit=2").json
+        assert [item["message"] for item in delta["items"]] == ["new 2"]
+    assert not delta["has_more"]
+
+    # Nothing written since: the next delta is empty
+    again = client.get(f"{url}?since={delta['watermark']}").json
+    assert again["items"] == [] and again["removed"] == []
+
+
+@pytest.mark.parametrize("desc, url", [
+    ("Forum (With Tombstones)", "/forum/posts"),
+    ("Messages (No Tombstones)", "/chat/m1/get/dm_a1_m1"),
+])
+def test_37_quiet_listing_never_expires(client, memory_db, monkeypatch, desc, url):
+    print(f"[37 Delta Sync] Running Test: Polled Past The TTL: {desc}")
+    from datetime import datetime, timedelta, timezone
+    import delta_sync
+    monkeypatch.setattr(delta_sync, "CLOCK_SKEW_SECONDS", 0)
+    memory_db.collection("artisans").document("a1").set({"name": "Asha"})
+    memory_db.collection("mentors").document("m1").set({"name": "Meera"})
+    client.post("/chat/a1/send", json={"to_id": "m1", "content": "Hello"})
+    watermark = client.get(url).headers["X-Watermark"]
+    start = datetime.now(timezone.utc)
+    # A client polling every 20 days outlives the 30-day tombstone retention
+    for days in (20, 40, 60):
+        monkeypatch.setattr(delta_sync, "_now", lambda days=days: start + timedelta(days=days))
+        resp = client.get(f"{url}?since={watermark}")
+        assert resp.status_code == 200 and resp.json["items"] == []
+        watermark = resp.json["watermark"]
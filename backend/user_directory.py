@@ -0,0 +1,109 @@
+# kalasetu/user_directory.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from firebase_config import db
+
+
+class UserDirectory:
+    """Shared uid -> (role, name, avatar) lookup across all role collections.
+
+    Unknown uids are resolved with one batched ``get_all`` per role collection,
+    in precedence order: only uids not found among the artisans (most users)
+    are looked up among the mentors, and so on, so a lookup reads about one
+    document per uid instead of one per uid and role. Results (including "not
+    found") are kept in a small TTL/LRU cache that the role managers invalidate
+    on signup, update and delete.
+    """
+
+    # Lookup precedence when a uid exists in more than one collection.
+    ROLE_COLLECTIONS = [("artisan", "artisans"), ("mentor", "mentors"), ("investor", "investors")]
+    FIELDS = ["name", "avatar_url"]
+
+    TTL_SECONDS = float(os.environ.get("USER_DIRECTORY_TTL", 300))
+    MAX_ENTRIES = int(os.environ.get("USER_DIRECTORY_MAX_ENTRIES", 5000))
+
+    _cache: "OrderedDict[str, tuple]" = OrderedDict()  # uid -> (expires_at, entry or None)
+    _lock = threading.Lock()
+
+    @classmethod
+    def resolve(cls, uids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Return {uid: {"uid", "role", "name", "avatar"} or None} for every uid given."""
+        wanted = [u for u in dict.fromkeys(uids) if u]
+        results: Dict[str, Optional[Dict]] = {}
+        missing: List[str] = []
+
+        now = time.monotonic()
+        with cls._lock:
+            for uid in wanted:
+                cached = cls._cache.get(uid)
+                if cached and cached[0] > now:
+                    cls._cache.move_to_end(uid)
+                    results[uid] = cached[1]
+                else:
+                    missing.append(uid)
+
+        if missing:
+            fetched = cls._fetch(missing)
+            results.update(fetched)
+            cls._store(fetched)
+        return results
+
+    @classmethod
+    def get(cls, uid: str) -> Optional[Dict]:
+        """Resolve a single uid. Returns None if the user does not exist in any role."""
+        if not uid:
+            return None
+        return cls.resolve([uid]).get(uid)
+
+    @classmethod
+    def get_name(cls, uid: str, default: str = "Unknown") -> str:
+        """Display name for a uid, or ``default`` if unknown."""
+        entry = cls.get(uid)
+        return (entry.get("name") or default) if entry else default
+
+    @classmethod
+    def invalidate(cls, uid: str) -> None:
+        """Drop a uid from the cache (call after any profile write)."""
+        with cls._lock:
+            cls._cache.pop(uid, None)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._cache.clear()
+
+    # ---------- internals ----------
+    @classmethod
+    def _fetch(cls, uids: List[str]) -> Dict[str, Optional[Dict]]:
+        """Batched reads, one role collection at a time, for the uids not found in an earlier one."""
+        found: Dict[str, Optional[Dict]] = {uid: None for uid in uids}
+        pending = list(uids)
+        for role, collection in cls.ROLE_COLLECTIONS:
+            if not pending:
+                break
+            refs = [db.collection(collection).document(uid) for uid in pending]
+            for snap in db.get_all(refs, field_paths=cls.FIELDS):
+                if not snap.exists:
+                    continue
+                data = snap.to_dict() or {}
+                found[snap.id] = {
+                    "uid": snap.id,
+                    "role": role,
+                    "name": data.get("name") or "Unknown",
+                    "avatar": data.get("avatar_url"),
+                }
+            pending = [uid for uid in pending if found[uid] is None]
+        return found
+
+    @classmethod
+    def _store(cls, entries: Dict[str, Optional[Dict]]) -> None:
+        expires_at = time.monotonic() + cls.TTL_SECONDS
+        with cls._lock:
+            for uid, entry in entries.items():
+                cls._cache[uid] = (expires_at, entry)
+                cls._cache.move_to_end(uid)
+            while len(cls._cache) > cls.MAX_ENTRIES:
+                cls._cache.popitem(last=False)
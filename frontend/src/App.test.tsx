@@ -44,6 +44,8 @@ vi.mock('@/lib/api', () => ({
   sendCollab: vi.fn(() => Promise.resolve({})),
   getConversations: vi.fn(() => Promise.resolve([])),
   sendMessage: vi.fn(() => Promise.resolve({})),
+  openChatStream: vi.fn(() => null),
+  markChatRead: vi.fn(() => Promise.resolve({})),
 }));
 
 vi.mock('firebase/auth', () => ({
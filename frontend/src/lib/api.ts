@@ -32,14 +32,26 @@ export function updateProfile(role, uid, data) {
 }
 
 // --- Artisan AI ---
-export function getIdeas(uid) {
-  return apiFetch(`/artisan/${uid}/ideas`);
+export function getIdeas(uid, refresh = false) {
+  return apiFetch(`/artisan/${uid}/ideas${refresh ? "?refresh=true" : ""}`);
 }
 export function getSchemes(uid) {
   return apiFetch(`/artisan/${uid}/schemes`);
 }
-export function generateImage(uid, prompt) {
-  return apiFetch(`/artisan/${uid}/image`, "POST", { prompt });
+export function getJob(jobId) {
+  return apiFetch(`/jobs/${jobId}`);
+}
+// Image generation runs as a background job: submit it, then poll until it finishes.
+export async function generateImage(uid, prompt, pollMs = 2000, timeoutMs = 180000) {
+  const { job_id } = await apiFetch(`/artisan/${uid}/image`, "POST", { prompt });
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, pollMs));
+    const job = await getJob(job_id);
+    if (job.status === "succeeded") return job.result;
+    if (job.status === "failed") throw new Error(job.error || "Image generation failed");
+  }
+  throw new Error("Image generation timed out");
 }
 
 // --- Business ---
@@ -55,8 +67,8 @@ export function deactivateBusiness(businessId, uid) {
 
 
 // --- Community & Forum ---
-export function getForumPosts(sortBy = 'new') {
-    return apiFetch(`/forum/posts?sort_by=${sortBy}`);
+export function getForumPosts(sortBy = 'new', uid = '') {
+    return apiFetch(`/forum/posts?sort_by=${sortBy}${uid ? `&uid=${uid}` : ''}`);
 }
 export function voteOnPost(postId, uid, voteType) {
     return apiFetch(`/forum/post/${postId}/vote`, "POST", { uid, vote_type: voteType });
@@ -131,14 +143,24 @@ export function sendMessage(uid, to_id, message) {
 export function getChat(uid, chat_id) {
   return apiFetch(`/chat/${uid}/get/${chat_id}`);
 }
+export function markChatRead(uid, chat_id) {
+  return apiFetch(`/chat/${uid}/read/${chat_id}`, "POST");
+}
+// Server-Sent Events: new/changed messages of chat_id plus updates to uid's conversation list.
+// Returns null where EventSource is unavailable, so callers can fall back to polling.
+export function openChatStream(uid, chat_id = "") {
+  if (typeof EventSource === "undefined") return null;
+  const query = chat_id ? `?chat_id=${encodeURIComponent(chat_id)}` : "";
+  return new EventSource(`${API_BASE}/chat/${uid}/stream${query}`);
+}
 
 
 // --- Rich Profile ---
 export function getUserPosts(uid) {
     return apiFetch(`/user/${uid}/posts`);
 }
-export function getUserCommunities(uid) {
-    return apiFetch(`/user/${uid}/communities`);
+export function getUserCommunities(uid, limit = 10) {
+    return apiFetch(`/user/${uid}/communities?limit=${limit}`);
 }
 
 
@@ -22,7 +22,7 @@ const ImageGeneratorTab = ({ currentUser }: { currentUser: User }) => {
   const { toast } = useToast();
   const [isLoading, setIsLoading] = useState(false);
   const [prompt, setPrompt] = useState("");
-  const [result, setResult] = useState<{ url?: string; error?: string } | null>(null);
+  const [result, setResult] = useState<{ url?: string; srcset?: { webp?: string; jpeg?: string }; error?: string } | null>(null);
 
   const handleGenerate = async () => {
     if (!prompt) return;
@@ -54,7 +54,11 @@ const ImageGeneratorTab = ({ currentUser }: { currentUser: User }) => {
       {result && (
         <div className="p-4 border rounded-lg mt-4">
           {result.url ? (
-            <img src={result.url} alt={prompt} className="rounded-lg max-w-full mx-auto" />
+            <picture>
+              {result.srcset?.webp && <source type="image/webp" srcSet={result.srcset.webp} sizes="(max-width: 768px) 100vw, 768px" />}
+              {result.srcset?.jpeg && <source type="image/jpeg" srcSet={result.srcset.jpeg} sizes="(max-width: 768px) 100vw, 768px" />}
+              <img src={result.url} alt={prompt} loading="lazy" className="rounded-lg max-w-full mx-auto" />
+            </picture>
           ) : (
             <p className="text-destructive">{result.error || "An unknown error occurred."}</p>
           )}
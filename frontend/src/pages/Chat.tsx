@@ -8,7 +8,7 @@ import { MessageSquare, Send, Plus, Search, Loader2 } from "lucide-react";
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from "@/components/ui/dialog";
 import { Label } from "@/components/ui/label";
 import { useToast } from "@/hooks/use-toast";
-import { getConversations, getChat, sendMessage as apiSendMessage } from "@/lib/api";
+import { getConversations, getChat, sendMessage as apiSendMessage, openChatStream, markChatRead } from "@/lib/api";
 
 // --- Type Definitions ---
 interface User {
@@ -18,6 +18,7 @@ interface User {
 interface Conversation {
   chat_id: string;
   last_message_content: string;
+  unread_count?: number;
   other_user: {
     uid: string;
     name: string;
@@ -106,9 +107,45 @@ export default function Chat() {
       } catch (error) { console.error("Failed to fetch messages", error); }
     };
     
+    // Opening a chat reads it: clear the badge here and on the server (the stream echoes the reset).
+    const markRead = () => {
+      setConversations(prev => prev.map(c => c.chat_id === selectedChat.chat_id ? { ...c, unread_count: 0 } : c));
+      markChatRead(currentUser.uid, selectedChat.chat_id).catch(() => {});
+    };
+    if (selectedChat.unread_count) markRead();
+
+    // Subscribe before loading history so nothing sent in between is lost; the overlap is merged by id.
+    const stream = openChatStream(currentUser.uid, selectedChat.chat_id);
+    if (stream) {
+      stream.addEventListener('message', (event) => {
+        const { type, message } = JSON.parse((event as MessageEvent).data);
+        setMessages(prev => type === 'removed'
+          ? prev.filter(m => m.id !== message.id)
+          : prev.some(m => m.id === message.id)
+            ? prev.map(m => m.id === message.id ? message : m)
+            : [...prev, message]);
+      });
+      stream.addEventListener('conversation', (event) => {
+        const { conversation } = JSON.parse((event as MessageEvent).data);
+        setConversations(prev => [conversation, ...prev.filter(c => c.chat_id !== conversation.chat_id)]);
+        // A message arrived in the chat that is open, so it has been seen.
+        if (conversation.chat_id === selectedChat.chat_id && conversation.unread_count) markRead();
+      });
+      // After a reconnect, reload history and the inbox too: the server only replays so far back.
+      let opened = false;
+      stream.addEventListener('open', () => {
+        if (opened) {
+          fetchMessages();
+          fetchConversations(currentUser.uid);
+        }
+        opened = true;
+      });
+    }
+
     setIsLoading(prev => ({...prev, messages: true}));
     fetchMessages().finally(() => setIsLoading(prev => ({...prev, messages: false})));
     
+    if (stream) return () => stream.close();
     const intervalId = setInterval(fetchMessages, 5000);
     return () => clearInterval(intervalId);
   }, [selectedChat, currentUser]);
@@ -126,10 +163,11 @@ export default function Chat() {
     if (!newMessage.trim() || !currentUser || !selectedChat) return;
     const recipientUid = selectedChat.other_user.uid;
     try {
-      await apiSendMessage(currentUser.uid, recipientUid, newMessage);
+      const result = await apiSendMessage(currentUser.uid, recipientUid, newMessage);
       setNewMessage('');
-      const tempMessage: Message = { id: Date.now().toString(), content: newMessage, sender_uid: currentUser.uid, timestamp: new Date().toISOString() };
-      setMessages(prev => [...prev, tempMessage]);
+      // Keyed by the real message id, so the copy pushed by the stream replaces it instead of duplicating it.
+      const tempMessage: Message = { id: result?.message_id ?? Date.now().toString(), content: newMessage, sender_uid: currentUser.uid, timestamp: new Date().toISOString() };
+      setMessages(prev => prev.some(m => m.id === tempMessage.id) ? prev : [...prev, tempMessage]);
       if (currentUser) fetchConversations(currentUser.uid);
     } catch (error) {
       toast({ title: "Error", description: "Could not send message.", variant: "destructive" });
@@ -184,7 +222,10 @@ export default function Chat() {
               <div className="flex items-start space-x-3">
                 <Avatar className="w-10 h-10"><AvatarFallback className="bg-primary text-white">{chat.other_user.name.charAt(0)}</AvatarFallback></Avatar>
                 <div className="flex-1 min-w-0">
-                  <h3 className="font-medium truncate">{chat.other_user.name}</h3>
+                  <div className="flex items-center justify-between">
+                    <h3 className="font-medium truncate">{chat.other_user.name}</h3>
+                    {!!chat.unread_count && <Badge className="ml-2">{chat.unread_count}</Badge>}
+                  </div>
                   <p className="text-sm text-muted-foreground truncate">{chat.last_message_content}</p>
                 </div>
               </div>
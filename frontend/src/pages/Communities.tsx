@@ -11,7 +11,7 @@ import { Label } from "@/components/ui/label";
 
 import {
   listCommunities, joinCommunity, leaveCommunity, getCommunityDetails,
-  getChannelPosts, postInChannel, getCommunityMembers, sendCollab, createCommunity
+  getChannelPosts, postInChannel, getCommunityMembers, sendCollab, createCommunity, getUserCommunities
 } from "@/lib/api";
 
 // --- Type Definitions ---
@@ -22,7 +22,7 @@ interface User {
 }
 
 interface CommunityMember extends User {}
-interface Community { id: string; name: string; description: string; member_count: number; members: string[]; skill_tags: string[]; }
+interface Community { id: string; name: string; description: string; member_count: number; skill_tags: string[]; }
 interface Channel { id: string; name: string; }
 interface CommunityDetails extends Community { channels: Channel[]; }
 interface Post { id: string; author_name: string; message: string; }
@@ -33,6 +33,7 @@ export default function Communities() {
   const [isLoading, setIsLoading] = useState({ page: true, modal: false });
   const [searchTerm, setSearchTerm] = useState('');
   const [allCommunities, setAllCommunities] = useState<Community[]>([]);
+  const [joinedIds, setJoinedIds] = useState<Set<string>>(new Set());
   const [view, setView] = useState<'list' | 'community'>('list');
   const [selectedCommunity, setSelectedCommunity] = useState<CommunityDetails | null>(null);
   const [selectedChannelId, setSelectedChannelId] = useState<string | null>(null);
@@ -45,10 +46,21 @@ export default function Communities() {
 
   useEffect(() => {
     const user = localStorage.getItem('kalasetu_user');
-    if (user) setCurrentUser(JSON.parse(user));
+    if (user) {
+      const parsed = JSON.parse(user);
+      setCurrentUser(parsed);
+      fetchJoinedIds(parsed.uid);
+    }
     fetchCommunityList();
   }, []);
 
+  const fetchJoinedIds = async (uid: string) => {
+    try {
+      const joined: Community[] = await getUserCommunities(uid, 100);
+      setJoinedIds(new Set(joined.map(c => c.id)));
+    } catch (error) { /* membership badges are cosmetic; the list still renders */ }
+  };
+
   const fetchCommunityList = async () => {
     if (!isLoading.page) setIsLoading(prev => ({ ...prev, page: true }));
     try {
@@ -75,6 +87,7 @@ export default function Communities() {
   const handleJoinLeave = async (communityId: string, action: 'join' | 'leave') => {
     if (!currentUser) return;
     await (action === 'join' ? joinCommunity(currentUser.uid, communityId) : leaveCommunity(currentUser.uid, communityId));
+    fetchJoinedIds(currentUser.uid);
     fetchCommunityList();
   };
 
@@ -175,7 +188,7 @@ export default function Communities() {
         {isLoading.page ? <div className="flex justify-center p-12"><Loader2 className="h-8 w-8 animate-spin text-primary" /></div> :
         <div className="grid md:grid-cols-2 lg:grid-cols-3 gap-6">
           {filteredCommunities.map((community) => {
-            const isJoined = currentUser ? community.members.includes(currentUser.uid) : false;
+            const isJoined = joinedIds.has(community.id);
             return (
               <Card key={community.id} className="card-elevated hover:shadow-lg flex flex-col">
                 <CardHeader><CardTitle className="text-lg">{community.name}</CardTitle></CardHeader>
@@ -6,7 +6,7 @@ import { Textarea } from "@/components/ui/textarea";
 import { Badge } from "@/components/ui/badge";
 import { Avatar, AvatarFallback } from "@/components/ui/avatar";
 import { Tabs, TabsList, TabsTrigger } from "@/components/ui/tabs";
-import { ChevronUp, ChevronDown, MessageSquare, Plus, Search, TrendingUp, Clock, Loader2, Trash2 } from "lucide-react";
+import { ChevronUp, ChevronDown, MessageSquare, Plus, Search, TrendingUp, Clock, Flame, Zap, Loader2, Trash2 } from "lucide-react";
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from "@/components/ui/dialog";
 import { Label } from "@/components/ui/label";
 import { useToast } from "@/hooks/use-toast";
@@ -27,9 +27,12 @@ interface Post {
   timestamp: string; // The backend provides this, but we'll format it.
   // tags are not in the backend data yet, so we'll make it optional
   tags?: string[];
-  votes: { [key: string]: number }; // e.g., { "some-uid": 1, "another-uid": -1 }
+  votes?: { [key: string]: number }; // legacy map, e.g., { "some-uid": 1, "another-uid": -1 }
+  my_vote?: number; // the current user's vote: 1, -1 or 0
 }
 
+type SortMode = 'new' | 'top' | 'hot' | 'rising';
+
 interface User {
   uid: string;
   name: string;
@@ -44,7 +47,7 @@ export default function Forum() {
   const [currentUser, setCurrentUser] = useState<User | null>(null);
 
   // UI State remains the same
-  const [sortBy, setSortBy] = useState<'new' | 'top'>('new');
+  const [sortBy, setSortBy] = useState<SortMode>('new');
   const [searchTerm, setSearchTerm] = useState('');
   const [newPost, setNewPost] = useState({ title: '', body: '' });
   const [isDialogOpen, setIsDialogOpen] = useState(false);
@@ -59,12 +62,12 @@ export default function Forum() {
 
   useEffect(() => {
     fetchPosts();
-  }, [sortBy]); // Refetch when sortBy changes
+  }, [sortBy, currentUser]); // Refetch when sortBy or the logged-in user changes
 
   const fetchPosts = async () => {
     setIsLoading(true);
     try {
-      const fetchedPosts = await getForumPosts(sortBy);
+      const fetchedPosts = await getForumPosts(sortBy, currentUser?.uid);
       setPosts(fetchedPosts);
     } catch (error) {
       toast({ title: "Error", description: "Could not fetch forum posts.", variant: "destructive" });
@@ -80,8 +83,9 @@ export default function Forum() {
       return;
     }
     try {
-      await voteOnPost(postId, currentUser.uid, voteType);
-      fetchPosts(); // Refetch to show updated score
+      const result = await voteOnPost(postId, currentUser.uid, voteType);
+      // The server returns the live score and our vote, so update in place instead of refetching
+      setPosts(prev => prev.map(p => p.id === postId ? { ...p, score: result.score, my_vote: result.vote } : p));
     } catch (error) {
       toast({ title: "Vote failed", description: "Your vote could not be recorded.", variant: "destructive" });
     }
@@ -163,8 +167,10 @@ export default function Forum() {
           <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 text-muted-foreground h-4 w-4" />
           <Input placeholder="Search posts..." value={searchTerm} onChange={(e) => setSearchTerm(e.target.value)} className="pl-10" />
         </div>
-        <Tabs value={sortBy} onValueChange={(value) => setSortBy(value as 'new' | 'top')}>
+        <Tabs value={sortBy} onValueChange={(value) => setSortBy(value as SortMode)}>
           <TabsList>
+            <TabsTrigger value="hot"><Flame className="h-4 w-4 mr-2" />Hot</TabsTrigger>
+            <TabsTrigger value="rising"><Zap className="h-4 w-4 mr-2" />Rising</TabsTrigger>
             <TabsTrigger value="new"><Clock className="h-4 w-4 mr-2" />New</TabsTrigger>
             <TabsTrigger value="top"><TrendingUp className="h-4 w-4 mr-2" />Top</TabsTrigger>
           </TabsList>
@@ -179,7 +185,7 @@ export default function Forum() {
       ) : (
         <div className="space-y-4">
           {filteredPosts.length > 0 ? filteredPosts.map((post) => {
-            const userVote = currentUser ? post.votes?.[currentUser.uid] : 0; // 1 for up, -1 for down
+            const userVote = currentUser ? (post.my_vote ?? post.votes?.[currentUser.uid]) : 0; // 1 for up, -1 for down
             return (
               <Card key={post.id} className="card-elevated">
                 <CardContent className="p-6 flex space-x-4">